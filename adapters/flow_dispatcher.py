@@ -0,0 +1,79 @@
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, BaseHandler, filters
+from adapters.shared_state import SharedConversationHandler
+from adapters.update_processor import _percentile
+
+logger = logging.getLogger(__name__)
+
+FREE_TEXT = filters.TEXT & ~filters.COMMAND
+
+# Flow states for text outside an accepting conversation, looked up in ``routes``.
+SELECTED_ISSUE = "selected_issue"
+FREE = "free_text"
+
+
+class FlowDispatcher(BaseHandler[Update, object, None]):
+    """Sends each free-text message straight to the handler for the user's current flow.
+
+    Registered in a group ahead of everything else. A text message goes to the
+    conversation the user is in, if that conversation accepts it in its
+    current state; otherwise to ``routes[SELECTED_ISSUE]`` when an issue was
+    picked from /myissues, or to ``routes[FREE]``. Handling ends with
+    ``ApplicationHandlerStop``, so the command, conversation and callback
+    handlers in later groups are never checked against the message.
+    Commands, callback queries and documents are not touched.
+    """
+
+    def __init__(self, conversations: List[SharedConversationHandler],
+                 routes: Dict[str, Callable[[Update, object], Awaitable]]):
+        super().__init__(self._unused)
+        self.conversations = conversations
+        self.routes = routes
+        self.invocations: Dict[str, int] = {}
+        self._overhead = deque(maxlen=1000)
+
+    @staticmethod
+    async def _unused(update: Update, context):
+        raise RuntimeError("FlowDispatcher dispatches in handle_update")
+
+    def check_update(self, update: object) -> Optional[Tuple[Optional[SharedConversationHandler], object, float]]:
+        if not isinstance(update, Update) or update.effective_user is None or not FREE_TEXT.check_update(update):
+            return None
+        started = time.perf_counter()
+        key = (update.effective_chat.id, update.effective_user.id)
+        for conversation in self.conversations:
+            # Same (chat, user) key the default ConversationHandler uses; only a
+            # conversation the user is actually in is asked to check the update.
+            if conversation.has_conversation(key):
+                check = conversation.check_update(update)
+                if check is not None and check is not False:
+                    return conversation, check, started
+        return None, None, started
+
+    async def handle_update(self, update: Update, application, check_result, context):
+        conversation, check, started = check_result
+        if conversation is not None:
+            route = f"conversation:{conversation.name}"
+            self._record(route, started)
+            await conversation.handle_update(update, application, check, context)
+        else:
+            route = SELECTED_ISSUE if context.user_data.get("selected_issue_id") else FREE
+            callback = self.routes[route]
+            self._record(route, started)
+            await callback(update, context)
+        raise ApplicationHandlerStop
+
+    def _record(self, route: str, started: float):
+        self._overhead.append(time.perf_counter() - started)
+        self.invocations[route] = self.invocations.get(route, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "invocations": dict(self.invocations),
+            "overhead_us_p50": round(_percentile(self._overhead, 50) * 1e6, 1),
+            "overhead_us_p95": round(_percentile(self._overhead, 95) * 1e6, 1),
+        }
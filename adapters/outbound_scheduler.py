@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, passed as rate_limit_args={"priority": ...}; lower values go first.
+INTERACTIVE = 0
+BROADCAST = 10
+
+MAX_MESSAGE_LENGTH = 4096
+# sendMessage parameters that make two messages impossible to merge into one.
+UNMERGEABLE_FIELDS = ("reply_markup", "entities", "reply_parameters", "reply_to_message_id", "link_preview_options")
+
+
+class TokenBucket:
+    """Token bucket whose waiters are served by priority, then arrival order."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: List[tuple] = []
+        self._seq = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return not self._waiters and self.tokens >= self.burst and self.paused_until <= time.monotonic()
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and self.paused_until <= time.monotonic():
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        while self._waiters:
+            self._refill()
+            wait = max(self.paused_until - time.monotonic(), (1 - self.tokens) / self.rate)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+
+class _ChatQueue:
+    __slots__ = ("bucket", "lock", "pending", "last_unsent")
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        # (data, future) of the newest sendMessage still waiting its turn, for coalescing.
+        self.last_unsent = None
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Paces outgoing Bot API calls under Telegram's global and per-chat limits.
+
+    Requests that carry a ``chat_id`` take a token from that chat's bucket (in
+    order, so replies never overtake each other) and then from the global bucket,
+    where waiting requests are served by priority lane. RetryAfter answers pause
+    the chat's bucket and the request is retried. With ``coalesce`` on, a
+    sendMessage queued behind another message to the same chat is appended to
+    that message instead of being sent separately; callers can opt out with
+    rate_limit_args={"coalesce": False} when they plan to edit the message.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 group_rate: float = 20 / 60, max_retries: int = 3, coalesce: bool = False):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.coalesce = coalesce
+        self._chats: Dict[Any, _ChatQueue] = {}
+        self.sent = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.retry_afters = 0
+        self.coalesced = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback: Callable[..., Coroutine[Any, Any, Any]], args: Any,
+                              kwargs: Dict[str, Any], endpoint: str, data: Dict[str, Any],
+                              rate_limit_args: Optional[dict]):
+        options = rate_limit_args or {}
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._call_with_retries(callback, args, kwargs, None)
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            rate = self.group_rate if str(chat_id).startswith("-") else self.chat_rate
+            chat = self._chats[chat_id] = _ChatQueue(rate, self.chat_burst)
+
+        coalescable = self.coalesce and endpoint == "sendMessage" and options.get("coalesce", True)
+        if coalescable and self._merge(chat, data):
+            self.coalesced += 1
+            return await asyncio.shield(chat.last_unsent[1])
+
+        future = asyncio.get_running_loop().create_future() if coalescable else None
+        # Anything else queued for the chat in between must not be overtaken by a later merge.
+        chat.last_unsent = (data, future) if coalescable else None
+        chat.pending += 1
+        queued_at = time.monotonic()
+        try:
+            async with chat.lock:
+                await chat.bucket.acquire()
+                await self.global_bucket.acquire(options.get("priority", INTERACTIVE))
+                if chat.last_unsent is not None and chat.last_unsent[1] is future:
+                    chat.last_unsent = None
+                waited = time.monotonic() - queued_at
+                if waited > 0.001:
+                    self.delayed += 1
+                    self.wait_total += waited
+                result = await self._call_with_retries(callback, args, kwargs, chat)
+            if future is not None:
+                future.set_result(result)
+            return result
+        except BaseException as e:
+            if future is not None and not future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # Mark the exception as retrieved when no merged request is waiting on it.
+                    future.exception()
+            raise
+        finally:
+            chat.pending -= 1
+            if chat.last_unsent is not None and chat.last_unsent[1] is future:
+                chat.last_unsent = None
+            if len(self._chats) > 1000:
+                self._prune()
+
+    def _merge(self, chat: _ChatQueue, data: Dict[str, Any]) -> bool:
+        if chat.last_unsent is None:
+            return False
+        queued, _ = chat.last_unsent
+        if any(queued.get(field) for field in UNMERGEABLE_FIELDS):
+            return False
+        if any(data.get(field) for field in UNMERGEABLE_FIELDS if field != "reply_markup"):
+            return False
+        if queued.get("parse_mode") != data.get("parse_mode"):
+            return False
+        text = f"{queued['text']}\n\n{data['text']}"
+        if len(text) > MAX_MESSAGE_LENGTH:
+            return False
+        queued["text"] = text
+        # The merged message takes over the keyboard of the last part, which closes it to further merges.
+        if data.get("reply_markup"):
+            queued["reply_markup"] = data["reply_markup"]
+        return True
+
+    async def _call_with_retries(self, callback, args, kwargs, chat: Optional[_ChatQueue]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retry_afters += 1
+                delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else float(e.retry_after)
+                logger.warning(f"Telegram asked to retry after {delay}s; pausing {'chat' if chat else 'request'}")
+                if chat is not None:
+                    chat.bucket.pause(delay)
+                await asyncio.sleep(delay)
+
+    def _prune(self):
+        for chat_id in [cid for cid, chat in self._chats.items() if not chat.pending and chat.bucket.idle]:
+            del self._chats[chat_id]
+
+    def stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "delayed": self.delayed,
+            "avg_delay_ms": round(self.wait_total / self.delayed * 1000, 1) if self.delayed else 0.0,
+            "retry_after": self.retry_afters,
+            "coalesced": self.coalesced,
+            "chats_tracked": len(self._chats),
+            "queued": sum(chat.pending for chat in self._chats.values()),
+            "global_waiting": len(self.global_bucket._waiters),
+        }
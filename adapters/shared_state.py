@@ -0,0 +1,223 @@
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Dict, Optional, Set, Tuple
+from telegram.ext import Application, BasePersistence, ConversationHandler, PersistenceInput
+from adapters.update_processor import KeyedUpdateProcessor
+from services.state_store import LockTimeoutError, StateStore
+
+logger = logging.getLogger(__name__)
+
+
+class SharedConversationHandler(ConversationHandler):
+    """ConversationHandler whose states for one user can be replaced from a StateStore.
+
+    PTB reads conversation states from persistence once, at startup. With
+    several replicas another one may have moved a user's flow on since, so
+    ``StorePersistence.load_user`` hands each handler that user's stored
+    states before every update through ``load_user_states``.
+    """
+
+    def has_conversation(self, key: tuple) -> bool:
+        """Whether the user/chat ``key`` is currently inside this conversation."""
+        return key in self._conversations
+
+    def load_user_states(self, user_id: int, states: Dict[tuple, object]):
+        """Replace ``user_id``'s states with ``states`` without tracking it as a change to persist."""
+        conversations = self._conversations
+        for key in [k for k in conversations if k[-1] == user_id and k not in states]:
+            conversations.data.pop(key, None)
+        conversations.update_no_track(states)
+
+
+class StorePersistence(BasePersistence):
+    """PTB persistence backed by a shared StateStore.
+
+    Only user_data and conversation states are kept. Writes handed over by the
+    Application are buffered and sent to the store as one batch by
+    ``flush_pending``, which the update processor calls before releasing a
+    user's lock. Writes for users whose lock this replica does not hold are
+    dropped: PTB marks a user dirty again after the update task ends, and that
+    copy may be older than what another replica has stored since.
+    """
+
+    def __init__(self, store: StateStore, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+        self._pending_user_data: Dict[int, Optional[dict]] = {}
+        self._pending_conversations: Dict[Tuple[str, tuple], object] = {}
+        self._flush_lock = asyncio.Lock()
+        self.active_users: Set[int] = set()
+        self.batches = 0
+        self.skipped_writes = 0
+        self.batched_writes = 0
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return await self.store.load_user_data()
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {key: state for _, key, state in await self.store.load_conversations(name=name)}
+
+    def _accepts(self, user_id: int) -> bool:
+        if user_id in self.active_users:
+            return True
+        self.skipped_writes += 1
+        return False
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]):
+        if self._accepts(key[-1]):
+            self._pending_conversations[(name, key)] = new_state
+
+    async def update_user_data(self, user_id: int, data: dict):
+        if self._accepts(user_id):
+            self._pending_user_data[user_id] = data
+
+    async def drop_user_data(self, user_id: int):
+        if self._accepts(user_id):
+            self._pending_user_data[user_id] = None
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        # The update processor reloads the user's state under their lock before each update.
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def load_user(self, application: Application, user_id: int):
+        """Replace this replica's copy of ``user_id``'s user_data and conversation states with the stored ones."""
+        stored_data, rows = await asyncio.gather(
+            self.store.load_user_data([user_id]), self.store.load_conversations(user_id=user_id)
+        )
+        user_data = application.user_data[user_id]
+        user_data.clear()
+        user_data.update(stored_data.get(user_id, {}))
+
+        for handler in itertools.chain.from_iterable(application.handlers.values()):
+            if isinstance(handler, SharedConversationHandler) and handler.persistent:
+                handler.load_user_states(user_id, {key: state for name, key, state in rows if name == handler.name})
+
+    async def flush_pending(self):
+        async with self._flush_lock:
+            if not self._pending_user_data and not self._pending_conversations:
+                return
+            user_data, self._pending_user_data = self._pending_user_data, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            await self.store.write_batch(user_data, conversations)
+            self.batches += 1
+            self.batched_writes += len(user_data) + len(conversations)
+
+    async def flush(self):
+        await self.flush_pending()
+        await self.store.close()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "writes_per_batch": round(self.batched_writes / self.batches, 2) if self.batches else 0.0,
+            "skipped_writes": self.skipped_writes,
+            "lock_waits": self.store.lock_waits,
+        }
+
+
+class SharedStateUpdateProcessor(KeyedUpdateProcessor):
+    """Processes each update under its user's store lock with freshly loaded state.
+
+    Before the handlers run, the user's user_data and conversation states are
+    reloaded from the store (another replica may have advanced the flow); after
+    they finish, the changes are flushed so the next replica sees them. The
+    per-user ordering of KeyedUpdateProcessor keeps a replica from racing itself.
+
+    When another replica holds the user's lock past the store's lock timeout,
+    the update is retried in place (still holding this replica's per-user
+    turn, so later updates from the user wait behind it) up to
+    ``lock_retries`` times with a growing pause. Only then is it dropped and
+    the user told to try again.
+    """
+
+    def __init__(self, persistence: StorePersistence, lock_retries: int = 3, **kwargs):
+        super().__init__(**kwargs)
+        self.persistence = persistence
+        self.lock_retries = lock_retries
+        self.application: Optional[Application] = None
+        self.lock_timeouts = 0
+        self.lock_failures = 0
+
+    async def _process(self, user_id: Optional[int], update: object, coroutine: Awaitable[Any]):
+        if user_id is None:
+            await coroutine
+            return
+
+        if self._is_unordered(update) and user_id in self.persistence.active_users:
+            # The update being cancelled holds the store lock on this replica and
+            # shares this user_data; its flush persists what /cancel changed.
+            await coroutine
+            if user_id not in self.persistence.active_users:
+                await self.application.update_persistence()
+                await self.persistence.flush_pending()
+            return
+
+        update_id = getattr(update, "update_id", "?")
+        delay = 1.0
+        for attempt in range(self.lock_retries + 1):
+            started = False
+            try:
+                async with self.persistence.store.lock(f"user:{user_id}"):
+                    started = True
+                    await self.persistence.load_user(self.application, user_id)
+                    self.persistence.active_users.add(user_id)
+                    try:
+                        await coroutine
+                    finally:
+                        await self.application.update_persistence()
+                        await self.persistence.flush_pending()
+                        self.persistence.active_users.discard(user_id)
+                return
+            except LockTimeoutError as e:
+                if started:
+                    raise
+                # Another replica is still busy with this user; wait and try again here, so
+                # the update keeps its place ahead of the user's later ones.
+                self.lock_timeouts += 1
+                if attempt == self.lock_retries:
+                    break
+                logger.warning(f"{e}; retrying update {update_id} in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.persistence.store.lock_lease)
+
+        self.lock_failures += 1
+        coroutine.close()
+        logger.error(f"Dropping update {update_id}: user {user_id}'s state stayed locked after {self.lock_retries} retries")
+        await self._notify_dropped(update)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["lock_timeouts"] = self.lock_timeouts
+        stats["lock_failures"] = self.lock_failures
+        return stats
@@ -1,5 +1,10 @@
+import asyncio
+import io
+import json
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import os
+from urllib.parse import urlparse
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -10,10 +15,29 @@ from telegram.ext import (
     ContextTypes,
 )
 from adapters.base_adapter import BaseChatAdapter
+from adapters.flow_dispatcher import FREE, SELECTED_ISSUE, FlowDispatcher
+from adapters.outbound_scheduler import MAX_MESSAGE_LENGTH, OutboundScheduler
+from adapters.shared_state import SharedConversationHandler, SharedStateUpdateProcessor, StorePersistence
+from adapters.update_processor import KeyedUpdateProcessor
+from adapters.webhook_server import WebhookServer, serve as serve_webhook
 from handlers.auth_handler import AuthHandler
 from handlers.issue_handler import IssueHandler
 from handlers.project_handler import ProjectHandler
 from handlers.time_entry_handler import TimeEntryHandler
+from handlers.timesheet_handler import TimesheetHandler
+from services.database_service import DatabaseService, close_pools
+from services.redmine_service import RedmineService, close_http_clients, redmine_registry
+from services.reference_data import reference_data
+from services.llm_executor import llm_executor
+from services.worklog_parser import worklog_parser
+from services.parse_cache import parse_cache
+from services.chunked_parser import chunked_parser
+from services.activity_index import activity_resolver
+from services.time_entry_submitter import time_entry_submitter
+from services.timesheet_service import timesheet_service
+from services.prefetcher import prefetcher
+from services.intent_router import intent_router
+from services.state_store import create_state_store
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -22,21 +46,125 @@ logger.addHandler(logging.NullHandler())
 class TelegramBotAdapter(BaseChatAdapter):
     def __init__(self, token: str):
         self.token = token
-        self.app = Application.builder().token(token).build()
+        # Outgoing calls are paced under Telegram's global and per-chat limits.
+        self.outbound = OutboundScheduler(
+            global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),
+            chat_rate=float(os.getenv("OUTBOUND_CHAT_RATE", "1")),
+            chat_burst=float(os.getenv("OUTBOUND_CHAT_BURST", "3")),
+            max_retries=int(os.getenv("OUTBOUND_MAX_RETRIES", "3")),
+            coalesce=os.getenv("OUTBOUND_COALESCE", "false").lower() == "true",
+        )
+        builder = Application.builder().token(token).rate_limiter(self.outbound).post_shutdown(self.on_shutdown)
+
+        # Updates from different users run concurrently; each user's run in order.
+        processor_options = dict(
+            workers=int(os.getenv("BOT_CONCURRENT_UPDATES", "8")),
+            max_pending=int(os.getenv("BOT_MAX_PENDING_UPDATES", "256")),
+            max_queued_per_user=int(os.getenv("BOT_MAX_QUEUED_PER_USER", "10")),
+        )
+        # With STATE_STORE set, user_data and conversation states live in a shared store
+        # so several replicas can serve the same users.
+        self.persistence = None
+        state_store = create_state_store()
+        if state_store:
+            self.persistence = StorePersistence(state_store)
+            self.update_processor = SharedStateUpdateProcessor(
+                self.persistence, lock_retries=int(os.getenv("STATE_LOCK_RETRIES", "3")), **processor_options
+            )
+            builder = builder.persistence(self.persistence)
+            # A /setup on another replica only invalidates that replica's user cache, so cached
+            # user rows (and through them the API key a RedmineService is picked by) must expire soon.
+            DatabaseService.user_cache.ttl = min(
+                DatabaseService.user_cache.ttl, float(os.getenv("SHARED_USER_CACHE_TTL", "5"))
+            )
+        else:
+            self.update_processor = KeyedUpdateProcessor(**processor_options)
+        builder = builder.concurrent_updates(self.update_processor)
+
+        self.app = builder.build()
+        if self.persistence:
+            self.update_processor.application = self.app
 
         # Handlers / services
         self.auth_handler = AuthHandler()
         self.issue_handler = IssueHandler()
         self.project_handler = ProjectHandler()
         self.time_entry_handler = TimeEntryHandler()
+        self.timesheet_handler = TimesheetHandler()
+
+        # Prefetch the same issue list show_my_issues asks for, and back off while updates pile up.
+        prefetcher.issue_limit = IssueHandler.ISSUES_FETCH_LIMIT
+        prefetcher.project_limit = ProjectHandler.PROJECTS_LIMIT
+        prefetcher.busy = lambda: self.update_processor.saturated
+        intent_router.classifier = self.time_entry_handler.gemini.classify_intents
+
+        self.mode = os.getenv("BOT_MODE", "polling").lower()
+        self.webhook_server = None
+        self.admin_ids = {i.strip() for i in os.getenv("ADMIN_TELEGRAM_IDS", "").split(",") if i.strip()}
 
         self.register_handlers()
 
+    def run(self):
+        """Block until stopped, receiving updates via long polling or a webhook per BOT_MODE."""
+        if self.mode == "webhook":
+            asyncio.run(self.start())
+        else:
+            self.app.run_polling()
+
     async def start(self):
-        logger.info("Telegram bot starting...")
+        logger.info("Telegram bot starting in %s mode...", self.mode)
+        if self.mode != "webhook":
+            await self.app.initialize()
+            await self.app.start()
+            await self.app.updater.start_polling()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.app.updater.stop()
+                await self.app.stop()
+                await self.app.shutdown()
+                await self.on_shutdown(self.app)
+            return
+
+        webhook_url = os.getenv("WEBHOOK_URL")
+        if not webhook_url:
+            raise RuntimeError("WEBHOOK_URL must be set when BOT_MODE=webhook")
+        secret_token = os.getenv("WEBHOOK_SECRET")
+        if not secret_token:
+            raise RuntimeError("WEBHOOK_SECRET must be set when BOT_MODE=webhook; without it any POST is accepted")
+        max_connections = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+        self.webhook_server = WebhookServer(
+            self.app, urlparse(webhook_url).path, secret_token, update_processor=self.update_processor
+        )
+
         await self.app.initialize()
+        await self.app.bot.set_webhook(
+            webhook_url, secret_token=secret_token, max_connections=max_connections,
+            allowed_updates=Update.ALL_TYPES,
+        )
         await self.app.start()
-        await self.app.run_polling()
+        try:
+            await serve_webhook(
+                self.webhook_server,
+                host=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+                port=int(os.getenv("WEBHOOK_PORT", "8443")),
+                max_connections=max_connections,
+            )
+        finally:
+            self.webhook_server.draining = True
+            logger.info("Draining %d queued updates...", self.app.update_queue.qsize())
+            try:
+                # stop() finishes every update already in the queue before returning.
+                await asyncio.wait_for(self.app.stop(), float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30")))
+            except asyncio.TimeoutError:
+                logger.warning("Timed out draining updates; pending updates will be redelivered by Telegram.")
+            await self.app.shutdown()
+            await self.on_shutdown(self.app)
+
+    async def on_shutdown(self, app: Application):
+        logger.info("Releasing pooled resources...")
+        await close_http_clients()
+        await asyncio.get_running_loop().run_in_executor(None, close_pools)
 
     async def send_message(self, chat_id: str, message: str):
         await self.app.bot.send_message(chat_id=chat_id, text=message)
@@ -53,9 +181,12 @@ class TelegramBotAdapter(BaseChatAdapter):
         self.app.add_handler(CommandHandler("start", self.start_command))
         self.app.add_handler(CommandHandler("help", self.help_command))
         self.app.add_handler(CommandHandler("menu", self.menu_command))
+        self.app.add_handler(CommandHandler("stats", self.stats_command))
+        self.app.add_handler(CommandHandler("refresh", self.auth_handler.refresh_reference_data))
+        self.app.add_handler(CommandHandler("timesheet", self.timesheet_handler.show_timesheet))
 
         # Auth conversation
-        auth_conv = ConversationHandler(
+        auth_conv = SharedConversationHandler(
             entry_points=[CommandHandler("setup", self.auth_handler.start_setup)],
             states={
                 self.auth_handler.EMPLOYEE_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.auth_handler.get_employee_id)],
@@ -64,11 +195,13 @@ class TelegramBotAdapter(BaseChatAdapter):
                 self.auth_handler.PROJECT_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.auth_handler.get_project_id)],
             },
             fallbacks=[CommandHandler("cancel", self.cancel_command)],
+            name="setup",
+            persistent=self.persistence is not None,
         )
         self.app.add_handler(auth_conv)
 
         # Log time conversation
-        time_conv = ConversationHandler(
+        time_conv = SharedConversationHandler(
             entry_points=[
                 CommandHandler("logtime", self.time_entry_handler.start_log_time),
                 CallbackQueryHandler(self.time_entry_handler.start_log_time, pattern="^menu_logtime$")
@@ -83,11 +216,13 @@ class TelegramBotAdapter(BaseChatAdapter):
             },
             fallbacks=[CommandHandler("cancel", self.cancel_command)],
             allow_reentry=True,
+            name="logtime",
+            persistent=self.persistence is not None,
         )
         self.app.add_handler(time_conv)
 
         # Issue creation conversation
-        issue_conv = ConversationHandler(
+        issue_conv = SharedConversationHandler(
             entry_points=[CallbackQueryHandler(self.issue_handler.start_create_issue, pattern="^menu_create_issue$")],
             states={
                 self.issue_handler.ASK_PROJECT: [CallbackQueryHandler(self.issue_handler.handle_project_choice)],
@@ -99,14 +234,43 @@ class TelegramBotAdapter(BaseChatAdapter):
             },
             fallbacks=[CommandHandler("cancel", self.cancel_command)],
             allow_reentry=True,
+            name="create_issue",
+            persistent=self.persistence is not None,
         )
         self.app.add_handler(issue_conv)
 
+        # /cancel outside a conversation, e.g. while a quick log for a /myissues issue is parsing
+        self.app.add_handler(CommandHandler("cancel", self.cancel_command))
+
+        # Admin bulk onboarding: a CSV/JSONL document captioned /importusers
+        self.app.add_handler(MessageHandler(
+            filters.Document.ALL & filters.CaptionRegex(r"^/importusers\b"), self.import_users_command
+        ))
+
         # General handlers
         self.app.add_handler(CallbackQueryHandler(self.issue_selected_callback, pattern=r"^logtime_"))
+        self.app.add_handler(CallbackQueryHandler(self.issue_handler.show_issues_page, pattern=r"^issues_page_\d+$"))
         self.app.add_handler(CallbackQueryHandler(self.button_handler))
-        self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.time_entry_handler.quick_log_for_selected_issue))
-        self.app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
+
+        # Free text: one lookup on the user's flow state instead of walking every handler
+        self.flow_dispatcher = FlowDispatcher(
+            [auth_conv, time_conv, issue_conv],
+            {
+                SELECTED_ISSUE: self.time_entry_handler.quick_log_for_selected_issue,
+                FREE: self.handle_message,
+            },
+        )
+        self.app.add_handler(self.flow_dispatcher, group=-1)
+
+        # Background jobs
+        if self.app.job_queue:
+            self.app.job_queue.run_repeating(
+                self.timesheet_handler.reconcile_job,
+                interval=float(os.getenv("TIMESHEET_RECONCILE_JOB_INTERVAL", "600")),
+                first=60,
+            )
+        else:
+            logger.warning("JobQueue unavailable (install python-telegram-bot[job-queue]); timesheets will not be reconciled")
 
         logger.debug("Handler registration complete.")
 
@@ -143,14 +307,17 @@ Once setup is completed and authenticated, you can also use natural language to
 - /logtime — Log time entries
 - /myissues — View assigned issues
 - /projects — View your projects
+- /timesheet — Hours this week (or: lastweek, month, lastmonth)
 
 **Other**
+- /refresh — Reload activities, trackers and priorities from Redmine
 - /help — Show this message
 - /cancel — Cancel current operation
 """
         await update.message.reply_text(help_msg, parse_mode="Markdown")
 
     async def menu_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        prefetcher.schedule(context, str(update.effective_user.id))
         buttons = [
             {"text": "📋 My Issues", "data": "menu_issues"},
             {"text": "📁 My Projects", "data": "menu_projects"},
@@ -225,19 +392,90 @@ Once setup is completed and authenticated, you can also use natural language to
         if context.user_data.get("in_conversation"):
             return
 
-        message = update.message.text.lower()
-        if any(word in message for word in ["issue", "task", "bug"]):
+        match = await intent_router.route(update.message.text)
+        logger.debug("Routed message to %s (confidence=%s, source=%s)", match.intent, match.confidence, match.source)
+        if match.intent == "my_issues":
             await self.issue_handler.show_my_issues(update, context)
-        elif any(word in message for word in ["project", "projects"]):
+        elif match.intent == "projects":
             await self.project_handler.show_projects(update, context)
-        elif any(word in message for word in ["time", "log", "work"]):
+        elif match.intent == "timesheet":
+            await self.timesheet_handler.show_timesheet(update, context, period=match.slots.get("period", "week"))
+        elif match.intent == "log_time":
+            found = []
+            if match.slots.get("hours"):
+                found.append(f"{match.slots['hours']}h")
+            if match.slots.get("issue_ids"):
+                found.append(", ".join(f"#{i}" for i in match.slots["issue_ids"]))
+            hint = f" ({' on '.join(found)})" if found else ""
             await update.message.reply_text(
-                "To log time, use /logtime or click *Log Time* from /menu", parse_mode="Markdown"
+                f"Looks like you want to log time{hint}. Tap below and send your work log.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⏱️ Log Time", callback_data="menu_logtime")]]),
             )
+        elif match.intent == "create_issue":
+            await update.message.reply_text(
+                "Tap below to create a new issue.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("➕ Create Issue", callback_data="menu_create_issue")]]),
+            )
+        elif match.intent == "help":
+            await self.help_command(update, context)
+        elif match.intent == "menu":
+            await self.menu_command(update, context)
+        elif match.intent == "setup":
+            await update.message.reply_text("Use /setup to connect your Redmine account.")
         else:
             await update.message.reply_text("I'm not sure what you mean. Try /help or /menu.")
 
+    def collect_stats(self) -> dict:
+        stats = {
+            "update_processor": self.update_processor.stats(),
+            "flow_dispatch": self.flow_dispatcher.stats(),
+            "outbound": self.outbound.stats(),
+            "user_cache": DatabaseService.user_cache_stats(),
+            "redmine_registry": redmine_registry.stats(),
+            "redmine_http_cache": RedmineService.cache_stats(),
+            "reference_data": reference_data.stats(),
+            "llm_executor": llm_executor.stats(),
+            "llm_parse_latency": self.time_entry_handler.parse_stats(),
+            "chunked_parser": chunked_parser.stats(),
+            "activity_resolver": activity_resolver.stats(),
+            "worklog_fast_path": worklog_parser.stats(),
+            "parse_cache": parse_cache.stats(),
+            "time_entry_submitter": time_entry_submitter.stats(),
+            "timesheet": timesheet_service.stats(),
+            "prefetch": prefetcher.stats(),
+            "intent_router": intent_router.stats(),
+        }
+        if self.persistence:
+            stats["shared_state"] = self.persistence.stats()
+        if self.webhook_server:
+            stats["webhook"] = self.webhook_server.stats()
+        return stats
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if str(update.effective_user.id) not in self.admin_ids:
+            await update.message.reply_text("This command is restricted to administrators.")
+            return
+        stats = json.dumps(self.collect_stats(), indent=2, default=str)
+        text = f"Runtime stats:\n{stats}"
+        if len(text) <= MAX_MESSAGE_LENGTH:
+            await update.message.reply_text(text)
+            return
+        # The full dump outgrows one message once webhook, shared-state and per-user stats are in.
+        await update.message.reply_document(
+            InputFile(io.BytesIO(stats.encode()), filename="stats.json"),
+            caption="Runtime stats",
+        )
+
+    async def import_users_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if str(update.effective_user.id) not in self.admin_ids:
+            await update.message.reply_text("This command is restricted to administrators.")
+            return
+        await self.auth_handler.bulk_import(update, context)
+
     async def cancel_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        llm_executor.cancel_user(str(update.effective_user.id))
+        prefetcher.cancel(str(update.effective_user.id))
+        # Also drops selected_issue_id, which ends a quick log for an issue picked from /myissues.
         context.user_data.clear()
         await update.message.reply_text("Operation cancelled. Use /menu to start over.")
         return ConversationHandler.END
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Dict, Optional
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates from different users concurrently and each user's updates in order.
+
+    Handlers keep flow state in ``context.user_data`` and assume nothing else
+    touches it mid-update, so every user gets a FIFO lock; a worker slot is
+    only taken once the user's turn has come, so one busy user cannot tie up
+    the pool. ``max_pending`` bounds how many updates may be in the processor
+    at once (``saturated`` lets the webhook shed load beyond that), and a user
+    with ``max_queued_per_user`` updates already waiting has further ones
+    dropped, and the user is told so.
+
+    Commands in ``UNORDERED_COMMANDS`` skip the user's lock (and the worker
+    pool): /cancel has to run while the update it cancels is still in flight.
+    """
+
+    TRACKED_USERS = 1000
+    UNORDERED_COMMANDS = ("/cancel",)
+
+    def __init__(self, workers: int = 8, max_pending: int = 256, max_queued_per_user: int = 10):
+        super().__init__(max_pending)
+        self.workers = workers
+        self.max_queued_per_user = max_queued_per_user
+        self._worker_slots = asyncio.Semaphore(workers)
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._depth: Dict[int, int] = {}
+        self._busy = 0
+        self._durations = deque(maxlen=1000)
+        self._per_user: "OrderedDict[int, dict]" = OrderedDict()
+        self.processed = 0
+        self.dropped = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.current_concurrent_updates >= self.max_concurrent_updates
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            async with self._worker_slots:
+                await self._timed(None, 0, update, coroutine)
+            return
+
+        if self._is_unordered(update):
+            await self._timed(user.id, 0, update, coroutine)
+            return
+
+        depth = self._depth.get(user.id, 0)
+        if depth >= self.max_queued_per_user:
+            self.dropped += 1
+            coroutine.close()
+            logger.warning(f"Dropping update {getattr(update, 'update_id', '?')}: user {user.id} has {depth} queued")
+            await self._notify_dropped(update)
+            return
+
+        self._depth[user.id] = depth + 1
+        lock = self._user_locks.setdefault(user.id, asyncio.Lock())
+        try:
+            async with lock:
+                async with self._worker_slots:
+                    await self._timed(user.id, depth + 1, update, coroutine)
+        finally:
+            self._depth[user.id] -= 1
+            if not self._depth[user.id]:
+                del self._depth[user.id]
+                del self._user_locks[user.id]
+
+    def _is_unordered(self, update: object) -> bool:
+        message = getattr(update, "effective_message", None)
+        text = getattr(message, "text", None) or ""
+        command = text.split(maxsplit=1)[0].split("@", 1)[0] if text.startswith("/") else ""
+        return command in self.UNORDERED_COMMANDS
+
+    @staticmethod
+    async def _notify_dropped(update: object):
+        message = getattr(update, "effective_message", None)
+        if message is None:
+            return
+        try:
+            await message.reply_text("⏳ I'm still working on your earlier messages. Please wait, or send /cancel.")
+        except Exception as e:
+            logger.warning(f"Could not tell user about dropped update: {e}")
+
+    async def _timed(self, user_id: Optional[int], depth: int, update: object, coroutine: Awaitable[Any]):
+        started = time.perf_counter()
+        self._busy += 1
+        try:
+            await self._process(user_id, update, coroutine)
+        finally:
+            self._busy -= 1
+            self._record(user_id, depth, time.perf_counter() - started)
+
+    async def _process(self, user_id: Optional[int], update: object, coroutine: Awaitable[Any]):
+        """Run one update; subclasses wrap this with extra per-user work."""
+        await coroutine
+
+    def _record(self, user_id: Optional[int], depth: int, duration: float):
+        self.processed += 1
+        self._durations.append(duration)
+        if user_id is None:
+            return
+        entry = self._per_user.pop(user_id, None) or {"processed": 0, "total_time": 0.0, "max_depth": 0}
+        entry["processed"] += 1
+        entry["total_time"] += duration
+        entry["max_depth"] = max(entry["max_depth"], depth)
+        self._per_user[user_id] = entry
+        while len(self._per_user) > self.TRACKED_USERS:
+            self._per_user.popitem(last=False)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        deepest = sorted(self._depth.items(), key=lambda item: item[1], reverse=True)[:5]
+        slowest = sorted(
+            self._per_user.items(), key=lambda item: item[1]["total_time"] / item[1]["processed"], reverse=True
+        )[:5]
+        return {
+            "workers": self.workers,
+            "busy": self._busy,
+            "pending": self.current_concurrent_updates,
+            "max_pending": self.max_concurrent_updates,
+            "users_queued": len(self._depth),
+            "deepest_user_queues": {str(user_id): depth for user_id, depth in deepest},
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "processing_ms_p50": round(_percentile(self._durations, 50) * 1000, 1),
+            "processing_ms_p95": round(_percentile(self._durations, 95) * 1000, 1),
+            "slowest_users_avg_ms": {
+                str(user_id): round(entry["total_time"] / entry["processed"] * 1000, 1) for user_id, entry in slowest
+            },
+        }
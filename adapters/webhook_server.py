@@ -0,0 +1,147 @@
+import hmac
+import json
+import logging
+import re
+import time
+from typing import Optional
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+# What Telegram accepts as setWebhook's secret_token.
+SECRET_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+
+class WebhookServer:
+    """Minimal ASGI app that feeds Telegram webhook POSTs into ``application.update_queue``.
+
+    Requests must carry the secret token registered with ``setWebhook`` in the
+    ``X-Telegram-Bot-Api-Secret-Token`` header; the token is required, since
+    without it anyone who finds the URL could post updates as any user. Once ``draining`` is set the app
+    answers 503 so Telegram retries the update against another replica, while
+    updates already queued are finished by ``Application.stop``. The same 503
+    is returned while ``update_processor`` is saturated, so Telegram holds
+    back updates instead of them piling up in memory.
+    """
+
+    def __init__(self, application: Application, path: str, secret_token: str, update_processor=None):
+        if not secret_token or not SECRET_TOKEN_RE.fullmatch(secret_token):
+            raise ValueError("The webhook secret token must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+        self.application = application
+        self.update_processor = update_processor
+        self.path = path or "/"
+        self.secret_token = secret_token.encode()
+        self.draining = False
+        self.accepted = 0
+        self.rejected = 0
+        self._latency_total = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        if scope["path"] == "/healthz":
+            await self._respond(send, 503 if self.draining else 200, b"draining" if self.draining else b"ok")
+            return
+        if scope["path"] != self.path:
+            await self._respond(send, 404)
+            return
+        if scope["method"] != "POST":
+            await self._respond(send, 405)
+            return
+        if self.draining or (self.update_processor is not None and self.update_processor.saturated):
+            self.rejected += 1
+            await self._respond(send, 503)
+            return
+
+        headers = dict(scope["headers"])
+        if not hmac.compare_digest(headers.get(b"x-telegram-bot-api-secret-token", b""), self.secret_token):
+            self.rejected += 1
+            logger.warning("Rejected webhook request with an invalid secret token")
+            await self._respond(send, 403)
+            return
+
+        started = time.perf_counter()
+        body = await self._read_body(receive)
+        if body is None:
+            self.rejected += 1
+            await self._respond(send, 413)
+            return
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            self.rejected += 1
+            logger.warning(f"Rejected malformed webhook update: {e}")
+            await self._respond(send, 400)
+            return
+
+        await self.application.update_queue.put(update)
+        self.accepted += 1
+        self._latency_total += time.perf_counter() - started
+        await self._respond(send, 200)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.draining = True
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> Optional[bytes]:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_SIZE:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes = b""):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self) -> dict:
+        return {
+            "draining": self.draining,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "queued": self.application.update_queue.qsize(),
+            "avg_enqueue_ms": round(self._latency_total / self.accepted * 1000, 2) if self.accepted else 0.0,
+        }
+
+
+async def serve(server: WebhookServer, host: str, port: int, max_connections: int):
+    """Run ``server`` under uvicorn until SIGINT/SIGTERM, refusing new updates while connections drain."""
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise RuntimeError("Webhook mode needs uvicorn: pip install uvicorn") from e
+
+    class _DrainingServer(uvicorn.Server):
+        def handle_exit(self, sig, frame):
+            server.draining = True
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(
+        server, host=host, port=port, limit_concurrency=max_connections,
+        log_level="warning", access_log=False,
+    )
+    await _DrainingServer(config).serve()
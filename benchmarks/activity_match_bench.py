@@ -0,0 +1,139 @@
+# benchmarks/activity_match_bench.py
+"""
+Correctness and latency of activity resolution for parsed time entries.
+
+Each corpus item pairs the activity text Gemini or a user produced with the
+activity it should resolve to, or None when no activity fits and the entry
+must fall back to the instance default. The precomputed ActivityIndex is
+compared against the substring scan the handlers used before. "index" is a
+lookup without the per-index memo, the cost every distinct activity text
+pays; "index, memo" repeats texts the memo already holds.
+
+Usage:
+    python -m benchmarks.activity_match_bench --activities 40 --iterations 2000
+"""
+
+import argparse
+import statistics
+import time
+from services.activity_index import ActivityIndex, normalize
+
+ACTIVITIES = [
+    {"id": 8, "name": "Design"},
+    {"id": 9, "name": "Development", "is_default": True},
+    {"id": 10, "name": "Testing"},
+    {"id": 11, "name": "Code Review"},
+    {"id": 12, "name": "Meeting"},
+    {"id": 13, "name": "Documentation"},
+    {"id": 14, "name": "Support"},
+    {"id": 15, "name": "Deployment"},
+    {"id": 16, "name": "Research & Analysis"},
+    {"id": 17, "name": "Project Management"},
+]
+
+CORPUS = [
+    ("Development", "Development"),
+    ("development", "Development"),
+    ("Dev", "Development"),
+    ("coding", "Development"),
+    ("Bug fixing", "Development"),
+    ("Developement", "Development"),
+    ("Review", "Code Review"),
+    ("code review", "Code Review"),
+    ("PR review", "Code Review"),
+    ("Testing", "Testing"),
+    ("QA", "Testing"),
+    ("Regression tests", "Testing"),
+    ("Tesing", "Testing"),
+    ("Meeting", "Meeting"),
+    ("Daily standup", "Meeting"),
+    ("Client call", "Meeting"),
+    ("Docs", "Documentation"),
+    ("Writing documentation", "Documentation"),
+    ("Documentaion", "Documentation"),
+    ("Customer support", "Support"),
+    ("Incident", "Support"),
+    ("Release", "Deployment"),
+    ("Deploy to prod", "Deployment"),
+    ("Research", "Research & Analysis"),
+    ("Investigation", "Research & Analysis"),
+    ("Sprint planning", "Project Management"),
+    ("Management", "Project Management"),
+    ("UI mockups", "Design"),
+    ("Design", "Design"),
+    ("Lunch", None),
+    ("Travel", None),
+    ("", None),
+]
+
+
+def legacy_match(name: str, activities: list):
+    """The nested substring scan process_work_log used, falling back to the first activity."""
+    activity_map = {a["name"].lower(): a["id"] for a in activities}
+    name = name.lower()
+    for act_name, act_id in activity_map.items():
+        if name in act_name or act_name in name:
+            return next(a for a in activities if a["id"] == act_id)
+    return activities[0]
+
+
+def padded(count: int) -> list:
+    extra = [{"id": 100 + i, "name": f"Custom Activity {i}"} for i in range(max(0, count - len(ACTIVITIES)))]
+    return ACTIVITIES + extra
+
+
+def accuracy(resolve) -> float:
+    correct = 0
+    for text, expected in CORPUS:
+        activity = resolve(text)
+        correct += (activity["name"] if activity else None) == expected
+    return correct / len(CORPUS)
+
+
+def latency_us(resolve, iterations: int) -> list:
+    samples = []
+    for i in range(iterations):
+        text = CORPUS[i % len(CORPUS)][0]
+        started = time.perf_counter()
+        resolve(text)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def main(args):
+    activities = padded(args.activities)
+    started = time.perf_counter()
+    index = ActivityIndex(activities)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    def memoized(text):
+        activity, score = index.match(text)
+        return activity if score >= args.min_score else None
+
+    def legacy(text):
+        return legacy_match(text, activities)
+
+    def cold(text):
+        activity, score = index._match(normalize(text))
+        return activity if score >= args.min_score else None
+
+    print(f"activities={len(activities)} corpus={len(CORPUS)} index build={build_ms:.2f}ms")
+    for label, resolve in (("legacy scan", legacy), ("index", cold), ("index, memo", memoized)):
+        samples = latency_us(resolve, args.iterations)
+        print(
+            f"{label:<15} accuracy={accuracy(resolve):6.1%} "
+            f"latency us: mean={statistics.mean(samples):7.1f} p99={sorted(samples)[int(len(samples) * 0.99)]:7.1f}"
+        )
+    for text, expected in CORPUS:
+        activity, score = index.match(text)
+        got = activity["name"] if activity and score >= args.min_score else None
+        if got != expected:
+            print(f"  MISS {text!r}: expected {expected}, got {got} ({score:.2f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--activities", type=int, default=len(ACTIVITIES))
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--min-score", type=float, default=0.6)
+    main(parser.parse_args())
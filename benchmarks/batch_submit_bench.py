@@ -0,0 +1,67 @@
+# benchmarks/batch_submit_bench.py
+"""
+Wall-clock time of confirm_log's time entry submission as a function of entry
+count, against an in-process fake Redmine with fixed latency and occasional
+503s, comparing sequential posting (concurrency=1) with the batched submitter.
+
+Usage:
+    python -m benchmarks.batch_submit_bench --latency 0.08 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+import httpx
+from services.redmine_service import RedmineService
+from services.time_entry_submitter import TimeEntrySubmitter, CREATED
+
+
+def fake_redmine(latency: float, error_rate: float):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(201, json={"time_entry": {"id": random.randint(1, 10 ** 6)}})
+    return httpx.MockTransport(handler)
+
+
+def payloads(count: int, run: int):
+    return [
+        {"project_id": 1, "spent_on": "2024-05-16", "hours": 1, "activity_id": 9,
+         "comments": f"run {run} entry {i}", "issue_id": 1000 + i}
+        for i in range(count)
+    ]
+
+
+async def run(latency: float, error_rate: float, concurrency: int):
+    client = httpx.AsyncClient(transport=fake_redmine(latency, error_rate))
+    redmine = RedmineService("http://fake-redmine", "key", client=client)
+    print(f"latency={latency * 1000:.0f}ms error_rate={error_rate:.0%}")
+    print(f"{'entries':>8} {'sequential s':>13} {f'concurrency={concurrency} s':>16} {'created':>8}")
+    for run_no, count in enumerate((1, 5, 10, 15, 30, 60)):
+        timings = []
+        for workers in (1, concurrency):
+            submitter = TimeEntrySubmitter(concurrency=workers, backoff_base=0.01)
+            started = time.perf_counter()
+            results = await submitter.submit(redmine, "bench", f"run-{run_no}-{workers}", payloads(count, run_no * 10 + workers))
+            timings.append(time.perf_counter() - started)
+        created = sum(1 for r in results if r.status == CREATED)
+        print(f"{count:>8} {timings[0]:>13.2f} {timings[1]:>16.2f} {created:>8}")
+    await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.08)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    # Injected 503s are expected here; keep the per-request error logs out of the table.
+    logging.getLogger("services.redmine_service").setLevel(logging.CRITICAL)
+    asyncio.run(run(args.latency, args.error_rate, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
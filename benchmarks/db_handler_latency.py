@@ -0,0 +1,77 @@
+# benchmarks/db_handler_latency.py
+"""
+Simulates N users tapping a button at the same moment and reports the latency
+of the user lookup every handler performs first, plus how long the event loop
+was stalled while that happened.
+
+Usage:
+    DATABASE_URL=postgresql://localhost/ric python -m benchmarks.db_handler_latency --users 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from dotenv import load_dotenv
+from services.database_service import DatabaseService, close_pools
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def heartbeat(stop: asyncio.Event, lags: list, interval: float = 0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def tap(db: DatabaseService, telegram_id: str, latencies: list):
+    started = time.perf_counter()
+    await db.get_user_by_telegram_id(telegram_id)
+    latencies.append(time.perf_counter() - started)
+
+
+async def run(users: int, rounds: int):
+    db = DatabaseService()
+    await db.get_user_by_telegram_id("warmup")
+
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    for _ in range(rounds):
+        await asyncio.gather(*(tap(db, str(100000 + i), latencies) for i in range(users)))
+    stop.set()
+    await beat
+
+    print(f"users={users} rounds={rounds} pool={db.pool.stats()}")
+    print(
+        f"handler latency ms: p50={percentile(latencies, 50) * 1000:.1f} "
+        f"p95={percentile(latencies, 95) * 1000:.1f} "
+        f"p99={percentile(latencies, 99) * 1000:.1f} "
+        f"mean={statistics.mean(latencies) * 1000:.1f}"
+    )
+    print(f"event loop max stall ms: {max(lags, default=0) * 1000:.1f}")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        raise SystemExit("DATABASE_URL must point at a local Postgres with database_schema.sql applied.")
+    try:
+        asyncio.run(run(args.users, args.rounds))
+    finally:
+        close_pools()
+
+
+if __name__ == "__main__":
+    main()
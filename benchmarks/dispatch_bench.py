@@ -0,0 +1,136 @@
+# benchmarks/dispatch_bench.py
+"""
+Which handler free-text updates reach, and the time python-telegram-bot spends
+finding it, with the handler layout of TelegramAdapter.register_handlers.
+
+"legacy" registers quick_log_for_selected_issue and handle_message as two
+catch-all MessageHandlers after the conversations; "flow" uses FlowDispatcher.
+Users are spread over three flow states: free text, an issue picked from
+/myissues, and inside the /logtime conversation. Handler callbacks only
+record that they ran, so the timings are dispatch overhead alone.
+
+Usage:
+    python -m benchmarks.dispatch_bench --users 300 --messages 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import warnings
+from collections import Counter
+from telegram import Update
+from telegram.warnings import PTBUserWarning
+from telegram.ext import (
+    Application, CallbackQueryHandler, CommandHandler, ExtBot, MessageHandler, filters,
+)
+from adapters.flow_dispatcher import FREE, SELECTED_ISSUE, FlowDispatcher
+from adapters.shared_state import SharedConversationHandler
+from benchmarks.replica_throughput import OfflineRequest, make_update
+
+# The per_message hint register_handlers also triggers; irrelevant here.
+warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+TEXT = filters.TEXT & ~filters.COMMAND
+FLOWS = ("free_text", "selected_issue", "logtime")
+EXPECTED = {"free_text": "handle_message", "selected_issue": "quick_log", "logtime": "process_work_log"}
+
+
+def build(layout: str, ran: Counter) -> Application:
+    def record(name, state=None):
+        async def callback(update, context):
+            ran[name] += 1
+            return state
+        return callback
+
+    app = Application.builder().bot(ExtBot("1:bench", request=OfflineRequest())).build()
+    for command in ("start", "help", "menu", "stats", "refresh", "timesheet"):
+        app.add_handler(CommandHandler(command, record(command)))
+
+    auth_conv = SharedConversationHandler(
+        [CommandHandler("setup", record("setup", 0))],
+        {state: [MessageHandler(TEXT, record(f"setup_{state}", state + 1))] for state in range(4)},
+        [], name="setup",
+    )
+    time_conv = SharedConversationHandler(
+        [CommandHandler("logtime", record("start_log_time", 0)),
+         CallbackQueryHandler(record("start_log_time", 0), pattern="^menu_logtime$")],
+        {0: [MessageHandler(TEXT, record("process_work_log", 0))], 1: [CallbackQueryHandler(record("confirm_log"))]},
+        [], allow_reentry=True, name="logtime",
+    )
+    issue_conv = SharedConversationHandler(
+        [CallbackQueryHandler(record("start_create_issue", 0), pattern="^menu_create_issue$")],
+        {0: [CallbackQueryHandler(record("project"))], 1: [MessageHandler(TEXT, record("subject"))]},
+        [], allow_reentry=True, name="create_issue",
+    )
+    for conversation in (auth_conv, time_conv, issue_conv):
+        app.add_handler(conversation)
+    app.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(r"^/importusers\b"), record("import")))
+    app.add_handler(CallbackQueryHandler(record("issue_selected"), pattern=r"^logtime_"))
+    app.add_handler(CallbackQueryHandler(record("issues_page"), pattern=r"^issues_page_\d+$"))
+    app.add_handler(CallbackQueryHandler(record("button")))
+
+    async def quick_log(update, context):
+        if not context.user_data.get("selected_issue_id"):
+            return
+        ran["quick_log"] += 1
+
+    if layout == "legacy":
+        app.add_handler(MessageHandler(TEXT, quick_log))
+        app.add_handler(MessageHandler(TEXT, record("handle_message")))
+    else:
+        app.add_handler(FlowDispatcher(
+            [auth_conv, time_conv, issue_conv],
+            {SELECTED_ISSUE: quick_log, FREE: record("handle_message")},
+        ), group=-1)
+    return app
+
+
+async def run(layout: str, users: int, messages: int):
+    ran = Counter()
+    app = build(layout, ran)
+    await app.initialize()
+
+    flows = {}
+    for i in range(users):
+        user_id = 3_000_000 + i
+        flows[user_id] = FLOWS[i % len(FLOWS)]
+        if flows[user_id] == "selected_issue":
+            app.user_data[user_id]["selected_issue_id"] = "1234"
+        elif flows[user_id] == "logtime":
+            await app.process_update(Update.de_json(make_update(0, user_id, "/logtime"), app.bot))
+    ran.clear()
+
+    samples, update_id = [], 0
+    for n in range(messages):
+        for user_id in flows:
+            update_id += 1
+            update = Update.de_json(make_update(update_id, user_id, f"worked 2h on task {n}"), app.bot)
+            started = time.perf_counter()
+            await app.process_update(update)
+            samples.append((time.perf_counter() - started) * 1e6)
+
+    expected = Counter()
+    for flow in flows.values():
+        expected[EXPECTED[flow]] += messages
+    correct = sum(min(ran[name], count) for name, count in expected.items())
+    samples.sort()
+    print(
+        f"{layout:<7} correct={correct / len(samples):6.1%} "
+        f"us/update: mean={statistics.mean(samples):6.1f} p50={samples[len(samples) // 2]:6.1f} "
+        f"p99={samples[int(len(samples) * 0.99)]:6.1f}  ran={dict(ran)}"
+    )
+    await app.shutdown()
+
+
+async def main(args):
+    print(f"users={args.users} messages/user={args.messages} flows={', '.join(FLOWS)}")
+    for layout in ("legacy", "flow"):
+        await run(layout, args.users, args.messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
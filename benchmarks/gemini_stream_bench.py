@@ -0,0 +1,102 @@
+# benchmarks/gemini_stream_bench.py
+"""
+Time to first entry (TTFE) and total latency of Gemini work log parsing,
+blocking ``parse_time_entries`` vs streaming ``stream_time_entries`` through
+the LLM executor. By default a fake model emits the JSON array in small
+chunks at a fixed token rate; --live calls Gemini with GEMINI_API_KEY.
+
+Usage:
+    python -m benchmarks.gemini_stream_bench --entries 20 --runs 3
+    python -m benchmarks.gemini_stream_bench --live --entries 10
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from services.gemini_service import GeminiService
+from services.llm_executor import LLMExecutor
+
+ACTIVITIES = [{"id": 9, "name": "Development"}, {"id": 10, "name": "Testing"}, {"id": 11, "name": "Meeting"}]
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Emits a JSON array of ``entries`` objects, ``chunk_size`` characters every ``chunk_delay`` seconds."""
+
+    def __init__(self, entries: int, chunk_size: int, chunk_delay: float, first_token_delay: float):
+        self.body = "```json\n" + json.dumps([
+            {"date": "2024-05-16", "hours": 1.5, "activity": ACTIVITIES[i % 3]["name"],
+             "comments": f"Worked on feature number {i} and reviewed the related pull request",
+             "issue_id": str(1000 + i)}
+            for i in range(entries)
+        ], indent=2) + "\n```"
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.first_token_delay = first_token_delay
+
+    def _chunks(self):
+        time.sleep(self.first_token_delay)
+        for i in range(0, len(self.body), self.chunk_size):
+            time.sleep(self.chunk_delay)
+            yield _Chunk(self.body[i:i + self.chunk_size])
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self._chunks()
+        return _Chunk("".join(chunk.text for chunk in self._chunks()))
+
+
+def work_log(entries: int) -> str:
+    return "\n".join(f"1.5h {ACTIVITIES[i % 3]['name']} on #{1000 + i}: feature {i}" for i in range(entries))
+
+
+async def measure(executor: LLMExecutor, gemini: GeminiService, text: str, streaming: bool):
+    started = time.perf_counter()
+    first = None
+    count = 0
+    if streaming:
+        async for _ in executor.stream("bench", gemini.stream_time_entries, text, ACTIVITIES):
+            if first is None:
+                first = time.perf_counter() - started
+            count += 1
+    else:
+        count = len(await executor.run("bench", gemini.parse_time_entries, text, ACTIVITIES))
+        first = time.perf_counter() - started
+    return first, time.perf_counter() - started, count
+
+
+async def main(args):
+    if args.live:
+        gemini = GeminiService()
+    else:
+        gemini = GeminiService(model=FakeModel(args.entries, args.chunk_size, args.chunk_delay, args.first_token_delay))
+    executor = LLMExecutor(max_in_flight=2)
+    text = work_log(args.entries)
+
+    for streaming in (False, True):
+        firsts, totals = [], []
+        for _ in range(args.runs):
+            first, total, count = await measure(executor, gemini, text, streaming)
+            firsts.append(first)
+            totals.append(total)
+        print(
+            f"{'streaming' if streaming else 'blocking':<10} entries={count:<3} "
+            f"ttfe_ms={statistics.median(firsts) * 1000:8.1f} total_ms={statistics.median(totals) * 1000:8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=40, help="fake model characters per chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="fake model seconds per chunk")
+    parser.add_argument("--first-token-delay", type=float, default=0.4, help="fake model time before the first chunk")
+    parser.add_argument("--live", action="store_true", help="call Gemini instead of the fake model")
+    asyncio.run(main(parser.parse_args()))
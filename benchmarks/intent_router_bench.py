@@ -0,0 +1,143 @@
+# benchmarks/intent_router_bench.py
+"""
+Accuracy and latency of free-text intent routing.
+
+Each corpus item pairs a message users send outside a conversation with the
+intent it should route to. The compiled IntentRouter is compared against the
+keyword scan handle_message used before. Messages the router is unsure of go
+to a fake classifier that answers from the corpus after --llm-ms, so the
+numbers show how often the LLM fallback fires and how well it batches;
+--live uses Gemini instead (needs GEMINI_API_KEY).
+
+Usage:
+    python -m benchmarks.intent_router_bench --iterations 5000
+    python -m benchmarks.intent_router_bench --live
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from services.intent_router import IntentRouter, INTENTS
+
+CORPUS = [
+    ("show my issues", "my_issues"),
+    ("what are my open tasks?", "my_issues"),
+    ("list tickets assigned to me", "my_issues"),
+    ("any bugs for me today", "my_issues"),
+    ("what's on my plate", "my_issues"),
+    ("issues", "my_issues"),
+    ("projects", "projects"),
+    ("list all projects", "projects"),
+    ("which projects am I in", "projects"),
+    ("log time", "log_time"),
+    ("I want to log my hours", "log_time"),
+    ("worked 3h on #1234 fixing the login bug", "log_time"),
+    ("spent 2 hours in meetings and 1.5h on code review", "log_time"),
+    ("2h code review for issue 4521", "log_time"),
+    ("30 mins standup", "log_time"),
+    ("add time entry for yesterday", "log_time"),
+    ("book 4 hours on the ticket #77", "log_time"),
+    ("create a new issue", "create_issue"),
+    ("report a bug in the invoice export", "create_issue"),
+    ("open a ticket for the VPN outage", "create_issue"),
+    ("new task please", "create_issue"),
+    ("timesheet", "timesheet"),
+    ("how many hours did I log last week", "timesheet"),
+    ("my hours this month", "timesheet"),
+    ("weekly summary", "timesheet"),
+    ("help", "help"),
+    ("what can you do?", "help"),
+    ("how do I use this bot", "help"),
+    ("menu", "menu"),
+    ("show me the options", "menu"),
+    ("how do I change my api key", "setup"),
+    ("connect my redmine account", "setup"),
+    ("setup", "setup"),
+    ("hello", "unknown"),
+    ("thanks!", "unknown"),
+    ("good morning team", "unknown"),
+    ("what's the weather like", "unknown"),
+]
+EXPECTED = dict(CORPUS)
+
+
+def legacy_route(text: str) -> str:
+    """The keyword scan handle_message used before the router."""
+    message = text.lower()
+    if any(word in message for word in ["issue", "task", "bug"]):
+        return "my_issues"
+    if any(word in message for word in ["project", "projects"]):
+        return "projects"
+    if any(word in message for word in ["time", "log", "work"]):
+        return "log_time"
+    return "unknown"
+
+
+def fake_classifier(llm_ms: float):
+    def classify(messages, intents):
+        time.sleep(llm_ms / 1000)
+        return [EXPECTED.get(message, "unknown") for message in messages]
+    return classify
+
+
+def latency_us(route, iterations: int) -> list:
+    samples = []
+    for i in range(iterations):
+        text = CORPUS[i % len(CORPUS)][0]
+        started = time.perf_counter()
+        route(text)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def report(label: str, predictions: list, samples: list):
+    correct = sum(got == expected for got, (_, expected) in zip(predictions, CORPUS))
+    print(
+        f"{label:<22} accuracy={correct / len(CORPUS):6.1%} "
+        f"latency us: mean={statistics.mean(samples):8.1f} p99={sorted(samples)[int(len(samples) * 0.99)]:8.1f}"
+    )
+
+
+async def routed_corpus(router: IntentRouter) -> tuple:
+    """Route the whole corpus concurrently, as a burst of updates would be."""
+    started = time.perf_counter()
+    matches = await asyncio.gather(*(router.route(text) for text, _ in CORPUS))
+    return matches, (time.perf_counter() - started) * 1000
+
+
+def main(args):
+    router = IntentRouter(min_confidence=args.min_confidence)
+    print(f"corpus={len(CORPUS)} intents={len(INTENTS)} min_confidence={args.min_confidence}")
+
+    report("legacy keyword scan", [legacy_route(t) for t, _ in CORPUS], latency_us(legacy_route, args.iterations))
+    report("router, rules only", [router.match(t).intent for t, _ in CORPUS], latency_us(router.match, args.iterations))
+
+    if args.live:
+        from services.gemini_service import GeminiService
+        router.classifier = GeminiService().classify_intents
+    else:
+        router.classifier = fake_classifier(args.llm_ms)
+
+    matches, cold_ms = asyncio.run(routed_corpus(router))
+    _, warm_ms = asyncio.run(routed_corpus(router))
+    fallbacks = sum(m.source == "llm" for m in matches)
+    correct = sum(m.intent == expected for m, (_, expected) in zip(matches, CORPUS))
+    print(
+        f"{'router + LLM fallback':<22} accuracy={correct / len(CORPUS):6.1%} "
+        f"fallbacks={fallbacks}/{len(CORPUS)} llm calls={router.llm_batches} "
+        f"corpus wall: cold={cold_ms:.1f}ms cached={warm_ms:.1f}ms"
+    )
+
+    for (text, expected), match in zip(CORPUS, matches):
+        if match.intent != expected:
+            print(f"  MISS {text!r}: expected {expected}, got {match.intent} ({match.confidence}, {match.source})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--min-confidence", type=float, default=0.5)
+    parser.add_argument("--llm-ms", type=float, default=600.0, help="simulated classifier latency")
+    parser.add_argument("--live", action="store_true", help="classify with Gemini instead of the fake classifier")
+    main(parser.parse_args())
@@ -0,0 +1,117 @@
+# benchmarks/onboarding_bench.py
+"""
+Throughput of bulk onboarding on a generated import file against an
+in-process fake Redmine with fixed latency. About 5% of the rows carry a
+rejected API key, 1% are malformed and 1% repeat an earlier telegram_id.
+
+Key validation is measured at several concurrency levels (sequential
+validation, as /setup does one user at a time, is extrapolated from a
+sample). With --db and DATABASE_URL set, the batched upsert is also timed
+against per-row create_user calls; the generated users are deleted afterwards.
+
+Usage:
+    python -m benchmarks.onboarding_bench --rows 10000 --latency 0.05 --concurrency 10,50,200
+    python -m benchmarks.onboarding_bench --rows 10000 --db
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import logging
+import random
+import time
+import httpx
+from services.onboarding import BulkOnboarding, VALID, read_rows
+
+
+def fake_redmine(latency: float):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        key = request.headers.get("X-Redmine-API-Key", "")
+        if key.startswith("bad"):
+            return httpx.Response(401)
+        return httpx.Response(200, json={"user": {"id": 1, "login": key[:8], "firstname": "Bench", "lastname": key[-4:]}})
+    return httpx.MockTransport(handler)
+
+
+def generate(count: int) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["telegram_id", "employee_id", "redmine_url", "api_key", "default_project_id"])
+    for i in range(count):
+        roll = random.random()
+        telegram_id = str(900000000 + i)
+        if roll < 0.01:
+            telegram_id = str(900000000 + random.randrange(max(1, i)))
+        api_key = f"{'bad' if 0.01 <= roll < 0.06 else 'key'}{i:036d}"
+        url = "not-a-url" if 0.06 <= roll < 0.07 else "http://fake-redmine"
+        writer.writerow([telegram_id, f"bench-{i}", url, api_key, "1"])
+    return out.getvalue()
+
+
+async def validate(rows, client, concurrency: int):
+    onboarding = BulkOnboarding(concurrency=concurrency, client=client)
+    started = time.perf_counter()
+    results = await onboarding.run(rows, dry_run=True)
+    return results, time.perf_counter() - started
+
+
+async def bench_db(onboarding: BulkOnboarding, results, rows, sample: int):
+    from models.user import User
+    users = [
+        User(telegram_id=r.telegram_id, employee_id=r.employee_id, name="Bench", redmine_url="http://fake-redmine",
+             api_key=f"key{r.line}", default_project_id="1")
+        for r in results if r.status == VALID
+    ]
+    db = onboarding.db
+    try:
+        started = time.perf_counter()
+        await db.bulk_upsert_users(users)
+        bulk = time.perf_counter() - started
+        print(f"batched upsert: {len(users)} users in {bulk * 1000:.0f}ms ({len(users) / bulk:.0f} rows/s)")
+
+        started = time.perf_counter()
+        for user in users[:sample]:
+            await db.create_user(user.telegram_id, user.employee_id, user.name, user.redmine_url, user.api_key, "1")
+        per_row = (time.perf_counter() - started) / min(sample, len(users))
+        print(f"per-row create_user: {per_row * 1000:.2f}ms/row -> {per_row * len(users):.1f}s for {len(users)} users")
+    finally:
+        await db._run(db._execute, "DELETE FROM users WHERE employee_id LIKE %s", ("bench-%",))
+
+
+async def main(args):
+    logging.getLogger("services.redmine_service").setLevel(logging.CRITICAL)
+    logging.getLogger("services.onboarding").setLevel(logging.WARNING)
+    random.seed(7)
+    rows = read_rows(generate(args.rows))
+    client = httpx.AsyncClient(transport=fake_redmine(args.latency))
+
+    sample = rows[:200]
+    _, elapsed = await validate(sample, client, concurrency=1)
+    print(f"sequential (sample of {len(sample)}): {len(sample) / elapsed:7.1f} rows/s "
+          f"-> ~{elapsed / len(sample) * len(rows):.0f}s for {len(rows)} rows")
+
+    results = None
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        results, elapsed = await validate(rows, client, concurrency)
+        print(f"concurrency={concurrency:<4} {len(rows)} rows in {elapsed:6.2f}s ({len(rows) / elapsed:8.1f} rows/s)")
+
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    print("outcomes:", ", ".join(f"{status}={count}" for status, count in sorted(counts.items())))
+
+    if args.db:
+        await bench_db(BulkOnboarding(client=client), results, rows, args.per_row_sample)
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Redmine seconds per request")
+    parser.add_argument("--concurrency", default="10,50,200")
+    parser.add_argument("--db", action="store_true", help="also time the users upsert (needs DATABASE_URL)")
+    parser.add_argument("--per-row-sample", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
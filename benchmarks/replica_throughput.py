@@ -0,0 +1,149 @@
+# benchmarks/replica_throughput.py
+"""
+Updates/sec of a conversation flow served by 1 vs N bot replicas that share
+one StateStore, with updates for each user spread across replicas the way a
+load balancer would. Every handler increments a counter in user_data, so the
+final counts also check that no replica lost or overwrote another's state.
+By default each replica handles one update at a time, so extra throughput
+comes only from extra replicas; --workers lets each replica run that many
+users' updates concurrently.
+
+Usage:
+    python -m benchmarks.replica_throughput --replicas 1 4 8 --users 40 --messages 10
+    python -m benchmarks.replica_throughput --replicas 1 4 --workers 8
+    STATE_STORE=postgres DATABASE_URL=postgresql://localhost/ric python -m benchmarks.replica_throughput
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ExtBot, MessageHandler, filters
+from telegram.request import BaseRequest
+from adapters.shared_state import SharedConversationHandler, SharedStateUpdateProcessor, StorePersistence
+from services.state_store import MemoryStateStore, create_state_store
+
+COUNTING = 0
+
+
+class OfflineRequest(BaseRequest):
+    """Answers getMe locally so Applications can start without Telegram."""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        return 200, b'{"ok": true, "result": {"id": 1, "is_bot": true, "first_name": "bench", "username": "bench_bot"}}'
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id, "date": int(time.time()), "text": text,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+async def build_replica(store, handler_latency: float, workers: int, done: asyncio.Queue) -> Application:
+    async def start(update, context):
+        context.user_data["count"] = 0
+        await done.put(update.update_id)
+        return COUNTING
+
+    async def count(update, context):
+        await asyncio.sleep(handler_latency)
+        context.user_data["count"] = context.user_data.get("count", 0) + 1
+        await done.put(update.update_id)
+        return COUNTING
+
+    persistence = StorePersistence(store)
+    processor = SharedStateUpdateProcessor(persistence, workers=workers)
+    app = (
+        Application.builder()
+        .bot(ExtBot("1:bench", request=OfflineRequest(), get_updates_request=OfflineRequest()))
+        .persistence(persistence)
+        .concurrent_updates(processor)
+        .build()
+    )
+    processor.application = app
+    app.add_handler(SharedConversationHandler(
+        entry_points=[CommandHandler("start", start)],
+        states={COUNTING: [MessageHandler(filters.TEXT & ~filters.COMMAND, count)]},
+        fallbacks=[],
+        name="bench",
+        persistent=True,
+    ))
+    await app.initialize()
+    await app.start()
+    return app
+
+
+async def run_once(replica_count: int, users: int, messages: int, handler_latency: float, workers: int):
+    shared = create_state_store() or MemoryStateStore()
+    stores = [shared.for_replica() if isinstance(shared, MemoryStateStore) else create_state_store()
+              for _ in range(replica_count)]
+    done = asyncio.Queue()
+    replicas = [await build_replica(store, handler_latency, workers, done) for store in stores]
+
+    # Start every conversation first, then send the counted messages round by round.
+    update_id = 0
+    user_ids = [2_000_000 + i for i in range(users)]
+    rounds = [["/start"]] + [[f"msg {n}"] for n in range(messages)]
+    started = time.perf_counter()
+    for texts in rounds:
+        for user_id in user_ids:
+            for text in texts:
+                update_id += 1
+                replica = random.choice(replicas)
+                await replica.update_queue.put(Update.de_json(make_update(update_id, user_id, text), replica.bot))
+        # A user's next message only goes out after the previous one was handled, as in a real chat.
+        for _ in user_ids:
+            await done.get()
+    # Stopping flushes the last writes, so it counts towards the elapsed time.
+    for replica in replicas:
+        await replica.stop()
+    elapsed = time.perf_counter() - started
+
+    stored = await stores[0].load_user_data(user_ids)
+    correct = sum(1 for user_id in user_ids if stored.get(user_id, {}).get("count") == messages)
+    lock_waits = sum(store.lock_waits for store in stores)
+    for replica in replicas:
+        await replica.shutdown()
+    return update_id / elapsed, correct, lock_waits
+
+
+async def run(replica_counts, users: int, messages: int, handler_latency: float, workers: int):
+    print(f"users={users} messages/user={messages} handler_latency={handler_latency * 1000:.0f}ms workers={workers} "
+          f"store={os.getenv('STATE_STORE') or 'memory'}")
+    print(f"{'replicas':>8} {'updates/s':>10} {'consistent users':>17} {'lock waits':>11}")
+    for count in replica_counts:
+        throughput, correct, lock_waits = await run_once(count, users, messages, handler_latency, workers)
+        print(f"{count:>8} {throughput:>10.0f} {f'{correct}/{users}':>17} {lock_waits:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--handler-latency", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.replicas, args.users, args.messages, args.handler_latency, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/webhook_load.py
+"""
+Load generator for webhook mode: POSTs synthetic Telegram message updates to a
+running bot and reports accepted updates/sec and request latency percentiles.
+Only the webhook endpoint is measured; handlers run after the 200 is sent.
+
+Usage:
+    BOT_MODE=webhook WEBHOOK_URL=https://bot.example.com/telegram WEBHOOK_SECRET=s3cret python main.py
+    python -m benchmarks.webhook_load --url http://localhost:8443/telegram --secret s3cret --updates 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import itertools
+import time
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def synthetic_update(update_id: int, users: int) -> dict:
+    user_id = 10 ** 6 + update_id % users
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "text": "/help",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+
+
+async def run(url: str, secret: str, updates: int, concurrency: int, users: int):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    latencies, statuses = [], {}
+    ids = itertools.count(1)
+
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency), timeout=30) as client:
+        async def worker():
+            while (update_id := next(ids)) <= updates:
+                started = time.perf_counter()
+                response = await client.post(url, json=synthetic_update(update_id, users), headers=headers)
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    print(f"updates={updates} concurrency={concurrency} users={users}")
+    print(f"statuses: {dict(sorted(statuses.items()))}")
+    print(f"throughput: {statuses.get(200, 0) / elapsed:.0f} accepted updates/s over {elapsed:.2f}s")
+    for pct in (50, 90, 99):
+        print(f"p{pct}: {percentile(latencies, pct) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8443/")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.secret, args.updates, args.concurrency, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/worklog_parser_bench.py
+"""
+Accuracy and latency of the rule-based work log parser on a fixed corpus.
+
+Each corpus item lists the entries we expect as (date, hours, activity, issue_id)
+tuples, or None when the input is ambiguous and must be left to the LLM.
+
+Usage:
+    python -m benchmarks.worklog_parser_bench
+"""
+
+import statistics
+import time
+from datetime import date
+from services.worklog_parser import WorkLogParser
+
+TODAY = date(2024, 5, 16)  # a Thursday
+
+ACTIVITIES = [
+    {"id": 8, "name": "Design"},
+    {"id": 9, "name": "Development"},
+    {"id": 10, "name": "Testing"},
+    {"id": 11, "name": "Code Review"},
+    {"id": 12, "name": "Meeting"},
+    {"id": 13, "name": "Documentation"},
+    {"id": 14, "name": "Support"},
+]
+
+CORPUS = [
+    ("2h code review #1234 yesterday", [("2024-05-15", 2.0, "Code Review", "1234")]),
+    ("3h development #42", [("2024-05-16", 3.0, "Development", "42")]),
+    ("1.5 hours testing the login flow #77 today", [("2024-05-16", 1.5, "Testing", "77")]),
+    ("45 mins standup #12", [("2024-05-16", 0.75, "Meeting", "12")]),
+    ("1h 30m writing docs for #300 on monday", [("2024-05-13", 1.5, "Documentation", "300")]),
+    ("fixed the export bug in 2 hours #981", [("2024-05-16", 2.0, "Development", "981")]),
+    ("2024-05-10 4h design of billing page #55", [("2024-05-10", 4.0, "Design", "55")]),
+    ("spent 6h on customer support issue 640, 2 days ago", [("2024-05-14", 6.0, "Support", "640")]),
+    ("3h dev and 1h testing on #19", [
+        ("2024-05-16", 3.0, "Development", "19"),
+        ("2024-05-16", 1.0, "Testing", "19"),
+    ]),
+    ("Monday: Development 4h, Testing 2h, issue #2345\nTuesday: Meeting 1h, Documentation 3h, issue #3456", [
+        ("2024-05-13", 4.0, "Development", "2345"),
+        ("2024-05-13", 2.0, "Testing", "2345"),
+        ("2024-05-14", 1.0, "Meeting", "3456"),
+        ("2024-05-14", 3.0, "Documentation", "3456"),
+    ]),
+    ("Worked on bug #1234 for 3h and code review for 1.5h on #5678", [
+        ("2024-05-16", 3.0, "Development", "1234"),
+        ("2024-05-16", 1.5, "Code Review", "5678"),
+    ]),
+    ("12th May 2h meeting with client #90", [("2024-05-12", 2.0, "Meeting", "90")]),
+    ("Spent the whole of last week on the migration", None),
+    ("worked on #12 and #13 for 4h", None),
+    ("tomorrow 2h planning #5", None),
+    ("did some stuff", None),
+    ("2h #12", None),
+    ("8h across #1, #2 and #3", None),
+    ("from 05/06 to 05/09 testing 2h daily #4", None),
+    ("2h development #12 on 5th", None),
+    ("2h meeting #3 in march", None),
+    ("3h code review #8 next friday", None),
+]
+
+
+def as_tuples(entries):
+    return [(e["date"], e["hours"], e["activity"], str(e["issue_id"])) for e in entries]
+
+
+def main(repeat: int = 200):
+    parser = WorkLogParser()
+    accepted = correct = false_accepts = 0
+    for text, expected in CORPUS:
+        result = parser.parse(text, ACTIVITIES, today=TODAY)
+        ok = result.confidence >= parser.min_confidence
+        if not ok:
+            continue
+        accepted += 1
+        if expected is None:
+            false_accepts += 1
+            print(f"FALSE ACCEPT: {text!r} -> {as_tuples(result.entries)}")
+        elif as_tuples(result.entries) == expected:
+            correct += 1
+        else:
+            print(f"MISMATCH: {text!r}\n  got      {as_tuples(result.entries)}\n  expected {expected}")
+
+    parseable = sum(1 for _, expected in CORPUS if expected is not None)
+    print(f"corpus={len(CORPUS)} parseable={parseable} fast-path accepted={accepted}")
+    print(f"coverage of parseable inputs: {correct / parseable:.0%}")
+    print(f"precision of accepted parses: {correct / accepted:.0%}" if accepted else "precision: n/a")
+    print(f"false accepts on ambiguous inputs: {false_accepts}")
+
+    timings = []
+    for _ in range(repeat):
+        for text, _ in CORPUS:
+            started = time.perf_counter()
+            parser.parse(text, ACTIVITIES, today=TODAY)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(
+        f"latency us: mean={statistics.mean(timings) * 1e6:.0f} "
+        f"p99={timings[int(len(timings) * 0.99)] * 1e6:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
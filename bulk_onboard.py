@@ -0,0 +1,63 @@
+# bulk_onboard.py
+"""
+Import users from a CSV or JSONL file instead of having everyone run /setup.
+
+Columns: telegram_id, employee_id, redmine_url, api_key, and optionally name
+and default_project_id. Every API key is validated against Redmine; valid
+rows are upserted in one batch and a per-row report is written as CSV.
+
+Usage:
+    python bulk_onboard.py users.csv --report report.csv
+    python bulk_onboard.py users.jsonl --dry-run --concurrency 50
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.database_service import close_pools
+from services.onboarding import SAVED, VALID, BulkOnboarding, read_rows, write_report
+from services.redmine_service import close_http_clients
+
+logging.basicConfig(format='%(asctime)s - [%(levelname)s] - %(name)s - %(message)s', level=logging.INFO)
+# Per-row validation failures end up in the report; don't repeat them in the log.
+logging.getLogger("services.redmine_service").setLevel(logging.CRITICAL)
+
+
+async def main(args) -> int:
+    with open(args.file, encoding="utf-8-sig") as f:
+        rows = read_rows(f.read(), args.format)
+
+    onboarding = BulkOnboarding(concurrency=args.concurrency, timeout=args.timeout)
+    try:
+        results = await onboarding.run(rows, dry_run=args.dry_run)
+    finally:
+        await close_http_clients()
+        close_pools()
+
+    report = write_report(results)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8", newline="") as f:
+            f.write(report)
+    else:
+        sys.stdout.write(report)
+
+    counts = Counter(result.status for result in results)
+    print(", ".join(f"{status}={count}" for status, count in counts.most_common()), file=sys.stderr)
+    return 0 if all(result.status in (SAVED, VALID) for result in results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: guessed from the content")
+    parser.add_argument("--report", help="write the per-row report here instead of stdout")
+    parser.add_argument("--concurrency", type=int, default=20, help="API keys validated at once")
+    parser.add_argument("--timeout", type=float, default=15.0, help="seconds per key validation")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, do not write users")
+    sys.exit(asyncio.run(main(parser.parse_args())))
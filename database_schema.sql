@@ -27,6 +27,52 @@ CREATE TRIGGER update_users_updated_at
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Shared bot state (STATE_STORE=postgres): user_data and conversation states per user,
+-- plus lease locks so only one replica handles a user's update at a time.
+CREATE TABLE IF NOT EXISTS bot_user_data (
+    telegram_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bot_conversations (
+    name VARCHAR(100) NOT NULL,
+    conversation_key VARCHAR(100) NOT NULL,
+    telegram_id BIGINT NOT NULL,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, conversation_key)
+);
+
+CREATE INDEX idx_bot_conversations_telegram_id ON bot_conversations(telegram_id);
+
+CREATE TABLE IF NOT EXISTS bot_state_locks (
+    lock_key VARCHAR(100) PRIMARY KEY,
+    owner VARCHAR(64) NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Hours per user, day, activity and issue (issue_id 0 = no issue), updated when entries are logged
+-- through the bot and rebuilt from Redmine by the periodic reconcile job.
+CREATE TABLE IF NOT EXISTS timesheet_aggregates (
+    telegram_id VARCHAR(50) NOT NULL,
+    spent_on DATE NOT NULL,
+    activity_id INTEGER NOT NULL,
+    activity_name VARCHAR(255),
+    issue_id INTEGER NOT NULL DEFAULT 0,
+    hours NUMERIC(10, 2) NOT NULL,
+    entries INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (telegram_id, spent_on, activity_id, issue_id)
+);
+
+-- reconciled_at is written as UTC by the bot and compared with CURRENT_TIMESTAMP, so it carries its zone.
+CREATE TABLE IF NOT EXISTS timesheet_sync (
+    telegram_id VARCHAR(50) PRIMARY KEY,
+    reconciled_at TIMESTAMPTZ
+);
+ALTER TABLE timesheet_sync ALTER COLUMN reconciled_at TYPE TIMESTAMPTZ;
+
 
 
 
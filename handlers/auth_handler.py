@@ -1,8 +1,13 @@
+import io
 import logging
-from telegram import Update
+from collections import Counter
+from telegram import InputFile, Update
 from telegram.ext import ContextTypes, ConversationHandler
 from services.database_service import DatabaseService
-from services.redmine_service import RedmineService
+from services.redmine_service import RedmineService, redmine_registry
+from services.reference_data import reference_data
+from services.onboarding import bulk_onboarding, read_rows, write_report
+from utils.progress import ProgressMessage
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +22,7 @@ class AuthHandler:
         user = update.effective_user
         telegram_id = str(user.id)
         
-        existing_user = self.db.get_user_by_telegram_id(telegram_id)
+        existing_user = await self.db.get_user_by_telegram_id(telegram_id)
         
         if existing_user:
             await update.message.reply_text(
@@ -81,7 +86,7 @@ class AuthHandler:
         
         try:
             redmine = RedmineService(redmine_url, api_key)
-            user_data = redmine.get_current_user()
+            user_data = await redmine.get_current_user()
             
             context.user_data['api_key'] = api_key
             context.user_data['redmine_user'] = user_data.get('user', {})
@@ -117,7 +122,8 @@ class AuthHandler:
         name = user.full_name
         
         try:
-            self.db.create_user(
+            previous = await self.db.get_user_by_telegram_id(telegram_id)
+            await self.db.create_user(
                 telegram_id=telegram_id,
                 employee_id=context.user_data['employee_id'],
                 name=name,
@@ -125,6 +131,8 @@ class AuthHandler:
                 api_key=context.user_data['api_key'],
                 project_id=project_id
             )
+            if previous:
+                redmine_registry.invalidate(previous['redmine_url'], previous['api_key'])
             
             await update.message.reply_text(
                 "**Setup Complete!**\n\n"
@@ -148,7 +156,7 @@ class AuthHandler:
         user = update.effective_user
         telegram_id = str(user.id)
         
-        user_data = self.db.get_user_by_telegram_id(telegram_id)
+        user_data = await self.db.get_user_by_telegram_id(telegram_id)
         
         if not user_data:
             await query.message.reply_text(
@@ -167,4 +175,61 @@ class AuthHandler:
 
             To update settings, use /setup again.
             """
-        await query.message.reply_text(settings_msg, parse_mode='Markdown')
\ No newline at end of file
+        await query.message.reply_text(settings_msg, parse_mode='Markdown')
+
+    async def refresh_reference_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        telegram_id = str(update.effective_user.id)
+        user_data = await self.db.get_user_by_telegram_id(telegram_id)
+
+        if not user_data:
+            await update.message.reply_text(
+                "No account found. Use /setup to configure your account."
+            )
+            return
+
+        try:
+            redmine = redmine_registry.get(user_data['redmine_url'], user_data['api_key'])
+            counts = await reference_data.refresh(redmine)
+        except Exception as e:
+            logger.error(f"Reference data refresh failed: {e}")
+            await update.message.reply_text(
+                "Could not refresh Redmine data. Please try again later."
+            )
+            return
+
+        await update.message.reply_text(
+            "Redmine data refreshed:\n" +
+            "\n".join(f"- {kind.replace('_', ' ')}: {count}" for kind, count in counts.items())
+        )
+
+    MAX_IMPORT_BYTES = 5 * 1024 * 1024
+
+    async def bulk_import(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Import users from a CSV/JSONL document sent with the caption /importusers [dry]."""
+        document = update.message.document
+        if document.file_size and document.file_size > self.MAX_IMPORT_BYTES:
+            await update.message.reply_text("The file is too large (limit 5 MB). Use bulk_onboard.py instead.")
+            return
+
+        file = await document.get_file()
+        data = bytes(await file.download_as_bytearray()).decode("utf-8-sig")
+        fmt = "jsonl" if (document.file_name or "").lower().endswith((".jsonl", ".json")) else "csv"
+        rows = read_rows(data, fmt)
+        dry_run = "dry" in (update.message.caption or "").lower().split()
+
+        progress = await ProgressMessage(update.message).start(f"🔄 Validating {len(rows)} rows against Redmine...")
+        try:
+            results = await bulk_onboarding.run(rows, dry_run=dry_run)
+        except Exception as e:
+            logger.error(f"Bulk import failed: {e}")
+            await progress.finish("Bulk import failed. Check the logs and try again.")
+            return
+
+        counts = Counter(result.status for result in results)
+        await progress.finish(
+            ("Dry run finished" if dry_run else "Import finished") + f" for {len(rows)} rows:\n" +
+            "\n".join(f"- {status.replace('_', ' ')}: {count}" for status, count in counts.most_common())
+        )
+        await update.message.reply_document(
+            InputFile(io.BytesIO(write_report(results).encode()), filename="onboarding_report.csv")
+        )
@@ -1,8 +1,14 @@
 import logging
+import time
+from contextlib import aclosing
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes, ConversationHandler
+from telegram.helpers import escape_markdown
 from services.database_service import DatabaseService
-from services.redmine_service import RedmineService
+from services.redmine_service import RedmineService, redmine_registry
+from services.reference_data import reference_data
+from utils.helpers import truncate_text
+from utils.progress import ProgressMessage
 
 logger = logging.getLogger(__name__)
 
@@ -22,65 +28,112 @@ class IssueHandler:
         elif update.message:
             return await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
 
-    def _get_redmine_service(self, telegram_id: str) -> RedmineService:
-        user = self.db.get_user_by_telegram_id(telegram_id)
+    async def _get_redmine_service(self, telegram_id: str) -> RedmineService:
+        user = await self.db.get_user_by_telegram_id(telegram_id)
         if not user:
             raise ValueError("User not found. Please run /setup first.")
-        return RedmineService(user["redmine_url"], user["api_key"])
+        return redmine_registry.get(user["redmine_url"], user["api_key"])
 
-    def _get_current_user_id(self, telegram_id: str) -> int:
+    async def _get_current_user_id(self, redmine: RedmineService) -> int:
         """Fetch the current user ID from Redmine to assign issues to self."""
-        redmine = self._get_redmine_service(telegram_id)
-        user_info = redmine.get_current_user()
+        user_info = await redmine.get_current_user()
         return user_info["user"]["id"]
 
     # Show My Issues----------------------------------------------------------------------
+    ISSUES_PAGE_SIZE = 5
+    ISSUES_FETCH_LIMIT = 100
+    ISSUES_CACHE_TTL = 120
+
+    async def _load_my_issues(self, telegram_id: str, context: ContextTypes.DEFAULT_TYPE, refresh: bool = False) -> list:
+        """Return the user's open issues, reusing the list cached in user_data while it is fresh."""
+        cached = context.user_data.get("my_issues")
+        if cached and not refresh and time.time() - cached["fetched_at"] < self.ISSUES_CACHE_TTL:
+            return cached["issues"]
+
+        redmine = await self._get_redmine_service(telegram_id)
+        result = await redmine.get_issues(assigned_to_id="me", status_id="open", limit=self.ISSUES_FETCH_LIMIT)
+        issues = [
+            {
+                "id": issue.get("id"),
+                "subject": issue.get("subject", "No subject"),
+                "project": issue.get("project", {}).get("name", "Unknown Project"),
+                "status": issue.get("status", {}).get("name", "Unknown Status"),
+                "priority": issue.get("priority", {}).get("name", "N/A"),
+            }
+            for issue in result.get("issues", [])
+        ]
+        context.user_data["my_issues"] = {"issues": issues, "fetched_at": time.time()}
+        return issues
+
+    def _render_issues_page(self, issues: list, page: int):
+        pages = max(1, -(-len(issues) // self.ISSUES_PAGE_SIZE))
+        page = min(max(page, 0), pages - 1)
+        start = page * self.ISSUES_PAGE_SIZE
+        page_issues = issues[start:start + self.ISSUES_PAGE_SIZE]
+
+        lines = [f"📋 *Your open issues* ({len(issues)}) — page {page + 1}/{pages}"]
+        for issue in page_issues:
+            lines.append(
+                f"*#{issue['id']}* {escape_markdown(truncate_text(issue['subject'], 80))}\n"
+                f"{escape_markdown(issue['project'])} · {escape_markdown(issue['status'])} · {escape_markdown(issue['priority'])}"
+            )
+
+        log_buttons = [
+            InlineKeyboardButton(f"⏱️ Log #{issue['id']}", callback_data=f"logtime_{issue['id']}")
+            for issue in page_issues
+        ]
+        keyboard = [log_buttons[i:i + 2] for i in range(0, len(log_buttons), 2)]
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=f"issues_page_{page - 1}"))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=f"issues_page_{page + 1}"))
+        if nav:
+            keyboard.append(nav)
+        return "\n\n".join(lines), InlineKeyboardMarkup(keyboard)
+
     async def show_my_issues(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         telegram_id = str(update.effective_user.id)
         try:
-            redmine = self._get_redmine_service(telegram_id)
-            issues = redmine.get_issues(assigned_to_id="me", status_id="open", limit=10).get("issues", [])
+            issues = await self._load_my_issues(telegram_id, context, refresh=True)
 
             if not issues:
                 await self._reply(update, "You have no open issues!")
                 return
 
-            for issue in issues:
-                issue_id = issue.get("id")
-                subject = issue.get("subject", "No subject")
-                project_name = issue.get("project", {}).get("name", "Unknown Project")
-                status_name = issue.get("status", {}).get("name", "Unknown Status")
-                priority = issue.get("priority", {}).get("name", "N/A")
-
-                message = (
-                    f"**#{issue_id} - {subject}**\n"
-                    f"Project: {project_name}\n"
-                    f"Status: {status_name}\n"
-                    f"Priority: {priority}\n\n"
-                )
-                buttons = [
-                    [InlineKeyboardButton(f"Log Time to Issue#{issue_id}", callback_data=f"logtime_{issue_id}")]
-                ]
-                await self._reply(update, message, reply_markup=InlineKeyboardMarkup(buttons))
+            text, reply_markup = self._render_issues_page(issues, 0)
+            await self._reply(update, text, reply_markup=reply_markup)
 
         except Exception as e:
             logger.exception("Error fetching issues: %s", e)
             await self._reply(update, "Failed to fetch issues. Please check your setup with /setup")
 
+    async def show_issues_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        telegram_id = str(update.effective_user.id)
+        try:
+            issues = await self._load_my_issues(telegram_id, context)
+            page = int(query.data.replace("issues_page_", ""))
+            text, reply_markup = self._render_issues_page(issues, page)
+            await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+        except Exception as e:
+            logger.exception("Error paging issues: %s", e)
+            await self._reply(update, "Failed to fetch issues. Please check your setup with /setup")
+
     # Create Issue Flow----------------------------------------------------------------------
     async def start_create_issue(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         telegram_id = str(update.effective_user.id)
         try:
-            redmine = self._get_redmine_service(telegram_id)
-            projects = redmine.get_projects().get("projects", [])
+            redmine = await self._get_redmine_service(telegram_id)
+            async with aclosing(redmine.iter_projects()) as pages:
+                projects = {str(p["id"]): p["name"] async for p in pages}
             if not projects:
                 await self._reply(update, "No projects available for issue creation.")
                 return ConversationHandler.END
 
-            context.user_data["projects"] = {str(p["id"]): p["name"] for p in projects}
-
-            buttons = [[InlineKeyboardButton(p["name"], callback_data=f"proj_{p['id']}")] for p in projects[:10]]
-            await self._reply(update, "Select a project:", reply_markup=InlineKeyboardMarkup(buttons))
+            context.user_data["projects"] = projects
+            await self._reply(update, "Select a project:", reply_markup=self._project_keyboard(projects, 0))
             return self.ASK_PROJECT
 
         except Exception as e:
@@ -88,10 +141,33 @@ class IssueHandler:
             await self._reply(update, "Failed to start issue creation. Please check your setup with /setup.")
             return ConversationHandler.END
 
+    PROJECTS_PAGE_SIZE = 10
+
+    def _project_keyboard(self, projects: dict, page: int) -> InlineKeyboardMarkup:
+        items = list(projects.items())
+        start = page * self.PROJECTS_PAGE_SIZE
+        keyboard = [
+            [InlineKeyboardButton(name, callback_data=f"proj_{project_id}")]
+            for project_id, name in items[start:start + self.PROJECTS_PAGE_SIZE]
+        ]
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=f"projpage_{page - 1}"))
+        if start + self.PROJECTS_PAGE_SIZE < len(items):
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=f"projpage_{page + 1}"))
+        if nav:
+            keyboard.append(nav)
+        return InlineKeyboardMarkup(keyboard)
+
     async def handle_project_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
 
+        if query.data.startswith("projpage_"):
+            page = int(query.data.replace("projpage_", ""))
+            await query.edit_message_reply_markup(self._project_keyboard(context.user_data["projects"], page))
+            return self.ASK_PROJECT
+
         project_id = query.data.replace("proj_", "")
         context.user_data["project_id"] = int(project_id)
         project_name = context.user_data["projects"].get(project_id, "Unknown Project")
@@ -106,13 +182,23 @@ class IssueHandler:
     async def handle_description(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["description"] = update.message.text.strip()
 
+        telegram_id = str(update.effective_user.id)
+        try:
+            redmine = await self._get_redmine_service(telegram_id)
+            priorities = [p for p in await reference_data.get(redmine, "issue_priorities") if p.get("active", True)]
+        except Exception as e:
+            logger.exception("Error fetching issue priorities: %s", e)
+            await update.message.reply_text("Failed to load issue priorities. Please try again. Go to /menu")
+            return ConversationHandler.END
+
+        if not priorities:
+            await update.message.reply_text("No issue priorities are configured in Redmine. Go to /menu")
+            return ConversationHandler.END
+
+        context.user_data["priorities"] = {str(p["id"]): p["name"] for p in priorities}
         buttons = [
-            [
-                InlineKeyboardButton("Low", callback_data="priority_1"),
-                InlineKeyboardButton("Normal", callback_data="priority_2"),
-                InlineKeyboardButton("High", callback_data="priority_3"),
-                InlineKeyboardButton("Urgent", callback_data="priority_4"),
-            ]
+            [InlineKeyboardButton(p["name"], callback_data=f"priority_{p['id']}") for p in priorities[i:i + 4]]
+            for i in range(0, len(priorities), 4)
         ]
         await update.message.reply_text("Select priority:", reply_markup=InlineKeyboardMarkup(buttons))
         return self.ASK_PRIORITY
@@ -123,8 +209,8 @@ class IssueHandler:
         context.user_data["priority_id"] = int(query.data.replace("priority_", ""))
 
         telegram_id = str(update.effective_user.id)
-        redmine = self._get_redmine_service(telegram_id)
-        trackers = redmine.get_trackers().get("trackers", [])
+        redmine = await self._get_redmine_service(telegram_id)
+        trackers = await reference_data.get(redmine, "trackers")
 
         context.user_data["trackers"] = {str(t["id"]): t["name"] for t in trackers}
         buttons = [[InlineKeyboardButton(t["name"], callback_data=f"tracker_{t['id']}")] for t in trackers[:10]]
@@ -137,13 +223,15 @@ class IssueHandler:
         await query.answer()
         tracker_id = int(query.data.replace("tracker_", ""))
         context.user_data["tracker_id"] = tracker_id
+        priority_id = context.user_data["priority_id"]
+        priority_name = context.user_data.get("priorities", {}).get(str(priority_id), priority_id)
         await query.message.reply_text(
             f"Tracker selected: {context.user_data['trackers'][str(tracker_id)]}\n\n"
             f"Confirm creation of issue:\n"
             f"Project: {context.user_data['projects'][str(context.user_data['project_id'])]}\n"
             f"Subject: {context.user_data['subject']}\n"
             f"Description: {context.user_data['description']}\n"
-            f"Priority ID: {context.user_data['priority_id']}\n"
+            f"Priority: {priority_name}\n"
         )
 
         buttons = [
@@ -164,9 +252,10 @@ class IssueHandler:
             return ConversationHandler.END
 
         telegram_id = str(update.effective_user.id)
+        progress = None
         try:
-            redmine = self._get_redmine_service(telegram_id)
-            current_user_id = self._get_current_user_id(telegram_id)
+            redmine = await self._get_redmine_service(telegram_id)
+            current_user_id = await self._get_current_user_id(redmine)
 
             issue_data = {
                 "project_id": context.user_data["project_id"],
@@ -177,17 +266,20 @@ class IssueHandler:
                 "assigned_to_id": current_user_id, 
             }
 
-            await query.message.reply_text("⏳ Creating issue in Redmine...")
-            result = redmine.create_issue(issue_data)
+            progress = await ProgressMessage(query.message).start("⏳ Creating issue in Redmine...")
+            result = await redmine.create_issue(issue_data)
             issue_id = result.get("issue", {}).get("id")
 
             if issue_id:
-                await query.message.reply_text(f"Issue created successfully! (ID: #{issue_id}). Go to /menu")
+                await progress.finish(f"Issue created successfully! (ID: #{issue_id}). Go to /menu")
             else:
-                await query.message.reply_text("Error: Issue created but no ID returned. Go to /menu")
+                await progress.finish("Error: Issue created but no ID returned. Go to /menu")
 
         except Exception as e:
             logger.exception("Error creating issue: %s", e)
-            await query.message.reply_text("Failed to create issue. Please try again. Go to /menu")
+            if progress:
+                await progress.finish("Failed to create issue. Please try again. Go to /menu")
+            else:
+                await query.message.reply_text("Failed to create issue. Please try again. Go to /menu")
 
         return ConversationHandler.END
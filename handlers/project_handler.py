@@ -2,29 +2,32 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from services.database_service import DatabaseService
-from services.redmine_service import RedmineService
+from services.redmine_service import RedmineService, redmine_registry
 
 logger = logging.getLogger(__name__)
 
 class ProjectHandler:
+    # Projects shown by "My Projects"; the prefetcher warms the same request.
+    PROJECTS_LIMIT = 20
     
     def __init__(self):
         self.db = DatabaseService()
     
-    def _get_redmine_service(self, telegram_id: str) -> RedmineService:
-        user = self.db.get_user_by_telegram_id(telegram_id)
+    async def _get_redmine_service(self, telegram_id: str) -> RedmineService:
+        user = await self.db.get_user_by_telegram_id(telegram_id)
         if not user:
             raise ValueError("User not found. Please run /setup first.")
         
-        return RedmineService(user['redmine_url'], user['api_key'])
+        return redmine_registry.get(user['redmine_url'], user['api_key'])
     
     async def show_projects(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         telegram_id = str(user.id)
+        msg_obj = update.callback_query.message if update.callback_query else update.message
         
         try:
-            redmine = self._get_redmine_service(telegram_id)
-            result = redmine.get_projects(limit=20)
+            redmine = await self._get_redmine_service(telegram_id)
+            result = await redmine.get_projects(limit=self.PROJECTS_LIMIT)
             
             projects = result.get('projects', [])
             
@@ -39,12 +42,12 @@ class ProjectHandler:
                         f"{project.get('description', 'No description')[:100]}\n\n"
                     )
             
-            await update.callback_query.message.reply_text(
+            await msg_obj.reply_text(
                 message, parse_mode='Markdown'
             )
                 
         except Exception as e:
             logger.error(f"Error fetching projects: {e}")
-            await update.callback_query.message.reply_text(
+            await msg_obj.reply_text(
                 "Failed to fetch projects. Please check your setup with /setup"
             )
\ No newline at end of file
@@ -1,10 +1,25 @@
+import os
 import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
 import httpx
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from services.database_service import DatabaseService
-from services.redmine_service import RedmineService
+from services.redmine_service import RedmineService, redmine_registry
 from services.gemini_service import GeminiService
+from services.llm_executor import llm_executor, LLMCancelled, LLMQueueFull, LLMQueueTimeout
+from services.reference_data import reference_data
+from services.worklog_parser import worklog_parser
+from services.parse_cache import parse_cache
+from services.chunked_parser import chunked_parser
+from services.activity_index import activity_resolver
+from services.timesheet_service import timesheet_service
+from services.prefetcher import prefetcher
+from services.time_entry_submitter import time_entry_submitter, CREATED, DUPLICATE, FAILED
+from utils.helpers import truncate_text
+from utils.progress import ProgressMessage
 
 logger = logging.getLogger(__name__)
 
@@ -12,18 +27,100 @@ logger = logging.getLogger(__name__)
 class TimeEntryHandler:
     GETTING_WORK, CONFIRMING = range(2)
 
+    # Stream Gemini output so entries show up in the preview while the rest is generated.
+    STREAMING = os.getenv("GEMINI_STREAMING", "true").lower() == "true"
+
     def __init__(self):
         self.db = DatabaseService()
         self.gemini = GeminiService()
+        self._parse_latency = {name: deque(maxlen=500) for name in ("blocking_total", "stream_first_entry", "stream_total")}
 
-    def _get_redmine_service(self, telegram_id: str) -> RedmineService:
-        user = self.db.get_user_by_telegram_id(telegram_id)
+    async def _get_user(self, telegram_id: str) -> dict:
+        user = await self.db.get_user_by_telegram_id(telegram_id)
         if not user:
             raise ValueError("User not found. Run /setup first.")
-        return RedmineService(user["redmine_url"], user["api_key"])
+        return user
+
+    def _redmine_for_user(self, user: dict) -> RedmineService:
+        return redmine_registry.get(user["redmine_url"], user["api_key"])
+
+    async def _get_redmine_service(self, telegram_id: str) -> RedmineService:
+        return self._redmine_for_user(await self._get_user(telegram_id))
+
+    async def _parse_entries(self, telegram_id: str, text: str, activities: list, on_entry=None) -> list:
+        """Parse with the rule-based fast path and only fall back to Gemini when unsure.
+
+        With streaming enabled, ``on_entry(entries_so_far)`` is awaited as each
+        Gemini entry arrives.
+        """
+        result = worklog_parser.parse(text, activities)
+        if result.confidence >= worklog_parser.min_confidence:
+            logger.debug("Fast-path parsed %d entries for user=%s", len(result.entries), telegram_id)
+            return result.entries
+
+        cached = await parse_cache.get(text, activities)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        if self.STREAMING and on_entry is not None:
+            entries = []
+            async for entry in llm_executor.stream(telegram_id, self.gemini.stream_time_entries, text, activities):
+                if not entries:
+                    self._parse_latency["stream_first_entry"].append(time.perf_counter() - started)
+                entries.append(entry)
+                await on_entry(entries)
+            self._parse_latency["stream_total"].append(time.perf_counter() - started)
+        else:
+            entries = await llm_executor.run(telegram_id, self.gemini.parse_time_entries, text, activities)
+            self._parse_latency["blocking_total"].append(time.perf_counter() - started)
+        await parse_cache.set(text, activities, entries)
+        return entries
+
+    def parse_stats(self) -> dict:
+        """Median and p95 Gemini parse latency per mode, in ms."""
+        stats = {}
+        for name, samples in self._parse_latency.items():
+            ordered = sorted(samples)
+            stats[name] = {
+                "count": len(ordered),
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000) if ordered else 0,
+                "p95_ms": round(ordered[int(len(ordered) * 0.95)] * 1000) if ordered else 0,
+            }
+        return stats
+
+    async def _parse_work_log(self, telegram_id: str, text: str, activities: list, progress: ProgressMessage):
+        """Parse a work log, splitting long multi-day logs into chunks parsed in parallel.
+
+        Returns ``(entries, failed_sections, total_sections)``; a log that is not
+        split counts as one section.
+        """
+        chunks = chunked_parser.split(text)
+        if len(chunks) == 1:
+            entries = await self._parse_entries(telegram_id, text, activities, on_entry=self._preview_updater(progress))
+            return entries, [], 1
+
+        async def report(done: int, total: int):
+            await progress.update(f"🔄 Parsed {done}/{total} sections of your work log...")
+
+        await progress.update(f"🔄 Parsing your work log in {len(chunks)} sections...")
+        result = await chunked_parser.parse(
+            chunks, lambda chunk: self._parse_entries(telegram_id, chunk, activities), on_chunk=report
+        )
+        if not result.entries and result.errors:
+            raise ValueError(result.errors[0])
+        return result.entries, result.failed, result.total_chunks
+
+    @staticmethod
+    def _preview_updater(progress: ProgressMessage):
+        async def preview(entries: list):
+            lines = [f"{e['date']} · {e['hours']}h · {truncate_text(str(e.get('comments', '')), 40)}" for e in entries[-5:]]
+            await progress.update(f"🔄 Parsing your work log... {len(entries)} entries so far:\n" + "\n".join(lines))
+        return preview
 
     async def start_log_time(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["in_conversation"] = True
+        prefetcher.schedule(context, str(update.effective_user.id))
         msg_obj = update.callback_query.message if update.callback_query else update.message
         logger.debug("start_log_time started for user=%s", update.effective_user.id if update.effective_user else "unknown")
         message = """
@@ -50,39 +147,30 @@ Type your work log below:
         msg_obj = update.message
 
         logger.debug("process_work_log invoked for user=%s text=%s", telegram_id, work_text[:200])
-        await msg_obj.reply_text("🔄 Processing your work log with AI... Please wait.")
+        progress = await ProgressMessage(msg_obj).start("🔄 Processing your work log... Please wait.")
 
         try:
-            redmine = self._get_redmine_service(telegram_id)
-            user_data = self.db.get_user_by_telegram_id(telegram_id)
-            activities_result = await redmine.get_time_entry_activities()
-            activities = activities_result.get("time_entry_activities", [])
+            user_data = await self._get_user(telegram_id)
+            redmine = self._redmine_for_user(user_data)
+            await progress.update("🔄 Fetching activities from Redmine...")
+            activities = await reference_data.get(redmine, "time_entry_activities")
 
             if not activities:
-                await msg_obj.reply_text("❌ No time entry activities found in Redmine.")
+                await progress.finish("❌ No time entry activities found in Redmine.")
                 context.user_data["in_conversation"] = False
                 return ConversationHandler.END
 
-            # Parse all entries via Gemini
-            parsed_entries = self.gemini.parse_time_entries(work_text, activities)
+            await progress.update("🔄 Parsing your work log...")
+            parsed_entries, failed_sections, total_sections = await self._parse_work_log(
+                telegram_id, work_text, activities, progress
+            )
             if not parsed_entries:
-                await msg_obj.reply_text("❌ Could not parse your message. Try again.")
+                await progress.finish("❌ Could not parse your message. Try again.")
                 context.user_data["in_conversation"] = False
                 return ConversationHandler.END
 
-            # Assign activity IDs
-            activity_map = {a["name"].lower(): a["id"] for a in activities}
             for entry in parsed_entries:
-                activity_name = entry.get("activity", "").lower()
-                matched_id = None
-                for act_name, act_id in activity_map.items():
-                    if activity_name in act_name or act_name in activity_name:
-                        matched_id = act_id
-                        break
-                if not matched_id:
-                    matched_id = activities[0]["id"]
-                entry["activity_id"] = matched_id
-                entry["activity_name"] = next((a["name"] for a in activities if a["id"] == matched_id), "Unknown")
+                activity_resolver.assign(entry, activities)
 
             # If user selected an issue earlier, attach it to all parsed entries without a specified issue
             selected_issue_id = context.user_data.get("selected_issue_id")
@@ -103,7 +191,13 @@ Type your work log below:
                            f"   Description: {entry['comments']}\n" \
                            f"   Issue ID: {entry.get('issue_id')}\n\n"
                 total_hours += entry["hours"]
-            summary += f"**Total: {total_hours} hours**\n\nIs this correct?"
+            summary += f"**Total: {total_hours} hours**\n\n"
+            if failed_sections:
+                summary += f"⚠️ Could not parse {len(failed_sections)} of {total_sections} sections, they are not included:\n"
+                for section in failed_sections:
+                    summary += f"• {truncate_text(section.splitlines()[0], 60)}\n"
+                summary += "Log them again with /logtime afterwards.\n\n"
+            summary += "Is this correct?"
 
             keyboard = [
                 [
@@ -113,12 +207,18 @@ Type your work log below:
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await msg_obj.reply_text(summary, parse_mode="Markdown", reply_markup=reply_markup)
+            await progress.finish(summary, parse_mode="Markdown", reply_markup=reply_markup)
             return self.CONFIRMING
 
+        except LLMCancelled:
+            return ConversationHandler.END
+        except (LLMQueueTimeout, LLMQueueFull) as e:
+            await progress.finish(f"⏳ {e}")
+            context.user_data["in_conversation"] = False
+            return ConversationHandler.END
         except Exception as e:
             logger.exception("Error processing work log: %s", e)
-            await msg_obj.reply_text(f"Could not parse work log: {e}\nPlease try again.")
+            await progress.finish(f"Could not parse work log: {e}\nPlease try again.")
             context.user_data["in_conversation"] = False
             return ConversationHandler.END
 
@@ -143,42 +243,67 @@ Type your work log below:
             context.user_data.clear()
             return ConversationHandler.END
 
-        redmine = self._get_redmine_service(telegram_id)
-        await msg_obj.reply_text("⏳ Submitting time entries to Redmine...")
-
-        success_count = 0
-        errors = []
-
-        for entry in parsed_entries:
-            try:
-                data = {
-                    "project_id": project_id,
-                    "spent_on": entry["date"],
-                    "hours": entry["hours"],
-                    "activity_id": entry["activity_id"],
-                    "comments": entry["comments"],
-                    "issue_id": entry.get("issue_id")
-                }
-                await redmine.create_time_entry(data)
-                success_count += 1
-            except httpx.HTTPStatusError as e:
+        redmine = await self._get_redmine_service(telegram_id)
+        progress = await ProgressMessage(msg_obj).start(f"⏳ Submitting {len(parsed_entries)} time entries to Redmine...")
+
+        payloads = [
+            {
+                "project_id": project_id,
+                "spent_on": entry["date"],
+                "hours": entry["hours"],
+                "activity_id": entry["activity_id"],
+                "comments": entry["comments"],
+                "issue_id": entry.get("issue_id")
+            }
+            for entry in parsed_entries
+            if entry.get("activity_id") is not None
+        ]
+        # Entries whose activity matched nothing (and the instance has no default) cannot be posted.
+        errors = [
+            f"{entry['date']}: activity '{entry.get('activity')}' not recognised"
+            for entry in parsed_entries if entry.get("activity_id") is None
+        ]
+
+        async def report(done: int, total: int):
+            await progress.update(f"⏳ Submitted {done}/{total} time entries...")
+
+        # A retap of the same prompt carries the same message, so it maps to the same batch.
+        batch_id = f"{msg_obj.chat_id}:{msg_obj.message_id}"
+        submitted_at = datetime.now(timezone.utc)
+        results = await time_entry_submitter.submit(redmine, telegram_id, batch_id, payloads, on_progress=report)
+
+        success_count = sum(1 for r in results if r.status == CREATED)
+        duplicate_count = sum(1 for r in results if r.status == DUPLICATE)
+        if success_count:
+            activities = await reference_data.get(redmine, "time_entry_activities")
+            await timesheet_service.record(
+                telegram_id, [r.payload for r in results if r.status == CREATED], activities, submitted_at
+            )
+
+        for result in results:
+            if result.status != FAILED:
+                continue
+            e = result.error
+            if isinstance(e, httpx.HTTPStatusError):
                 if e.response.status_code == 422:
-                    error_msg = f"Issue {entry.get('issue_id')} might be closed or invalid."
+                    error_msg = f"Issue {result.payload.get('issue_id')} might be closed or invalid."
                 else:
                     error_msg = f"{e.response.status_code} Error: {e.response.text}"
-                errors.append(f"{entry['date']}: {error_msg}")
-            except Exception as e:
-                logger.exception("Failed to log time entry: %s", e)
-                errors.append(f"{entry['date']}: {e}")
+            else:
+                logger.error("Failed to log time entry: %s", e)
+                error_msg = str(e)
+            errors.append(f"{result.payload['spent_on']}: {error_msg}")
 
         msg_text = ""
         if success_count >= 1:
             msg_text = f"✅ **Logged {success_count} time entries successfully!**\n\n"
+        if duplicate_count:
+            msg_text += f"ℹ️ Skipped {duplicate_count} entries that were already submitted.\n\n"
         if errors:
             msg_text += "⚠️ **Some entries failed:**\n" + "\n".join(f"- {e}" for e in errors[:5])
         msg_text += "\nUse /menu to continue."
 
-        await msg_obj.reply_text(msg_text, parse_mode="Markdown")
+        await progress.finish(msg_text, parse_mode="Markdown")
         context.user_data.clear()
         return ConversationHandler.END
 
@@ -193,19 +318,22 @@ Type your work log below:
                 return
 
             context.user_data["in_conversation"] = True
-            await update.message.reply_text("🔄 Processing your log with AI...")
+            progress = await ProgressMessage(update.message).start("🔄 Processing your log...")
 
-            redmine = self._get_redmine_service(telegram_id)
-            activities_result = await redmine.get_time_entry_activities()
-            activities = activities_result.get("time_entry_activities", [])
+            user_row = await self._get_user(telegram_id)
+            redmine = self._redmine_for_user(user_row)
+            activities = await reference_data.get(redmine, "time_entry_activities")
             if not activities:
-                await update.message.reply_text("❌ No time entry activities found in Redmine.")
+                await progress.finish("❌ No time entry activities found in Redmine.")
                 context.user_data.clear()
                 return
 
-            parsed_entries = self.gemini.parse_time_entries(text, activities)
+            await progress.update("🔄 Parsing your log...")
+            parsed_entries = await self._parse_entries(
+                telegram_id, text, activities, on_entry=self._preview_updater(progress)
+            )
             if not parsed_entries:
-                await update.message.reply_text("❌ Could not parse your message. Example: 'Worked 2h fixing login yesterday'.")
+                await progress.finish("❌ Could not parse your message. Example: 'Worked 2h fixing login yesterday'.")
                 context.user_data.clear()
                 return
 
@@ -214,22 +342,12 @@ Type your work log below:
                     entry["issue_id"] = issue_id
 
             for entry in parsed_entries:
-                activity_name = entry.get("activity", "").lower()
-                activity_id = None
-                for a in activities:
-                    if activity_name and activity_name in a.get("name", "").lower():
-                        activity_id = a["id"]
-                        break
-                if not activity_id:
-                    activity_id = activities[0]["id"]
-                entry["activity_id"] = activity_id
-                entry["activity_name"] = next((a["name"] for a in activities if a["id"] == activity_id), "Unknown")
+                activity_resolver.assign(entry, activities)
 
             context.user_data["parsed_entries"] = parsed_entries
-            user_row = self.db.get_user_by_telegram_id(telegram_id)
             project_id = user_row.get("default_project_id")
             if not project_id:
-                await update.message.reply_text("❌ No default project set. Please run /setup first.")
+                await progress.finish("❌ No default project set. Please run /setup first.")
                 context.user_data.clear()
                 return
             context.user_data["project_id"] = project_id
@@ -253,9 +371,14 @@ Type your work log below:
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await update.message.reply_text(summary, parse_mode="Markdown", reply_markup=reply_markup)
+            await progress.finish(summary, parse_mode="Markdown", reply_markup=reply_markup)
             return self.CONFIRMING
 
+        except LLMCancelled:
+            return
+        except (LLMQueueTimeout, LLMQueueFull) as e:
+            await progress.finish(f"⏳ {e}")
+            return
         except Exception as e:
             logger.exception("quick_log_for_selected_issue failed: %s", e)
             try:
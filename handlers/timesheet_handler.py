@@ -0,0 +1,84 @@
+import os
+import logging
+from datetime import date
+from typing import Optional
+from telegram import Update
+from telegram.helpers import escape_markdown
+from telegram.ext import ContextTypes
+from services.database_service import DatabaseService
+from services.gemini_service import GeminiService
+from services.llm_executor import llm_executor
+from services.redmine_service import redmine_registry
+from services.timesheet_service import PERIODS, period_range, timesheet_service
+from utils.progress import ProgressMessage
+
+logger = logging.getLogger(__name__)
+
+
+class TimesheetHandler:
+    # Ask Gemini for a short narrative below the numbers.
+    NARRATIVE = os.getenv("TIMESHEET_NARRATIVE", "true").lower() == "true"
+
+    def __init__(self):
+        self.db = DatabaseService()
+        self.gemini = GeminiService()
+
+    @staticmethod
+    def _format(title: str, summary: dict) -> str:
+        if not summary["entries"]:
+            return f"🗓️ **{title}** ({summary['from']} → {summary['to']})\n\nNo time logged in this period."
+
+        message = (
+            f"🗓️ **{title}** ({summary['from']} → {summary['to']})\n"
+            f"**Total: {summary['total_hours']}h** in {summary['entries']} entries\n\n"
+            "**By day**\n"
+        )
+        for day, hours in summary["days"].items():
+            message += f"{date.fromisoformat(day).strftime('%a %d %b')}: {hours}h\n"
+        message += "\n**By activity**\n"
+        message += "".join(f"{escape_markdown(name)}: {hours}h\n" for name, hours in summary["activities"])
+        if summary["issues"]:
+            message += "\n**Top issues**\n"
+            message += "".join(f"#{issue}: {hours}h\n" for issue, hours in summary["issues"][:10])
+        return message
+
+    async def show_timesheet(self, update: Update, context: ContextTypes.DEFAULT_TYPE, period: Optional[str] = None):
+        telegram_id = str(update.effective_user.id)
+        period = period or (context.args[0].lower() if context.args else "week")
+        if period not in PERIODS:
+            await update.message.reply_text(f"Usage: /timesheet [{'|'.join(PERIODS)}]")
+            return
+
+        user = await self.db.get_user_by_telegram_id(telegram_id)
+        if not user:
+            await update.message.reply_text("No account found. Use /setup to configure your account.")
+            return
+
+        progress = await ProgressMessage(update.message).start("🔄 Building your timesheet...")
+        try:
+            start, end = period_range(period)
+            redmine = redmine_registry.get(user["redmine_url"], user["api_key"])
+            summary = await timesheet_service.summary(telegram_id, start, end, redmine=redmine)
+        except Exception as e:
+            logger.exception("Error building timesheet: %s", e)
+            await progress.finish("Could not build your timesheet. Please try again later.")
+            return
+
+        message = self._format(PERIODS[period], summary)
+        if not self.NARRATIVE or not summary["entries"]:
+            await progress.finish(message, parse_mode="Markdown")
+            return
+
+        # The numbers are ready now; the narrative follows in the same message.
+        await progress.update(message.replace("**", "") + "\n✍️ Writing summary...")
+        try:
+            narrative = await llm_executor.run(telegram_id, self.gemini.summarize_timesheet, summary)
+            message += f"\n{escape_markdown(narrative)}"
+        except Exception as e:
+            logger.warning(f"Timesheet narrative skipped: {e}")
+        await progress.finish(message, parse_mode="Markdown")
+
+    async def reconcile_job(self, context: ContextTypes.DEFAULT_TYPE):
+        reconciled = await timesheet_service.reconcile_due()
+        if reconciled:
+            logger.info(f"Reconciled timesheet aggregates for {reconciled} users")
@@ -2,10 +2,12 @@
 import os
 import logging
 from dotenv import load_dotenv
-from adapters.telegram_adapter import TelegramBotAdapter
 
+# Load before importing the adapter: services read their settings at import time.
 load_dotenv()
 
+from adapters.telegram_adapter import TelegramBotAdapter
+
 logging.basicConfig(
     format='%(asctime)s - [%(levelname)s] - %(name)s - %(message)s',
     level=logging.INFO
@@ -21,8 +23,8 @@ def main():
     try:
         bot = TelegramBotAdapter(telegram_token)
         logger.info("Starting Redmine Telegram Bot...")
-        # Blocking run
-        bot.app.run_polling()
+        # Blocking run; BOT_MODE selects long polling or webhook
+        bot.run()
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot stopped manually.")
     except Exception as e:
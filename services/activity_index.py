@@ -0,0 +1,254 @@
+import os
+import re
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[a-z]+")
+
+# Words people use for common Redmine activities, matched against the instance's activity names.
+ACTIVITY_ALIASES = {
+    "development": ["dev", "develop", "coding", "code", "implement", "fix", "bug", "debug", "refactor", "feature"],
+    "design": ["design", "mockup", "architecture", "wireframe"],
+    "testing": ["test", "qa", "verify", "verification", "regression"],
+    "review": ["review", "pr", "cr"],
+    "meeting": ["meeting", "call", "standup", "sync", "discussion", "scrum", "retro", "demo"],
+    "documentation": ["doc", "docs", "document", "documentation", "writeup", "wiki"],
+    "support": ["support", "helpdesk", "incident", "triage"],
+    "research": ["research", "investigate", "investigation", "spike", "analysis", "explore"],
+    "deployment": ["deploy", "deployment", "release", "rollout"],
+    "management": ["planning", "plan", "management", "estimation", "grooming"],
+}
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+class ActivityIndex:
+    """Lookup structures for one Redmine instance's time entry activities.
+
+    Built once per activity list: normalized names (looked up as runs of
+    whole words), alias words (matched as whole words or, for aliases longer
+    than two letters, as word prefixes) and a single-deletion index over the
+    name vocabulary for typos. The typo step only runs when the exact, alias
+    and token lookups found nothing, and only scores the few candidates the
+    deletion index returns. ``match`` returns the best activity and a score
+    in [0, 1].
+    """
+
+    MIN_TYPO_LENGTH = 4
+    TYPO_CUTOFF = 0.8
+
+    def __init__(self, activities: List[dict]):
+        self.activities = activities
+        self.default = next((a for a in activities if a.get("is_default")), None)
+        self._order = {id(a): i for i, a in enumerate(activities)}
+        self._by_name: Dict[str, dict] = {}
+        self._tokens: Dict[str, List[dict]] = {}
+        self._name_tokens: Dict[int, frozenset] = {}
+        self._aliases: Dict[str, List[Tuple[dict, float, bool]]] = {}
+
+        names = []
+        for activity in activities:
+            name = normalize(activity["name"])
+            if not name:
+                continue
+            self._by_name.setdefault(name, activity)
+            names.append(name)
+            self._name_tokens[id(activity)] = frozenset(name.split())
+            for token in self._name_tokens[id(activity)]:
+                self._tokens.setdefault(token, []).append(activity)
+            for canonical, aliases in ACTIVITY_ALIASES.items():
+                if canonical not in name and name not in aliases:
+                    continue
+                self._aliases.setdefault(canonical, []).append((activity, 0.95, False))
+                for alias in aliases:
+                    self._aliases.setdefault(alias, []).append((activity, 0.9, len(alias) > 2))
+
+        # Names are looked up as runs of whole words, up to the longest name.
+        self._max_name_words = max((len(n.split()) for n in names), default=0)
+        # Every vocabulary token and each of its single-character deletions -> tokens.
+        # Two words within one insertion, deletion or substitution share a key.
+        self._deletions: Dict[str, set] = {}
+        for token in self._tokens:
+            if len(token) < self.MIN_TYPO_LENGTH:
+                continue
+            for variant in self._variants(token):
+                self._deletions.setdefault(variant, set()).add(token)
+        # Aliases usable as word prefixes, longest first, grouped by their first three letters.
+        # Only the longest alias a word starts with is used, so each alias also carries the
+        # activities of the shorter prefix aliases it starts with.
+        prefixes = sorted((a for a, entries in self._aliases.items() if any(p for _, _, p in entries)),
+                          key=len, reverse=True)
+        self._prefixes: Dict[str, List[str]] = {}
+        for alias in prefixes:
+            self._prefixes.setdefault(alias[:3], []).append(alias)
+        self._prefix_entries: Dict[str, List[dict]] = {
+            alias: [activity for shorter in prefixes if alias.startswith(shorter)
+                    for activity, _, prefix in self._aliases[shorter] if prefix]
+            for alias in prefixes
+        }
+        self._memo: "OrderedDict[str, Tuple[Optional[dict], float]]" = OrderedDict()
+
+    @staticmethod
+    def _variants(word: str) -> set:
+        return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+    def _typo_candidates(self, word: str) -> set:
+        found = set()
+        if len(word) < self.MIN_TYPO_LENGTH:
+            return found
+        deletions = self._deletions
+        for i in range(len(word) + 1):
+            hit = deletions.get(word[:i] + word[i + 1:] if i < len(word) else word)
+            if hit:
+                found |= hit
+        return found
+
+    @staticmethod
+    def _typo_ratio(a: str, b: str) -> float:
+        """difflib's ratio for two words one edit (or one swap of neighbours) apart."""
+        if len(a) == len(b):
+            return (len(a) - 1) / len(a)
+        return 2 * min(len(a), len(b)) / (len(a) + len(b))
+
+    def match(self, text: str) -> Tuple[Optional[dict], float]:
+        """Return the activity that best fits ``text`` and a score in [0, 1]."""
+        lowered = normalize(text)
+        cached = self._memo.get(lowered)
+        if cached is not None:
+            self._memo.move_to_end(lowered)
+            return cached
+        result = self._match(lowered)
+        self._memo[lowered] = result
+        if len(self._memo) > 512:
+            self._memo.popitem(last=False)
+        return result
+
+    def _match(self, lowered: str) -> Tuple[Optional[dict], float]:
+        if not lowered:
+            return None, 0.0
+        exact = self._by_name.get(lowered)
+        if exact is not None:
+            return exact, 1.0
+        words = lowered.split()
+        found = None
+        for size in range(min(self._max_name_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                name = " ".join(words[start:start + size])
+                if name in self._by_name and (found is None or len(name) > len(found)):
+                    found = name
+        if found is not None:
+            return self._by_name[found], 1.0
+
+        scores: Dict[int, float] = {}
+        by_id: Dict[int, dict] = {}
+
+        def offer(activity: dict, score: float):
+            key = id(activity)
+            if score > scores.get(key, 0.0):
+                scores[key] = score
+                by_id[key] = activity
+
+        unique_words = set(words)
+        for word in unique_words:
+            for activity, score, _ in self._aliases.get(word, ()):
+                offer(activity, score)
+            for alias in self._prefixes.get(word[:3], ()):
+                if len(alias) < len(word) and word.startswith(alias):
+                    for activity in self._prefix_entries[alias]:
+                        offer(activity, 0.9)
+                    break
+
+            # Shared name tokens ("review" for "Code Review"), weighted by how much of the name they cover.
+            for activity in self._tokens.get(word, ()):
+                tokens = self._name_tokens[id(activity)]
+                offer(activity, 0.9 * len(tokens & unique_words) / len(tokens))
+
+        if not scores:
+            # Nothing matched outright; try typos ("developement", "meting").
+            for word in unique_words:
+                for close in self._typo_candidates(word):
+                    ratio = self._typo_ratio(close, word)
+                    if ratio < self.TYPO_CUTOFF:
+                        continue
+                    for activity in self._tokens[close]:
+                        offer(activity, 0.85 * ratio)
+
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=lambda key: (scores[key], -self._order[key]))
+        return by_id[best], scores[best]
+
+
+class ActivityResolver:
+    """Shared activity matching for the fast-path parser and LLM-parsed entries.
+
+    Indexes are keyed on the identity of the activity list, which
+    ``reference_data`` keeps per Redmine instance, so each instance's index is
+    built once and replaced together with the list when it is refreshed.
+    Entries whose activity cannot be matched get the instance's default
+    activity, or no activity at all, and are marked so the user sees it.
+    """
+
+    def __init__(self, min_score: float = 0.6, max_indexes: int = 64):
+        self.min_score = min_score
+        self.max_indexes = max_indexes
+        self._indexes: "OrderedDict[int, ActivityIndex]" = OrderedDict()
+        self.builds = 0
+        self.lookups = 0
+        self.defaulted = 0
+        self.unresolved = 0
+
+    def index_for(self, activities: List[dict]) -> ActivityIndex:
+        key = id(activities)
+        index = self._indexes.get(key)
+        # The index holds a reference to its list, so the id cannot be reused while it is cached.
+        if index is not None:
+            self._indexes.move_to_end(key)
+            return index
+        index = ActivityIndex(activities)
+        self.builds += 1
+        self._indexes[key] = index
+        if len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+        return index
+
+    def match(self, text: str, activities: List[dict]) -> Tuple[Optional[dict], float]:
+        self.lookups += 1
+        return self.index_for(activities).match(text)
+
+    def assign(self, entry: dict, activities: List[dict]):
+        """Set ``activity_id``/``activity_name`` on a parsed entry from its ``activity`` text."""
+        requested = str(entry.get("activity") or "")
+        activity, score = self.match(requested, activities)
+        if activity is not None and score >= self.min_score:
+            entry["activity_id"] = activity["id"]
+            entry["activity_name"] = activity["name"]
+            return
+
+        default = self.index_for(activities).default
+        if default is not None:
+            self.defaulted += 1
+            entry["activity_id"] = default["id"]
+            entry["activity_name"] = f"{default['name']} (default, '{requested}' not recognised)"
+        else:
+            self.unresolved += 1
+            entry["activity_id"] = None
+            entry["activity_name"] = f"⚠️ '{requested}' not recognised"
+        logger.info(f"No activity matched '{requested}' (best score {score:.2f})")
+
+    def stats(self) -> dict:
+        return {
+            "indexes": len(self._indexes),
+            "builds": self.builds,
+            "lookups": self.lookups,
+            "defaulted": self.defaulted,
+            "unresolved": self.unresolved,
+        }
+
+
+activity_resolver = ActivityResolver(min_score=float(os.getenv("ACTIVITY_MATCH_MIN_SCORE", "0.6")))
@@ -0,0 +1,198 @@
+import os
+import re
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+from services.llm_executor import llm_executor, LLMCancelled
+from services.parse_cache import SLASH_DATE_RE
+from services.worklog_parser import DAY_MONTH_RE, ISO_DATE_RE, MONTH_DAY_RE, RELATIVE_DAY_RE, WEEKDAY_RE
+
+logger = logging.getLogger(__name__)
+
+BULLET_RE = re.compile(r"^[\s\-*•>#]+")
+DAY_HEADER_RES = (ISO_DATE_RE, SLASH_DATE_RE, DAY_MONTH_RE, MONTH_DAY_RE, WEEKDAY_RE, RELATIVE_DAY_RE)
+
+
+@dataclass
+class ChunkedParseResult:
+    entries: List[dict] = field(default_factory=list)
+    total_chunks: int = 0
+    failed: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+
+class ChunkedParser:
+    """Splits long multi-day work logs and parses the pieces in parallel.
+
+    Logs are cut at day headings ("Monday:", "2024-05-16", "yesterday") or, when
+    there are none, at blank lines; sections are then packed into chunks of at
+    most ``chunk_chars``. A day section that is too long on its own is split by
+    line and its heading repeated on every piece so no entry loses its date.
+    At most ``parallelism`` chunks per log are parsed at once, which keeps a
+    single log within the executor's per-user queue; failed chunks are retried
+    ``retries`` times and the rest of the log is kept if they still fail.
+    """
+
+    def __init__(self, chunk_chars: int = 1500, min_chars: int = 1200, parallelism: int = 2, retries: int = 1):
+        self.chunk_chars = chunk_chars
+        self.min_chars = min_chars
+        self.parallelism = max(1, parallelism)
+        self.retries = retries
+        self.logs_split = 0
+        self.chunks_parsed = 0
+        self.chunk_failures = 0
+        self.chunk_retries = 0
+        self.partial_results = 0
+        self.duplicates_dropped = 0
+
+    @staticmethod
+    def _is_day_header(line: str) -> bool:
+        stripped = BULLET_RE.sub("", line)
+        return any(pattern.match(stripped) for pattern in DAY_HEADER_RES)
+
+    def _sections(self, text: str) -> List[List[str]]:
+        sections: List[List[str]] = []
+        current: List[str] = []
+        has_header = False
+        for line in text.splitlines():
+            if not line.strip():
+                # Blank lines separate paragraphs, but stay inside a dated section.
+                if current and not has_header:
+                    sections.append(current)
+                    current = []
+                continue
+            if self._is_day_header(line):
+                if current:
+                    sections.append(current)
+                current, has_header = [line], True
+                continue
+            current.append(line)
+        if current:
+            sections.append(current)
+        return sections
+
+    def split(self, text: str) -> List[str]:
+        """Return the chunks to parse separately, or ``[text]`` when the log is short enough."""
+        if len(text) < self.min_chars:
+            return [text]
+
+        pieces: List[str] = []
+        for lines in self._sections(text):
+            section = "\n".join(lines)
+            if len(section) <= self.chunk_chars:
+                pieces.append(section)
+                continue
+            header = lines[0] if self._is_day_header(lines[0]) else None
+            body = lines[1:] if header else lines
+            piece: List[str] = [header] if header else []
+            for line in body:
+                if len(piece) > (1 if header else 0) and len("\n".join(piece + [line])) > self.chunk_chars:
+                    pieces.append("\n".join(piece))
+                    piece = [header] if header else []
+                piece.append(line)
+            if piece:
+                pieces.append("\n".join(piece))
+
+        chunks: List[str] = []
+        for piece in pieces:
+            if chunks and len(chunks[-1]) + len(piece) + 2 <= self.chunk_chars:
+                chunks[-1] += "\n\n" + piece
+            else:
+                chunks.append(piece)
+        return chunks or [text]
+
+    @staticmethod
+    def _dedupe_key(entry: dict) -> tuple:
+        return (
+            entry.get("date"),
+            str(entry.get("issue_id")),
+            round(float(entry.get("hours") or 0), 2),
+            str(entry.get("activity", "")).strip().lower(),
+            " ".join(str(entry.get("comments", "")).lower().split()),
+        )
+
+    async def parse(self, chunks: List[str], parse_chunk: Callable[[str], Awaitable[list]],
+                    on_chunk: Optional[Callable[[int, int], Awaitable[None]]] = None) -> ChunkedParseResult:
+        """Run ``parse_chunk`` on every chunk and merge the entries in log order.
+
+        ``on_chunk(done, total)`` is awaited as each chunk settles. Cancellation
+        (e.g. /cancel) aborts the whole log.
+        """
+        self.logs_split += 1
+        semaphore = asyncio.Semaphore(self.parallelism)
+        results: List[Optional[list]] = [None] * len(chunks)
+        errors: List[Optional[str]] = [None] * len(chunks)
+        done = 0
+
+        async def run(index: int):
+            nonlocal done
+            for attempt in range(self.retries + 1):
+                try:
+                    async with semaphore:
+                        results[index] = await parse_chunk(chunks[index])
+                    self.chunks_parsed += 1
+                    break
+                except LLMCancelled:
+                    raise
+                except Exception as e:
+                    self.chunk_failures += 1
+                    errors[index] = str(e)
+                    logger.warning(f"Work log chunk {index + 1}/{len(chunks)} failed (attempt {attempt + 1}): {e}")
+                    if attempt < self.retries:
+                        self.chunk_retries += 1
+            done += 1
+            if on_chunk is not None:
+                await on_chunk(done, len(chunks))
+
+        tasks = [asyncio.create_task(run(i)) for i in range(len(chunks))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        result = ChunkedParseResult(total_chunks=len(chunks))
+        # Only a repeat across a chunk boundary (the model re-reading a repeated
+        # day heading) is a duplicate, and at most as many times as the previous
+        # chunk had it; identical entries within one chunk are all kept.
+        previous: Counter = Counter()
+        for chunk, entries, error in zip(chunks, results, errors):
+            if entries is None:
+                result.failed.append(chunk)
+                result.errors.append(error)
+                previous = Counter()
+                continue
+            keys = [self._dedupe_key(entry) for entry in entries]
+            repeats = previous.copy()
+            for entry, key in zip(entries, keys):
+                if repeats[key] > 0:
+                    repeats[key] -= 1
+                    self.duplicates_dropped += 1
+                    continue
+                result.entries.append(entry)
+            previous = Counter(keys)
+        if result.failed and result.entries:
+            self.partial_results += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "logs_split": self.logs_split,
+            "chunks_parsed": self.chunks_parsed,
+            "chunk_failures": self.chunk_failures,
+            "chunk_retries": self.chunk_retries,
+            "partial_results": self.partial_results,
+            "duplicates_dropped": self.duplicates_dropped,
+        }
+
+
+chunked_parser = ChunkedParser(
+    chunk_chars=int(os.getenv("LLM_CHUNK_CHARS", "1500")),
+    min_chars=int(os.getenv("LLM_CHUNK_MIN_CHARS", "1200")),
+    # More chunks in flight than the per-user queue allows would be rejected with LLMQueueFull.
+    parallelism=min(int(os.getenv("LLM_CHUNK_PARALLELISM", "2")), llm_executor.max_queued_per_user),
+    retries=int(os.getenv("LLM_CHUNK_RETRIES", "1")),
+)
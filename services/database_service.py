@@ -1,84 +1,373 @@
 import os
+import asyncio
 import logging
+import threading
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, execute_values
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from services.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection could be acquired in time."""
+
+
+class ConnectionPool:
+    """Bounded psycopg2 pool with checkout health checks and acquire timeouts.
+
+    psycopg2 is blocking, so queries run on a dedicated thread pool sized to the
+    connection pool; the event loop only ever awaits the result.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10,
+                 acquire_timeout: float = 10.0, health_check_interval: float = 30.0):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        self._pool = pool.ThreadedConnectionPool(min_size, max_size, dsn)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used: Dict[int, float] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix="db-pool")
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding unhealthy database connection: {e}")
+            return False
+
+    def getconn(self, deadline: float):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+            raise PoolTimeoutError(
+                f"Timed out after {self.acquire_timeout}s waiting for a database connection"
+            )
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            if close or conn.closed:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def stats(self) -> dict:
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": len(self._pool._used),
+            "idle": len(self._pool._pool),
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self._pool.closeall()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str) -> ConnectionPool:
+    """Return the process-wide pool for ``dsn``, creating it on first use."""
+    with _pools_lock:
+        db_pool = _pools.get(dsn)
+        if db_pool is None:
+            db_pool = ConnectionPool(
+                dsn,
+                min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                acquire_timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT", "10")),
+                health_check_interval=float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30")),
+            )
+            _pools[dsn] = db_pool
+        return db_pool
+
+
+def close_pools():
+    with _pools_lock:
+        for db_pool in _pools.values():
+            db_pool.close()
+        _pools.clear()
+
+
 class DatabaseService:
-    
+
+    # Shared by every DatabaseService instance so all handlers hit the same cache.
+    user_cache = TTLCache(
+        maxsize=int(os.getenv("USER_CACHE_SIZE", "1024")),
+        ttl=float(os.getenv("USER_CACHE_TTL", "300")),
+    )
+
     def __init__(self):
         self.database_url = os.getenv('DATABASE_URL')
-    
+
+    @property
+    def pool(self) -> ConnectionPool:
+        return get_pool(self.database_url)
+
     @contextmanager
-    def get_connection(self):
-        conn = None
+    def get_connection(self, deadline: float = None):
+        db_pool = self.pool
+        if deadline is None:
+            deadline = time.monotonic() + db_pool.acquire_timeout
+        conn = db_pool.getconn(deadline)
+        broken = False
         try:
-            conn = psycopg2.connect(self.database_url)
             yield conn
             conn.commit()
         except Exception as e:
-            if conn:
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
                 conn.rollback()
             logger.error(f"Database error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
-    
-    def create_user(self, telegram_id: str, employee_id: str, name: str, 
-                   redmine_url: str, api_key: str, project_id: str = None):
-        with self.get_connection() as conn:
+            db_pool.putconn(conn, close=broken)
+
+    async def _run(self, fn, *args):
+        """Run a blocking database call on the pool's executor."""
+        db_pool = self.pool
+        deadline = time.monotonic() + db_pool.acquire_timeout
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(db_pool.executor, fn, deadline, *args)
+
+    def _execute(self, deadline: float, query: str, params: tuple):
+        with self.get_connection(deadline) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO users 
-                    (telegram_id, employee_id, name, redmine_url, api_key, default_project_id)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (telegram_id) 
-                    DO UPDATE SET 
-                        employee_id = EXCLUDED.employee_id,
-                        name = EXCLUDED.name,
-                        redmine_url = EXCLUDED.redmine_url,
-                        api_key = EXCLUDED.api_key,
-                        default_project_id = EXCLUDED.default_project_id,
-                        updated_at = CURRENT_TIMESTAMP
-                """, (telegram_id, employee_id, name, redmine_url, api_key, project_id))
-    
-    def get_user_by_telegram_id(self, telegram_id: str):
-        with self.get_connection() as conn:
+                cur.execute(query, params)
+
+    def _fetchone(self, deadline: float, query: str, params: tuple):
+        with self.get_connection(deadline) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM users WHERE telegram_id = %s
-                """, (telegram_id,))
+                cur.execute(query, params)
                 return cur.fetchone()
-    
-    def get_user_by_employee_id(self, employee_id: str):
-        with self.get_connection() as conn:
+
+    def _fetchall(self, deadline: float, query: str, params: tuple):
+        with self.get_connection(deadline) as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM users WHERE employee_id = %s
-                """, (employee_id,))
-                return cur.fetchone()
-    
-    def update_user(self, telegram_id: str, **kwargs):
+                cur.execute(query, params)
+                return cur.fetchall()
+
+    @classmethod
+    def user_cache_stats(cls) -> dict:
+        return cls.user_cache.stats()
+
+    async def create_user(self, telegram_id: str, employee_id: str, name: str,
+                          redmine_url: str, api_key: str, project_id: str = None):
+        await self._run(self._execute, """
+            INSERT INTO users
+            (telegram_id, employee_id, name, redmine_url, api_key, default_project_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (telegram_id)
+            DO UPDATE SET
+                employee_id = EXCLUDED.employee_id,
+                name = EXCLUDED.name,
+                redmine_url = EXCLUDED.redmine_url,
+                api_key = EXCLUDED.api_key,
+                default_project_id = EXCLUDED.default_project_id,
+                updated_at = CURRENT_TIMESTAMP
+        """, (telegram_id, employee_id, name, redmine_url, api_key, project_id))
+        self.user_cache.invalidate(telegram_id)
+
+    def _bulk_upsert_users(self, deadline: float, rows: List[tuple]):
+        with self.get_connection(deadline) as conn:
+            with conn.cursor() as cur:
+                # New users first; existing ones are left to the UPDATE, which keeps
+                # their name and default project when the import leaves them out.
+                execute_values(cur, """
+                    INSERT INTO users
+                    (telegram_id, employee_id, name, redmine_url, api_key, default_project_id)
+                    SELECT v.telegram_id, v.employee_id, COALESCE(v.name, v.fallback_name),
+                           v.redmine_url, v.api_key, v.default_project_id
+                    FROM (VALUES %s) AS v (telegram_id, employee_id, name, fallback_name,
+                                           redmine_url, api_key, default_project_id)
+                    ON CONFLICT (telegram_id) DO NOTHING
+                """, rows, template=self._BULK_USER_TEMPLATE, page_size=1000)
+                execute_values(cur, """
+                    UPDATE users SET
+                        employee_id = v.employee_id,
+                        name = COALESCE(v.name, users.name),
+                        redmine_url = v.redmine_url,
+                        api_key = v.api_key,
+                        default_project_id = COALESCE(v.default_project_id, users.default_project_id),
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v (telegram_id, employee_id, name, fallback_name,
+                                           redmine_url, api_key, default_project_id)
+                    WHERE users.telegram_id = v.telegram_id
+                """, rows, template=self._BULK_USER_TEMPLATE, page_size=1000)
+
+    _BULK_USER_TEMPLATE = "(%s, %s, %s::varchar, %s, %s, %s, %s::varchar)"
+
+    async def bulk_upsert_users(self, users, fallback_names: Optional[dict] = None) -> int:
+        """Create or update many users (``models.user.User``) in one transaction; telegram_ids must be unique.
+
+        An empty ``name`` or ``default_project_id`` keeps an existing user's stored
+        value. A new user without a name gets ``fallback_names[telegram_id]``
+        (or their employee_id).
+        """
+        fallback_names = fallback_names or {}
+        rows = [
+            (u.telegram_id, u.employee_id, u.name or None, fallback_names.get(u.telegram_id) or u.employee_id,
+             u.redmine_url, u.api_key, u.default_project_id or None)
+            for u in users
+        ]
+        if not rows:
+            return 0
+        await self._run(self._bulk_upsert_users, rows)
+        for row in rows:
+            self.user_cache.invalidate(row[0])
+        return len(rows)
+
+    async def get_user_by_telegram_id(self, telegram_id: str):
+        user = self.user_cache.get(telegram_id)
+        if user is not None:
+            return user
+        user = await self._run(self._fetchone, """
+            SELECT * FROM users WHERE telegram_id = %s
+        """, (telegram_id,))
+        if user is not None:
+            self.user_cache.set(telegram_id, user)
+        return user
+
+    async def get_user_by_employee_id(self, employee_id: str):
+        return await self._run(self._fetchone, """
+            SELECT * FROM users WHERE employee_id = %s
+        """, (employee_id,))
+
+    async def update_user(self, telegram_id: str, **kwargs):
         if not kwargs:
             return
-        
+
         set_clause = ', '.join([f"{k} = %s" for k in kwargs.keys()])
-        values = list(kwargs.values()) + [telegram_id]
-        
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(f"""
-                    UPDATE users 
-                    SET {set_clause}, updated_at = CURRENT_TIMESTAMP
-                    WHERE telegram_id = %s
-                """, values)
-    
-    def delete_user(self, telegram_id: str):
-        with self.get_connection() as conn:
+        values = tuple(kwargs.values()) + (telegram_id,)
+
+        await self._run(self._execute, f"""
+            UPDATE users
+            SET {set_clause}, updated_at = CURRENT_TIMESTAMP
+            WHERE telegram_id = %s
+        """, values)
+        self.user_cache.invalidate(telegram_id)
+
+    async def delete_user(self, telegram_id: str):
+        await self._run(self._execute, """
+            DELETE FROM users WHERE telegram_id = %s
+        """, (telegram_id,))
+        self.user_cache.invalidate(telegram_id)
+
+    # ------------------ Timesheet aggregates ------------------
+    # Rows are (spent_on, activity_id, activity_name, issue_id, hours, entries), unique per key.
+
+    def _write_timesheet(self, deadline: float, telegram_id: str, rows: List[tuple],
+                         replace_range: Optional[Tuple[str, str]], as_of: datetime) -> bool:
+        with self.get_connection(deadline) as conn:
             with conn.cursor() as cur:
-                cur.execute("""
-                    DELETE FROM users WHERE telegram_id = %s
-                """, (telegram_id,))
\ No newline at end of file
+                if not replace_range:
+                    # Hours submitted at ``as_of`` are already in a snapshot taken after it.
+                    cur.execute(
+                        "SELECT reconciled_at FROM timesheet_sync WHERE telegram_id = %s FOR UPDATE", (telegram_id,)
+                    )
+                    row = cur.fetchone()
+                    if row and row[0] is not None and row[0] >= as_of:
+                        return False
+                if replace_range:
+                    cur.execute(
+                        "DELETE FROM timesheet_aggregates WHERE telegram_id = %s AND spent_on BETWEEN %s AND %s",
+                        (telegram_id, *replace_range),
+                    )
+                if rows:
+                    execute_values(cur, """
+                        INSERT INTO timesheet_aggregates
+                        (telegram_id, spent_on, activity_id, activity_name, issue_id, hours, entries)
+                        VALUES %s
+                        ON CONFLICT (telegram_id, spent_on, activity_id, issue_id)
+                        DO UPDATE SET
+                            hours = timesheet_aggregates.hours + EXCLUDED.hours,
+                            entries = timesheet_aggregates.entries + EXCLUDED.entries,
+                            activity_name = COALESCE(EXCLUDED.activity_name, timesheet_aggregates.activity_name),
+                            updated_at = CURRENT_TIMESTAMP
+                    """, [(telegram_id, *row) for row in rows])
+                if replace_range:
+                    cur.execute("""
+                        INSERT INTO timesheet_sync (telegram_id, reconciled_at) VALUES (%s, %s)
+                        ON CONFLICT (telegram_id) DO UPDATE SET reconciled_at = EXCLUDED.reconciled_at
+                    """, (telegram_id, as_of))
+                else:
+                    # Users who log through the bot are picked up by the reconcile job.
+                    cur.execute(
+                        "INSERT INTO timesheet_sync (telegram_id) VALUES (%s) ON CONFLICT (telegram_id) DO NOTHING",
+                        (telegram_id,),
+                    )
+                return True
+
+    async def add_timesheet_hours(self, telegram_id: str, rows: List[tuple], submitted_at: datetime) -> bool:
+        """Add hours of entries submitted at ``submitted_at`` (timezone-aware) to the user's aggregates.
+
+        Returns False without writing when a reconcile snapshot was taken after
+        ``submitted_at``, since it may already contain those entries.
+        """
+        return await self._run(self._write_timesheet, telegram_id, rows, None, submitted_at)
+
+    async def replace_timesheet(self, telegram_id: str, start: str, end: str, rows: List[tuple],
+                                snapshot_at: datetime):
+        """Replace the user's aggregates between ``start`` and ``end`` (inclusive) in one transaction.
+
+        ``snapshot_at`` is when reading ``rows`` from Redmine started; it is stored as reconciled_at.
+        """
+        await self._run(self._write_timesheet, telegram_id, rows, (start, end), snapshot_at)
+
+    async def get_timesheet(self, telegram_id: str, start: str, end: str):
+        return await self._run(self._fetchall, """
+            SELECT spent_on, activity_id, activity_name, issue_id, hours, entries
+            FROM timesheet_aggregates
+            WHERE telegram_id = %s AND spent_on BETWEEN %s AND %s
+            ORDER BY spent_on
+        """, (telegram_id, start, end))
+
+    async def get_timesheet_reconciled_at(self, telegram_id: str):
+        row = await self._run(self._fetchone, """
+            SELECT reconciled_at FROM timesheet_sync WHERE telegram_id = %s
+        """, (telegram_id,))
+        return row["reconciled_at"] if row else None
+
+    async def get_timesheet_users_due(self, older_than: float, limit: int) -> List[str]:
+        rows = await self._run(self._fetchall, """
+            SELECT telegram_id FROM timesheet_sync
+            WHERE reconciled_at IS NULL OR reconciled_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            ORDER BY reconciled_at NULLS FIRST
+            LIMIT %s
+        """, (older_than, limit))
+        return [row["telegram_id"] for row in rows]
@@ -2,24 +2,68 @@ import os
 import logging
 import json
 from datetime import date, datetime
+from typing import Iterator, List
 import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
-class GeminiService:
+
+class JsonObjectStream:
+    """Incrementally pulls complete top-level JSON objects out of streamed text.
+
+    Only braces outside string literals are counted, so markdown fences, the
+    enclosing array and commas between objects are skipped without buffering.
+    """
+
     def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[dict]:
+        objects = []
+        for char in text:
+            if self._depth:
+                self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth:
+                self._in_string = True
+            elif char == "{":
+                if not self._depth:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    objects.append(json.loads("".join(self._buffer)))
+                    self._buffer = []
+        return objects
+
+
+class GeminiService:
+    def __init__(self, model=None):
+        if model is not None:
+            # Injected model (e.g. a fake in benchmarks); no API key needed.
+            self.model = model
+            return
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not set in environment variables.")
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel("gemini-2.5-flash")
 
-    def parse_time_entries(self, natural_text: str, activities: list):
-
+    def _time_entries_prompt(self, natural_text: str, activities: list) -> str:
         today_str = date.today().strftime("%Y-%m-%d") # Use your server's date/timezone
         activity_names = [a["name"] for a in activities]
         logger.debug(natural_text)
-        prompt = f"""
+        return f"""
             Parse the following work log into structured time entries. Use today's date if no date is mentioned.
 
             Work Log:
@@ -46,6 +90,29 @@ class GeminiService:
             - Issue ID is mandatory; return a placeholder like 'Unknown' if not mentioned
             - Return valid JSON only, no extra text
             """
+
+    @staticmethod
+    def _normalize_entry(entry) -> dict:
+        required = ["date", "hours", "activity", "comments", "issue_id"]
+        if not isinstance(entry, dict) or not all(k in entry for k in required):
+            raise ValueError(f"Missing required fields in entry: {entry}")
+
+        if not entry["issue_id"]:
+            entry["issue_id"] = "Unknown"
+
+        entry_date = entry.get("date")
+        if entry_date:
+            try:
+                parsed_date = datetime.strptime(entry_date, "%Y-%m-%d")
+                entry["date"] = parsed_date.strftime("%Y-%m-%d")
+            except ValueError:
+                entry["date"] = date.today().strftime("%Y-%m-%d")
+        else:
+            entry["date"] = date.today().strftime("%Y-%m-%d")
+        return entry
+
+    def parse_time_entries(self, natural_text: str, activities: list):
+        prompt = self._time_entries_prompt(natural_text, activities)
         try:
             response = self.model.generate_content(prompt)
             text = response.text.strip()
@@ -60,30 +127,27 @@ class GeminiService:
             if not isinstance(entries, list):
                 raise ValueError("Gemini response is not a list")
 
-            for entry in entries:
-                required = ["date", "hours", "activity", "comments", "issue_id"]
-                if not all(k in entry for k in required):
-                    raise ValueError(f"Missing required fields in entry: {entry}")
-
-                if not entry["issue_id"]:
-                    entry["issue_id"] = "Unknown"
-
-                entry_date = entry.get("date")
-                if entry_date:
-                    try:
-                        parsed_date = datetime.strptime(entry_date, "%Y-%m-%d")
-                        entry["date"] = parsed_date.strftime("%Y-%m-%d")
-                    except ValueError:
-                        entry["date"] = date.today().strftime("%Y-%m-%d")
-                else:
-                    entry["date"] = date.today().strftime("%Y-%m-%d")
-
-            return entries
+            return [self._normalize_entry(entry) for entry in entries]
 
         except Exception as e:
             logger.error(f"Gemini parsing error: {e}")
             raise ValueError(f"Could not parse work log: {str(e)}")
 
+    def stream_time_entries(self, natural_text: str, activities: list) -> Iterator[dict]:
+        """Like parse_time_entries, but yields each entry as soon as its JSON object is complete."""
+        prompt = self._time_entries_prompt(natural_text, activities)
+        extractor = JsonObjectStream()
+        count = 0
+        try:
+            for chunk in self.model.generate_content(prompt, stream=True):
+                for entry in extractor.feed(chunk.text):
+                    count += 1
+                    yield self._normalize_entry(entry)
+        except Exception as e:
+            logger.error(f"Gemini streaming parse error: {e}")
+            raise ValueError(f"Could not parse work log: {str(e)}")
+        logger.info(f"Gemini streamed {count} entries")
+
     def summarize_work(self, time_entries: list):
         if not time_entries:
             return "No work entries found for the specified period."
@@ -116,3 +180,62 @@ class GeminiService:
         except Exception as e:
             logger.error(f"Gemini summary error: {e}")
             return "Could not generate summary. Please check your time entries manually."
+
+    def summarize_timesheet(self, summary: dict) -> str:
+        """Write a short narrative over precomputed timesheet aggregates (see TimesheetService.summary)."""
+        days = ", ".join(f"{day}: {hours}h" for day, hours in summary["days"].items())
+        activities = ", ".join(f"{name}: {hours}h" for name, hours in summary["activities"][:10])
+        issues = ", ".join(f"#{issue}: {hours}h" for issue, hours in summary["issues"][:10])
+
+        prompt = f"""
+            Write a concise professional summary of this timesheet from {summary['from']} to {summary['to']}.
+
+            Total: {summary['total_hours']} hours in {summary['entries']} entries
+            Hours per day: {days}
+            Hours per activity: {activities}
+            Top issues: {issues}
+
+            Point out the main focus areas and anything notable (e.g. uneven days).
+            Do not repeat every number. Keep it under 100 words.
+            """
+
+        try:
+            response = self.model.generate_content(prompt)
+            return response.text.strip()
+        except Exception as e:
+            logger.error(f"Gemini timesheet summary error: {e}")
+            return "Could not generate summary."
+
+    def classify_intents(self, messages: List[str], intents: List[str]) -> List[str]:
+        """Label each chat message with one of ``intents``; one call covers the whole batch."""
+        numbered = "\n".join(f"{i + 1}. {json.dumps(message)}" for i, message in enumerate(messages))
+        prompt = f"""
+            Classify each message sent to a Redmine time tracking bot into exactly one intent.
+
+            Intents: {", ".join(intents)}
+            - log_time: the user wants to log hours or describes work they did
+            - my_issues: list issues/tasks assigned to the user
+            - create_issue: create a new issue
+            - projects: list projects
+            - timesheet: see how many hours were logged in a period
+            - help, menu, setup: bot usage, the main menu, account/API key setup
+            - unknown: anything else
+
+            Messages:
+            {numbered}
+
+            Return ONLY a JSON array of {len(messages)} intent strings, in message order.
+            """
+
+        try:
+            response = self.model.generate_content(prompt)
+            text = response.text.strip()
+            if "```" in text:
+                text = text.split("```")[1].removeprefix("json").strip()
+            labels = json.loads(text)
+            if not isinstance(labels, list):
+                raise ValueError("Gemini response is not a list")
+            return [str(label).strip().lower() for label in labels]
+        except Exception as e:
+            logger.error(f"Gemini intent classification error: {e}")
+            raise ValueError(f"Could not classify messages: {str(e)}")
@@ -0,0 +1,232 @@
+import os
+import re
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from services.cache import TTLCache
+from services.llm_executor import llm_executor
+from services.parse_cache import normalize_work_text
+from services.worklog_parser import DURATION_RE, ISSUE_RE
+from utils.helpers import parse_duration
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "unknown"
+
+# intent -> (pattern, weight). Multi-word phrases carry more weight than single keywords.
+INTENT_PATTERNS: Dict[str, List[Tuple[str, float]]] = {
+    "log_time": [
+        (r"log(?:ged|ging)? (?:my )?(?:time|hours|work)", 2.0),
+        (r"(?:add|book|record|enter|fill) (?:my )?(?:time|hours)", 2.0),
+        (r"time ?entry|time ?entries", 1.5),
+        (r"log(?:ged|ging)?|spent|worked|working on", 1.0),
+    ],
+    "my_issues": [
+        (r"(?:my|open|assigned) (?:open )?(?:issues|tasks|tickets|bugs)", 2.0),
+        (r"assigned to me|what(?:'s| is) on my plate|to ?do list", 2.0),
+        (r"issues?|tasks?|tickets?|bugs?", 0.7),
+    ],
+    "create_issue": [
+        (r"(?:create|new|open|raise|file|report|add) (?:an? )?(?:new )?(?:issue|ticket|task|bug)", 2.5),
+    ],
+    "projects": [
+        (r"(?:my|list|all|show) projects?", 2.0),
+        (r"projects?", 1.0),
+    ],
+    "timesheet": [
+        (r"time ?sheet|how (?:many|much) (?:hours|time)|hours (?:this|last) (?:week|month)", 2.5),
+        (r"(?:this|last) (?:week|month)|weekly|monthly|summary|summari[sz]e|report", 0.8),
+    ],
+    "help": [
+        (r"help|what can you do|how do i|commands?", 1.2),
+    ],
+    "menu": [
+        (r"menu|main menu|options", 1.2),
+    ],
+    "setup": [
+        (r"set ?up|api key|configure|connect (?:my )?(?:account|redmine)|credentials", 1.5),
+    ],
+}
+INTENTS = list(INTENT_PATTERNS) + [UNKNOWN]
+
+# Timesheet period slot, keyed like timesheet_service.PERIODS.
+PERIOD_RE = re.compile(r"\b(this|last|past|previous)\s+(week|month)\b", re.IGNORECASE)
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    confidence: float
+    slots: Dict[str, object] = field(default_factory=dict)
+    source: str = "rules"
+
+
+def _compile() -> Tuple[re.Pattern, Dict[str, Tuple[str, float]]]:
+    alternatives, groups = [], {}
+    # Heavier (longer) phrases first, so they win over keywords starting at the same position.
+    ordered = sorted(
+        ((intent, pattern, weight) for intent, patterns in INTENT_PATTERNS.items() for pattern, weight in patterns),
+        key=lambda item: -item[2],
+    )
+    for number, (intent, pattern, weight) in enumerate(ordered):
+        name = f"g{number}"
+        groups[name] = (intent, weight)
+        alternatives.append(f"(?P<{name}>{pattern})")
+    return re.compile(r"\b(?:" + "|".join(alternatives) + r")\b", re.IGNORECASE), groups
+
+
+class IntentRouter:
+    """Routes free-text messages to an intent with a single combined regex pass.
+
+    Every intent phrase is one named alternative of one compiled pattern, so a
+    message is scanned once no matter how many intents exist. Durations and
+    issue references are extracted as slots and count towards ``log_time``.
+    When the best intent is not clearly ahead (confidence below
+    ``min_confidence``), the message is classified by ``classifier`` (set to
+    Gemini by the adapter). Those calls are cached by normalized text and
+    batched: messages arriving within ``batch_window`` share one LLM call.
+    Batches queue in the LLM executor under their own name, with room for
+    ``max_queued_batches`` of them instead of the per-user limit.
+    """
+
+    EXECUTOR_USER = "intent-router"
+
+    def __init__(self, min_confidence: float = 0.5, llm_fallback: bool = True, batch_window: float = 0.05,
+                 max_batch: int = 16, max_queued_batches: int = 16, cache_size: int = 2048,
+                 cache_ttl: float = 86400.0):
+        self.min_confidence = min_confidence
+        self.llm_fallback = llm_fallback
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        llm_executor.queue_limits[self.EXECUTOR_USER] = max_queued_batches
+        self.classifier: Optional[Callable[[List[str], List[str]], List[str]]] = None
+        self._pattern, self._groups = _compile()
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._batch: List[Tuple[str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.sources = {"rules": 0, "cache": 0, "llm": 0, "low_confidence": 0}
+        self.llm_batches = 0
+        self.llm_errors = 0
+        self._rule_times = deque(maxlen=1000)
+
+    def match(self, text: str) -> IntentMatch:
+        """Rule-based match only; never calls the LLM."""
+        started = time.perf_counter()
+        scores: Dict[str, float] = {}
+        for m in self._pattern.finditer(text):
+            intent, weight = self._groups[m.lastgroup]
+            scores[intent] = scores.get(intent, 0.0) + weight
+
+        slots: Dict[str, object] = {}
+        durations = DURATION_RE.findall(text)
+        if durations:
+            slots["hours"] = round(sum(parse_duration(d) for d in durations), 2)
+            scores["log_time"] = scores.get("log_time", 0.0) + 1.5
+        issues = ISSUE_RE.findall(text)
+        if issues:
+            slots["issue_ids"] = issues
+        period = PERIOD_RE.search(text)
+        if period:
+            slots["period"] = ("" if period.group(1).lower() == "this" else "last") + period.group(2).lower()
+
+        if not scores:
+            result = IntentMatch(UNKNOWN, 0.0, slots)
+        else:
+            ranked = sorted(scores.items(), key=lambda item: -item[1])
+            best, best_score = ranked[0]
+            second = ranked[1][1] if len(ranked) > 1 else 0.0
+            # Strong evidence and a clear margin over the runner-up are both needed.
+            confidence = min(1.0, best_score / 1.5) * (0.5 + 0.5 * (best_score - second) / best_score)
+            result = IntentMatch(best, round(confidence, 3), slots)
+        self._rule_times.append(time.perf_counter() - started)
+        return result
+
+    async def route(self, text: str) -> IntentMatch:
+        result = self.match(text)
+        if result.confidence >= self.min_confidence or not self.llm_fallback or self.classifier is None:
+            self.sources["rules"] += 1
+            return result
+
+        self.sources["low_confidence"] += 1
+        key = normalize_work_text(text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.sources["cache"] += 1
+            return IntentMatch(cached, 1.0, result.slots, "cache")
+        try:
+            intent = await self._classify(text)
+        except Exception as e:
+            self.llm_errors += 1
+            logger.warning(f"Intent classification fell back to rules: {e}")
+            return result
+        self._cache.set(key, intent)
+        self.sources["llm"] += 1
+        return IntentMatch(intent, 1.0, result.slots, "llm")
+
+    async def _classify(self, text: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((text, future))
+        try:
+            if len(self._batch) >= self.max_batch:
+                await self._flush()
+            elif self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_later())
+            return await future
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.batch_window)
+        except asyncio.CancelledError:
+            batch, self._batch = self._batch, []
+            self._fail(batch, RuntimeError("intent batch was cancelled"))
+            raise
+        await self._flush()
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        self.llm_batches += 1
+        try:
+            labels = await llm_executor.run(self.EXECUTOR_USER, self.classifier, [text for text, _ in batch], INTENTS)
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        except BaseException:
+            # The request flushing inline was cancelled; the others in the batch fall back to rules.
+            self._fail(batch, RuntimeError("intent batch was cancelled"))
+            raise
+        for (_, future), label in zip(batch, list(labels) + [UNKNOWN] * len(batch)):
+            if not future.done():
+                future.set_result(label if label in INTENTS else UNKNOWN)
+
+    def stats(self) -> dict:
+        times = sorted(self._rule_times)
+        return {
+            **self.sources,
+            "llm_batches": self.llm_batches,
+            "llm_errors": self.llm_errors,
+            "rules_us_p50": round(times[len(times) // 2] * 1e6, 1) if times else 0.0,
+            "rules_us_p95": round(times[int(len(times) * 0.95)] * 1e6, 1) if times else 0.0,
+        }
+
+
+intent_router = IntentRouter(
+    min_confidence=float(os.getenv("INTENT_MIN_CONFIDENCE", "0.5")),
+    llm_fallback=os.getenv("INTENT_LLM_FALLBACK", "true").lower() == "true",
+    batch_window=float(os.getenv("INTENT_BATCH_WINDOW", "0.05")),
+    max_queued_batches=int(os.getenv("INTENT_MAX_QUEUED_BATCHES", "16")),
+)
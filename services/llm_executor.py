@@ -0,0 +1,207 @@
+import os
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Set
+
+logger = logging.getLogger(__name__)
+
+
+class LLMQueueTimeout(Exception):
+    """The request waited in the queue longer than the configured timeout."""
+
+
+class LLMQueueFull(Exception):
+    """The user already has the maximum number of LLM requests queued."""
+
+
+class LLMCancelled(Exception):
+    """The request was cancelled, e.g. because the user sent /cancel."""
+
+
+class _Job:
+    __slots__ = ("user_id", "call", "enqueued_at", "started", "result")
+
+    def __init__(self, user_id: str, call: Callable, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.call = call
+        self.enqueued_at = time.monotonic()
+        self.started = loop.create_future()
+        self.result = loop.create_future()
+
+
+class LLMExecutor:
+    """Runs blocking LLM SDK calls off the event loop with bounded concurrency.
+
+    At most ``max_in_flight`` calls run at once. Waiting work is kept in one
+    queue per user and dispatched round-robin, so a user pasting many logs
+    cannot starve everybody else. Each user may have ``max_queued_per_user``
+    requests waiting; ``queue_limits`` overrides that for shared callers such
+    as the intent router, which queues batches for many users at once.
+    """
+
+    def __init__(self, max_in_flight: int = 4, queue_timeout: float = 60.0,
+                 max_queued_per_user: int = 2):
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.max_queued_per_user = max_queued_per_user
+        self.queue_limits: Dict[str, int] = {}
+
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+        self._queues: "OrderedDict[str, Deque[_Job]]" = OrderedDict()
+        self._running: Dict[str, Set[_Job]] = {}
+        self._in_flight = 0
+
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    async def run(self, user_id: str, fn: Callable, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` on behalf of ``user_id`` and await its result."""
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(user_id)
+        if queue is not None and len(queue) >= self.queue_limits.get(user_id, self.max_queued_per_user):
+            self.rejected += 1
+            raise LLMQueueFull("Too many AI requests pending. Please wait for the previous one to finish.")
+
+        job = _Job(user_id, functools.partial(fn, *args, **kwargs), loop)
+        self._queues.setdefault(user_id, deque()).append(job)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(job.started), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove_queued(job)
+            self.timed_out += 1
+            raise LLMQueueTimeout("The AI service is busy right now. Please try again in a moment.")
+        except asyncio.CancelledError:
+            self._remove_queued(job)
+            raise
+        return await job.result
+
+    async def stream(self, user_id: str, fn: Callable[..., Iterator], *args, **kwargs) -> AsyncIterator:
+        """Like ``run`` for a blocking generator: yield its items as the worker thread produces them."""
+        loop = asyncio.get_running_loop()
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def pump():
+            for item in fn(*args, **kwargs):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(items.put_nowait, item)
+
+        job = asyncio.ensure_future(self.run(user_id, pump))
+        try:
+            while True:
+                getter = asyncio.ensure_future(items.get())
+                done, _ = await asyncio.wait({getter, job}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                # Items are queued before the job completes, so whatever is left belongs to this run.
+                while not items.empty():
+                    yield items.get_nowait()
+                job.result()
+                return
+        finally:
+            # A consumer that stops early must not leave the worker thread generating.
+            stop.set()
+            if not job.done():
+                job.cancel()
+
+    def cancel_user(self, user_id: str) -> int:
+        """Cancel every queued and running request of ``user_id``.
+
+        Running SDK calls cannot be interrupted; their results are discarded.
+        """
+        count = 0
+        for job in self._queues.pop(user_id, ()):
+            if not job.started.done():
+                job.started.set_exception(LLMCancelled())
+                count += 1
+        for job in self._running.get(user_id, ()):
+            if not job.result.done():
+                job.result.set_exception(LLMCancelled())
+                count += 1
+        self.cancelled += count
+        return count
+
+    def _remove_queued(self, job: _Job):
+        queue = self._queues.get(job.user_id)
+        if queue is None or job not in queue:
+            return
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.user_id]
+
+    def _dispatch(self):
+        while self._in_flight < self.max_in_flight and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if job.started.done():
+                continue
+            self._start(job)
+
+    def _start(self, job: _Job):
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        self._running.setdefault(job.user_id, set()).add(job)
+        self._wait_times.append(time.monotonic() - job.enqueued_at)
+        job.started.set_result(None)
+        future = loop.run_in_executor(self._pool, job.call)
+        future.add_done_callback(lambda f: self._finish(job, f))
+
+    def _finish(self, job: _Job, future: asyncio.Future):
+        self._in_flight -= 1
+        running = self._running.get(job.user_id)
+        if running is not None:
+            running.discard(job)
+            if not running:
+                del self._running[job.user_id]
+
+        if future.exception() is not None:
+            self.failed += 1
+            if not job.result.done():
+                job.result.set_exception(future.exception())
+        else:
+            self.completed += 1
+            if not job.result.done():
+                job.result.set_result(future.result())
+        self._dispatch()
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": sum(len(q) for q in self._queues.values()),
+            "queued_users": len(self._queues),
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "rejected": self.rejected,
+        }
+
+
+llm_executor = LLMExecutor(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "4")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "60")),
+    max_queued_per_user=int(os.getenv("LLM_MAX_QUEUED_PER_USER", "2")),
+)
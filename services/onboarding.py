@@ -0,0 +1,185 @@
+import os
+import io
+import csv
+import json
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+import httpx
+from models.user import User
+from services.database_service import DatabaseService
+from services.redmine_service import RedmineService
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("telegram_id", "employee_id", "redmine_url", "api_key")
+REPORT_FIELDS = ("line", "telegram_id", "employee_id", "status", "detail")
+
+# Row outcomes, in the order they are decided.
+INVALID_ROW = "invalid_row"
+DUPLICATE = "duplicate"
+INVALID_KEY = "invalid_key"
+UNREACHABLE = "unreachable"
+SAVED = "saved"
+SAVE_FAILED = "save_failed"
+VALID = "valid"  # validated but not saved (dry run)
+
+
+@dataclass
+class RowResult:
+    line: int
+    telegram_id: str
+    employee_id: str
+    status: str
+    detail: str = ""
+
+
+def read_rows(data: str, fmt: Optional[str] = None) -> List[Tuple[int, dict]]:
+    """Parse a CSV (with a header row) or JSONL import into ``(line, row)`` pairs.
+
+    ``fmt`` is "csv" or "jsonl"; when omitted it is guessed from the first
+    non-blank character.
+    """
+    if fmt is None:
+        fmt = "jsonl" if data.lstrip().startswith("{") else "csv"
+    if fmt == "jsonl":
+        rows = []
+        for line, text in enumerate(data.splitlines(), 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                row = {"_error": f"invalid JSON: {e}"}
+            rows.append((line, row if isinstance(row, dict) else {"_error": "not a JSON object"}))
+        return rows
+    reader = csv.DictReader(io.StringIO(data))
+    # Line 1 is the header.
+    return [(line, row) for line, row in enumerate(reader, 2)]
+
+
+def write_report(results: Iterable[RowResult]) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(REPORT_FIELDS)
+    for result in results:
+        writer.writerow([getattr(result, field) for field in REPORT_FIELDS])
+    return out.getvalue()
+
+
+class BulkOnboarding:
+    """Imports many users at once instead of each running the /setup wizard.
+
+    Rows are checked locally, then every API key is validated against Redmine
+    with ``get_current_user``, at most ``concurrency`` at a time. Valid rows are
+    written with a single batched upsert; every row gets a result line. An
+    existing user keeps their name and default project unless the row sets them.
+    """
+
+    def __init__(self, concurrency: int = 20, timeout: float = 15.0, client: Optional[httpx.AsyncClient] = None):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.db = DatabaseService()
+        # Injected in benchmarks; by default each Redmine host uses its shared client.
+        self._client = client
+
+    @staticmethod
+    def _check_row(row: dict) -> Optional[str]:
+        if "_error" in row:
+            return row["_error"]
+        missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or "").strip()]
+        if missing:
+            return f"missing {', '.join(missing)}"
+        if not str(row["telegram_id"]).strip().isdigit():
+            return "telegram_id must be numeric"
+        if not str(row["redmine_url"]).strip().startswith("http"):
+            return "redmine_url must start with http:// or https://"
+        return None
+
+    async def _validate_key(self, user: User) -> Tuple[str, str, str]:
+        """Return ``(status, detail, redmine_name)`` for one row; never raises."""
+        redmine = RedmineService(user.redmine_url, user.api_key, client=self._client)
+        try:
+            info = await asyncio.wait_for(redmine.get_current_user(), self.timeout)
+            redmine_user = info.get("user", {})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (401, 403):
+                return INVALID_KEY, f"Redmine rejected the API key ({e.response.status_code})", ""
+            return UNREACHABLE, f"Redmine answered {e.response.status_code}", ""
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            return UNREACHABLE, f"could not reach Redmine: {e.__class__.__name__}", ""
+        except Exception as e:
+            # e.g. an SSO or login page answering 200 with HTML instead of JSON
+            return UNREACHABLE, f"unexpected response from Redmine: {e.__class__.__name__}", ""
+        name = " ".join(part for part in (redmine_user.get("firstname"), redmine_user.get("lastname")) if part)
+        return VALID, redmine_user.get("login", ""), name
+
+    async def run(self, rows: List[Tuple[int, dict]], dry_run: bool = False) -> List[RowResult]:
+        """Validate and import ``rows`` (from ``read_rows``); results come back in input order."""
+        started = time.perf_counter()
+        results: List[Optional[RowResult]] = [None] * len(rows)
+        users: List[Optional[User]] = [None] * len(rows)
+
+        # The last row for a telegram_id wins, as it would with repeated /setup runs.
+        last_index = {}
+        for index, (line, row) in enumerate(rows):
+            if self._check_row(row) is None:
+                last_index[str(row["telegram_id"]).strip()] = index
+
+        for index, (line, row) in enumerate(rows):
+            telegram_id = str(row.get("telegram_id") or "").strip()
+            employee_id = str(row.get("employee_id") or "").strip()
+            error = self._check_row(row)
+            if error:
+                results[index] = RowResult(line, telegram_id, employee_id, INVALID_ROW, error)
+            elif last_index[telegram_id] != index:
+                results[index] = RowResult(line, telegram_id, employee_id, DUPLICATE,
+                                           f"superseded by line {rows[last_index[telegram_id]][0]}")
+            else:
+                users[index] = User(
+                    telegram_id=telegram_id,
+                    employee_id=employee_id,
+                    name=str(row.get("name") or "").strip(),
+                    redmine_url=str(row["redmine_url"]).strip().rstrip("/"),
+                    api_key=str(row["api_key"]).strip(),
+                    default_project_id=str(row.get("default_project_id") or "").strip() or None,
+                )
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        redmine_names = {}
+
+        async def validate(index: int):
+            user = users[index]
+            async with semaphore:
+                status, detail, redmine_names[user.telegram_id] = await self._validate_key(user)
+            results[index] = RowResult(rows[index][0], user.telegram_id, user.employee_id, status, detail)
+            if status != VALID:
+                users[index] = None
+
+        await asyncio.gather(*(validate(i) for i, user in enumerate(users) if user is not None))
+        valid = [(i, user) for i, user in enumerate(users) if user is not None]
+
+        if valid and not dry_run:
+            try:
+                await self.db.bulk_upsert_users([user for _, user in valid], fallback_names=redmine_names)
+                status, detail = SAVED, ""
+            except Exception as e:
+                logger.error(f"Bulk user upsert failed: {e}")
+                status, detail = SAVE_FAILED, str(e)
+            for index, _ in valid:
+                results[index].status = status
+                results[index].detail = detail or results[index].detail
+
+        logger.info(
+            f"Bulk onboarding: {len(rows)} rows, {len(valid)} valid, "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+        return results
+
+
+bulk_onboarding = BulkOnboarding(
+    concurrency=int(os.getenv("ONBOARDING_CONCURRENCY", "20")),
+    timeout=float(os.getenv("ONBOARDING_VALIDATE_TIMEOUT", "15")),
+)
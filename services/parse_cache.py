@@ -0,0 +1,137 @@
+import os
+import re
+import asyncio
+import json
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from services.cache import TTLCache
+from services.worklog_parser import DAY_MONTH_RE, ISO_DATE_RE, MONTH_DAY_RE, WEEKDAY_RE
+
+logger = logging.getLogger(__name__)
+
+SLASH_DATE_RE = re.compile(r"\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b")
+# "last week", "this month": offsets depend on more than the weekday, so key on the full date.
+PERIOD_RE = re.compile(r"\b(?:week|month|year)\b")
+
+
+def normalize_work_text(text: str) -> str:
+    lines = [re.sub(r"\s+", " ", line).strip(" .,;").lower() for line in text.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+class ParseCache:
+    """Cache of LLM work log parses keyed on normalized text, activities and date anchor.
+
+    Logs that only use relative dates ("yesterday", "2 days ago", or no date at
+    all) are stored as day offsets and re-anchored to the caller's date on a hit,
+    so yesterday's standup text still maps to the right days today. Logs naming
+    a weekday are additionally keyed on today's weekday, and logs with absolute
+    dates on the full reference date. An optional SQLite file keeps entries
+    across restarts; it is read and written on a worker thread. Empty results
+    are never stored, so a refusal or a cut-off stream is retried next time.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 7 * 86400, path: Optional[str] = None):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache "
+                "(key TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        self.disk_hits = 0
+
+    @staticmethod
+    def _anchor(text: str, today: date) -> Optional[str]:
+        """Return the date component of the key, or None for purely relative logs."""
+        if ISO_DATE_RE.search(text) or DAY_MONTH_RE.search(text) or MONTH_DAY_RE.search(text) \
+                or SLASH_DATE_RE.search(text) or PERIOD_RE.search(text):
+            return today.isoformat()
+        if WEEKDAY_RE.search(text):
+            return f"weekday:{today.weekday()}"
+        return None
+
+    @staticmethod
+    def _is_relative(anchor: Optional[str]) -> bool:
+        # Weekday logs repeat the same offsets on the same weekday, so they re-anchor too.
+        return anchor is None or anchor.startswith("weekday:")
+
+    def _key(self, text: str, activities: list, today: date) -> tuple:
+        normalized = normalize_work_text(text)
+        anchor = self._anchor(normalized, today)
+        raw = json.dumps([normalized, sorted(a["name"] for a in activities), anchor])
+        return hashlib.sha256(raw.encode()).hexdigest(), anchor
+
+    async def get(self, text: str, activities: list, today: Optional[date] = None) -> Optional[List[dict]]:
+        today = today or date.today()
+        key, anchor = self._key(text, activities, today)
+        payload = self._memory.get(key)
+        if payload is None and self._db is not None:
+            payload = await asyncio.to_thread(self._read_disk, key)
+            if payload is not None:
+                self.disk_hits += 1
+                self._memory.set(key, payload)
+        if payload is None:
+            return None
+
+        entries = json.loads(payload)
+        if self._is_relative(anchor):
+            for entry in entries:
+                entry["date"] = (today + timedelta(days=entry.pop("day_offset"))).strftime("%Y-%m-%d")
+        return entries
+
+    async def set(self, text: str, activities: list, entries: List[dict], today: Optional[date] = None):
+        if not entries:
+            return
+        today = today or date.today()
+        key, anchor = self._key(text, activities, today)
+        stored = [dict(entry) for entry in entries]
+        if self._is_relative(anchor):
+            for entry in stored:
+                entry_date = datetime.strptime(entry.pop("date"), "%Y-%m-%d").date()
+                entry["day_offset"] = (entry_date - today).days
+        payload = json.dumps(stored)
+        self._memory.set(key, payload)
+        if self._db is not None:
+            await asyncio.to_thread(self._write_disk, key, payload)
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload FROM parse_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _write_disk(self, key: str, payload: str):
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, payload, expires_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time() + self.ttl),
+                )
+                self._db.execute("DELETE FROM parse_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not persist parse cache entry: {e}")
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["persistent"] = self._db is not None
+        return stats
+
+
+parse_cache = ParseCache(
+    maxsize=int(os.getenv("PARSE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("PARSE_CACHE_TTL", str(7 * 86400))),
+    path=os.getenv("PARSE_CACHE_PATH") or None,
+)
@@ -0,0 +1,162 @@
+import os
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from typing import Callable, Dict, Optional
+from telegram.ext import ContextTypes, Job
+from services.cache import TTLCache
+from services.database_service import DatabaseService
+from services.redmine_service import RedmineService, prefetching, redmine_registry
+from services.reference_data import REFERENCE_KINDS, reference_data
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Speculatively warms a user's issues, projects and reference data.
+
+    ``schedule`` is called when a user opens /menu or /logtime, since the next
+    tap nearly always needs one of them. The warm-up runs as a JobQueue job
+    after ``delay`` seconds and fills the Redmine HTTP cache with exactly the
+    requests the handlers make, so they are served from memory (or with a 304).
+
+    Each user has at most one pending or running prefetch and is not warmed
+    again within ``cooldown``; ``cancel`` drops both. Prefetches never wait:
+    they are skipped when ``max_concurrent`` are already running, when more
+    than ``per_minute`` have started in the last minute, or when ``busy()``
+    reports interactive load.
+    """
+
+    def __init__(self, enabled: bool = True, delay: float = 0.5, cooldown: float = 60.0,
+                 max_concurrent: int = 2, per_minute: int = 60, issue_limit: int = 100,
+                 project_limit: int = 20):
+        self.enabled = enabled
+        self.delay = delay
+        self.cooldown = cooldown
+        self.max_concurrent = max_concurrent
+        self.per_minute = per_minute
+        self.issue_limit = issue_limit
+        self.project_limit = project_limit
+        self.busy: Optional[Callable[[], bool]] = None
+        self.db = DatabaseService()
+
+        self._pending: Dict[str, Job] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._recent = TTLCache(maxsize=4096, ttl=cooldown)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+        self.scheduled = 0
+        self.deduped = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, context: ContextTypes.DEFAULT_TYPE, telegram_id: str):
+        """Queue a warm-up for ``telegram_id`` unless one is pending, running or recent."""
+        if not self.enabled or context.job_queue is None:
+            return
+        if telegram_id in self._pending or telegram_id in self._running or self._recent.get(telegram_id):
+            self.deduped += 1
+            return
+        self._pending[telegram_id] = context.job_queue.run_once(
+            self._run_job, when=self.delay, data=telegram_id, name=f"prefetch:{telegram_id}"
+        )
+        self.scheduled += 1
+
+    def cancel(self, telegram_id: str):
+        job = self._pending.pop(telegram_id, None)
+        task = self._running.get(telegram_id)
+        if job is not None:
+            job.schedule_removal()
+        if task is not None:
+            task.cancel()
+        if job is not None or task is not None:
+            self.cancelled += 1
+            self._recent.invalidate(telegram_id)
+
+    def _within_budget(self) -> bool:
+        if len(self._running) >= self.max_concurrent:
+            return False
+        if self.busy is not None and self.busy():
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_count = now, 0
+        if self._window_count >= self.per_minute:
+            return False
+        self._window_count += 1
+        return True
+
+    async def _run_job(self, context: ContextTypes.DEFAULT_TYPE):
+        telegram_id = context.job.data
+        self._pending.pop(telegram_id, None)
+        if not self._within_budget():
+            self.skipped += 1
+            return
+
+        self._recent.set(telegram_id, True)
+        task = asyncio.create_task(self.warm(telegram_id))
+        self._running[telegram_id] = task
+        try:
+            await task
+            self.completed += 1
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"Prefetch for {telegram_id} failed: {e}")
+        finally:
+            self._running.pop(telegram_id, None)
+
+    async def warm(self, telegram_id: str):
+        user = await self.db.get_user_by_telegram_id(telegram_id)
+        if not user:
+            return
+        redmine = redmine_registry.get(user["redmine_url"], user["api_key"])
+
+        token = prefetching.set(True)
+        try:
+            # Same requests as show_my_issues, show_projects and start_create_issue, so they hit the same cache keys.
+            await asyncio.gather(
+                redmine.get_issues(assigned_to_id="me", status_id="open", limit=self.issue_limit),
+                redmine.get_projects(limit=self.project_limit),
+                self._drain_projects(redmine),
+            )
+        finally:
+            prefetching.reset(token)
+        # Reference data has its own cache, so its responses are not counted as prefetch hits.
+        await asyncio.gather(*(reference_data.get(redmine, kind) for kind in REFERENCE_KINDS))
+
+    @staticmethod
+    async def _drain_projects(redmine: RedmineService):
+        async with aclosing(redmine.iter_projects()) as pages:
+            async for _ in pages:
+                pass
+
+    def stats(self) -> dict:
+        counters = RedmineService.cache_counters
+        return {
+            "scheduled": self.scheduled,
+            "deduped": self.deduped,
+            "skipped_budget": self.skipped,
+            "cancelled": self.cancelled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "running": len(self._running),
+            "prefetched_responses": counters["prefetched"],
+            "prefetch_hits": counters["prefetch_hits"],
+            "hit_ratio": round(counters["prefetch_hits"] / counters["prefetched"], 3) if counters["prefetched"] else 0.0,
+        }
+
+
+prefetcher = Prefetcher(
+    enabled=os.getenv("PREFETCH_ENABLED", "true").lower() == "true",
+    delay=float(os.getenv("PREFETCH_DELAY", "0.5")),
+    cooldown=float(os.getenv("PREFETCH_COOLDOWN", "60")),
+    max_concurrent=int(os.getenv("PREFETCH_MAX_CONCURRENT", "2")),
+    per_minute=int(os.getenv("PREFETCH_PER_MINUTE", "60")),
+)
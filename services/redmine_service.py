@@ -1,106 +1,334 @@
+import os
+import asyncio
+import copy
+import contextvars
 import logging
-from typing import Dict, List, Optional
-import requests
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
 import httpx
+from services.cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Set while the prefetcher warms caches, so responses it stores can be told apart
+# from ones users asked for and prefetch hits can be counted.
+prefetching: contextvars.ContextVar = contextvars.ContextVar("redmine_prefetching", default=False)
+
+# One long-lived client per Redmine host, shared by every user on that host so
+# keep-alive connections and TLS sessions survive between requests.
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("REDMINE_HTTP2", "false").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("REDMINE_HTTP2 is set but the 'h2' package is missing; falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("REDMINE_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("REDMINE_HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("REDMINE_HTTP_KEEPALIVE_EXPIRY", "30")),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv("REDMINE_HTTP_TIMEOUT", "30")),
+        connect=float(os.getenv("REDMINE_HTTP_CONNECT_TIMEOUT", "10")),
+        pool=float(os.getenv("REDMINE_HTTP_POOL_TIMEOUT", "10")),
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_enabled())
+
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    """Return the shared client for ``base_url``, creating it on first use."""
+    base_url = base_url.rstrip('/')
+    client = _clients.get(base_url)
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[base_url] = client
+    return client
+
+
+async def close_http_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+class _CachedResponse:
+    __slots__ = ("body", "etag", "fetched_at", "prefetched")
+
+    def __init__(self, body: dict, etag: Optional[str], prefetched: bool = False):
+        self.body = body
+        self.etag = etag
+        self.fetched_at = time.monotonic()
+        # True until a user request is served from this entry.
+        self.prefetched = prefetched
+
 
 class RedmineService:
-    def __init__(self, base_url: str, api_key: str):
+    # Redmine's default per-request cap for list endpoints.
+    MAX_PAGE_SIZE = 100
+
+    # GET responses younger than this are served from memory; older ones are
+    # revalidated with If-None-Match so an unchanged resource costs a 304.
+    CACHE_FRESH_TTL = float(os.getenv("REDMINE_CACHE_TTL", "30"))
+    CACHE_MAX_ENTRIES = int(os.getenv("REDMINE_CACHE_MAX_ENTRIES", "128"))
+    CACHE_RETENTION = float(os.getenv("REDMINE_CACHE_RETENTION", "3600"))
+    cache_counters = {"fresh_hits": 0, "revalidated": 0, "misses": 0, "invalidations": 0,
+                      "prefetched": 0, "prefetch_hits": 0}
+
+    def __init__(self, base_url: str, api_key: str, client: Optional[httpx.AsyncClient] = None):
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.headers = {
             'X-Redmine-API-Key': api_key,
             'Content-Type': 'application/json'
         }
+        self._client = client
+        # One cache per service; the registry keys services by (url, api_key), so this is per user.
+        self._response_cache = TTLCache(maxsize=self.CACHE_MAX_ENTRIES, ttl=self.CACHE_RETENTION)
 
-    def _make_request(self, method: str, endpoint: str, **kwargs):
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client(self.base_url)
+
+    async def _make_request(self, method: str, endpoint: str, cache: bool = True, **kwargs):
         url = f"{self.base_url}/{endpoint}"
+        cache_key = None
+        cached = None
+        headers = self.headers
+        if method == 'GET' and cache:
+            cache_key = (endpoint, tuple(sorted((kwargs.get('params') or {}).items())))
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                if time.monotonic() - cached.fetched_at < self.CACHE_FRESH_TTL:
+                    self.cache_counters["fresh_hits"] += 1
+                    self._track_prefetch(cached, warmed=False)
+                    return copy.deepcopy(cached.body)
+                if cached.etag:
+                    headers = {**self.headers, 'If-None-Match': cached.etag}
+
         try:
-            response = requests.request(method, url, headers=self.headers, timeout=30, **kwargs)
+            logger.debug(f"[Redmine] {method} {url}")
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            if response.status_code == 304 and cached is not None:
+                self.cache_counters["revalidated"] += 1
+                cached.fetched_at = time.monotonic()
+                self._track_prefetch(cached, warmed=True)
+                self._response_cache.set(cache_key, cached)
+                return copy.deepcopy(cached.body)
             response.raise_for_status()
-            if response.status_code == 204:
+            if response.status_code == 204 or not response.content:
                 return {'success': True}
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            body = response.json()
+        except httpx.HTTPError as e:
             logger.error(f"Redmine API error: {e}")
             raise
 
+        if cache_key is not None:
+            self.cache_counters["misses"] += 1
+            entry = _CachedResponse(copy.deepcopy(body), response.headers.get('ETag'))
+            self._track_prefetch(entry, warmed=True)
+            self._response_cache.set(cache_key, entry)
+        return body
+
+    def _track_prefetch(self, entry: _CachedResponse, warmed: bool):
+        """Count entries warmed by the prefetcher and the first user request each one serves."""
+        if prefetching.get():
+            if warmed and not entry.prefetched:
+                entry.prefetched = True
+                self.cache_counters["prefetched"] += 1
+        elif entry.prefetched:
+            entry.prefetched = False
+            self.cache_counters["prefetch_hits"] += 1
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        counters = dict(cls.cache_counters)
+        lookups = counters["fresh_hits"] + counters["revalidated"] + counters["misses"]
+        counters["hit_rate"] = round((counters["fresh_hits"] + counters["revalidated"]) / lookups, 3) if lookups else 0.0
+        return counters
+
+    def invalidate_cache(self, *prefixes: str):
+        """Forget cached GET responses for endpoints starting with any of ``prefixes``."""
+        dropped = self._response_cache.invalidate_matching(lambda key: key[0].startswith(prefixes))
+        self.cache_counters["invalidations"] += dropped
+
+    async def _paginate(self, endpoint: str, key: str, params: Optional[Dict] = None,
+                        page_size: int = 100, concurrency: int = 4, cache: bool = True) -> AsyncIterator[dict]:
+        """Yield every item of a paginated list endpoint, in order.
+
+        The first page tells us ``total_count``; the remaining pages are fetched
+        ``concurrency`` at a time, so at most that many pages are held in memory.
+        Pages still in flight are only cancelled when the generator is closed, so
+        a caller whose loop can stop early (``break``, an exception, cancellation)
+        should iterate inside ``contextlib.aclosing``.
+        """
+        params = dict(params or {})
+        page_size = min(page_size, self.MAX_PAGE_SIZE)
+
+        async def fetch(offset: int) -> dict:
+            return await self._make_request(
+                'GET', endpoint, cache=cache, params={**params, 'offset': offset, 'limit': page_size}
+            )
+
+        first = await fetch(0)
+        for item in first.get(key, []):
+            yield item
+
+        offsets = iter(range(page_size, first.get('total_count', 0), page_size))
+        pending = deque()
+        try:
+            for offset in offsets:
+                pending.append(asyncio.ensure_future(fetch(offset)))
+                if len(pending) >= concurrency:
+                    break
+            while pending:
+                page = await pending.popleft()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append(asyncio.ensure_future(fetch(next_offset)))
+                items = page.get(key, [])
+                if not items:
+                    break
+                for item in items:
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+
     # ------------------ Issues ------------------
-    def get_issues(self, assigned_to_id: str = 'me', status_id: str = 'open',
-                   project_id: Optional[str] = None, limit: int = 25):
+    async def get_issues(self, assigned_to_id: str = 'me', status_id: str = 'open',
+                         project_id: Optional[str] = None, limit: int = 25):
         params = {'assigned_to_id': assigned_to_id, 'status_id': status_id, 'limit': limit}
         if project_id:
             params['project_id'] = project_id
-        return self._make_request('GET', 'issues.json', params=params)
+        return await self._make_request('GET', 'issues.json', params=params)
+
+    def iter_issues(self, assigned_to_id: str = 'me', status_id: str = 'open',
+                    project_id: Optional[str] = None, page_size: int = 100) -> AsyncIterator[dict]:
+        params = {'assigned_to_id': assigned_to_id, 'status_id': status_id}
+        if project_id:
+            params['project_id'] = project_id
+        return self._paginate('issues.json', 'issues', params, page_size)
 
-    def get_issue(self, issue_id: int, include: List[str] = None):
+    async def get_issue(self, issue_id: int, include: List[str] = None):
         params = {}
         if include:
             params['include'] = ','.join(include)
-        return self._make_request('GET', f'issues/{issue_id}.json', params=params)
+        return await self._make_request('GET', f'issues/{issue_id}.json', params=params)
 
-    def create_issue(self, issue_data: Dict):
-        return self._make_request('POST', 'issues.json', json={'issue': issue_data})
+    async def create_issue(self, issue_data: Dict):
+        result = await self._make_request('POST', 'issues.json', json={'issue': issue_data})
+        self.invalidate_cache('issues', 'projects')
+        return result
 
-    def update_issue(self, issue_id: int, issue_data: Dict):
-        return self._make_request('PUT', f'issues/{issue_id}.json', json={'issue': issue_data})
+    async def update_issue(self, issue_id: int, issue_data: Dict):
+        result = await self._make_request('PUT', f'issues/{issue_id}.json', json={'issue': issue_data})
+        self.invalidate_cache('issues')
+        return result
 
     # ------------------ Projects ------------------
-    def get_projects(self, limit: int = 100):
-        return self._make_request('GET', 'projects.json', params={'limit': limit})
+    async def get_projects(self, limit: int = 100):
+        return await self._make_request('GET', 'projects.json', params={'limit': limit})
 
-    def get_project(self, project_id: str, include: List[str] = None):
+    def iter_projects(self, page_size: int = 100) -> AsyncIterator[dict]:
+        return self._paginate('projects.json', 'projects', page_size=page_size)
+
+    async def get_project(self, project_id: str, include: List[str] = None):
         params = {}
         if include:
             params['include'] = ','.join(include)
-        return self._make_request('GET', f'projects/{project_id}.json', params=params)
+        return await self._make_request('GET', f'projects/{project_id}.json', params=params)
 
     # ------------------ Trackers ------------------
-    def get_trackers(self):
-        return self._make_request('GET', 'trackers.json')
+    async def get_trackers(self, cache: bool = True):
+        return await self._make_request('GET', 'trackers.json', cache=cache)
 
     # ------------------ Time Entries ------------------
-    async def get_time_entry_activities(self):
-        url = f"{self.base_url}/enumerations/time_entry_activities.json"
-        async with httpx.AsyncClient() as client:
-            logger.info(f"[Redmine] GET {url}")
-            resp = await client.get(url, headers=self.headers)
-            resp.raise_for_status()
-            return resp.json()
+    async def get_time_entry_activities(self, cache: bool = True):
+        return await self._make_request('GET', 'enumerations/time_entry_activities.json', cache=cache)
 
     async def create_time_entry(self, data: dict):
-        url = f"{self.base_url}/time_entries.json"
-        payload = {"time_entry": data}
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(url, headers=self.headers, json=payload)
-            resp.raise_for_status()
-            return resp.json()
+        result = await self._make_request('POST', 'time_entries.json', json={"time_entry": data})
+        self.invalidate_cache('time_entries', f"issues/{data.get('issue_id')}.json")
+        return result
 
     async def get_time_entries(self, user_id="me", from_date=None, to_date=None):
-        url = f"{self.base_url}/time_entries.json"
         params = {"user_id": user_id}
         if from_date:
             params["from"] = from_date
         if to_date:
             params["to"] = to_date
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, headers=self.headers, params=params)
-            resp.raise_for_status()
-            return resp.json()
+        return await self._make_request('GET', 'time_entries.json', params=params)
+
+    def iter_time_entries(self, user_id="me", from_date=None, to_date=None,
+                          page_size: int = 100) -> AsyncIterator[dict]:
+        params = {"user_id": user_id}
+        if from_date:
+            params["from"] = from_date
+        if to_date:
+            params["to"] = to_date
+        # Time entry history can be large, so its pages are never cached.
+        return self._paginate('time_entries.json', 'time_entries', params, page_size, cache=False)
 
     async def update_time_entry(self, entry_id: int, time_entry_data: Dict):
-        url = f"{self.base_url}/time_entries/{entry_id}.json"
-        payload = {"time_entry": time_entry_data}
-        async with httpx.AsyncClient() as client:
-            resp = await client.put(url, headers=self.headers, json=payload)
-            resp.raise_for_status()
-            return resp.json()
+        result = await self._make_request(
+            'PUT', f'time_entries/{entry_id}.json', json={"time_entry": time_entry_data}
+        )
+        self.invalidate_cache('time_entries')
+        return result
 
     # ------------------ Helpers ------------------
-    def get_current_user(self):
-        return self._make_request('GET', 'users/current.json')
+    async def get_current_user(self):
+        return await self._make_request('GET', 'users/current.json')
+
+    async def get_issue_statuses(self, cache: bool = True):
+        return await self._make_request('GET', 'issue_statuses.json', cache=cache)
+
+    async def get_issue_priorities(self, cache: bool = True):
+        return await self._make_request('GET', 'enumerations/issue_priorities.json', cache=cache)
+
+
+class RedmineServiceRegistry:
+    """Keeps live RedmineService objects keyed by (redmine_url, api_key).
+
+    Entries expire after ``idle_ttl`` seconds without use and the least recently
+    used ones are dropped once ``max_size`` is reached, so per-user state lives
+    for the length of a conversation without growing unbounded.
+    """
+
+    def __init__(self, max_size: int = 512, idle_ttl: float = 1800.0):
+        self._services = TTLCache(maxsize=max_size, ttl=idle_ttl)
+
+    @staticmethod
+    def _key(redmine_url: str, api_key: str):
+        return redmine_url.rstrip('/'), api_key
+
+    def get(self, redmine_url: str, api_key: str) -> RedmineService:
+        key = self._key(redmine_url, api_key)
+        service = self._services.get(key)
+        if service is None:
+            service = RedmineService(redmine_url, api_key)
+        # Re-setting on every access makes the TTL an idle timeout.
+        self._services.set(key, service)
+        return service
+
+    def invalidate(self, redmine_url: str, api_key: str) -> bool:
+        return self._services.invalidate(self._key(redmine_url, api_key))
+
+    def stats(self) -> dict:
+        return self._services.stats()
+
 
-    def get_issue_statuses(self):
-        return self._make_request('GET', 'issue_statuses.json')
+redmine_registry = RedmineServiceRegistry(
+    max_size=int(os.getenv("REDMINE_REGISTRY_MAX_SIZE", "512")),
+    idle_ttl=float(os.getenv("REDMINE_REGISTRY_IDLE_TTL", "1800")),
+)
@@ -0,0 +1,116 @@
+import os
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from services.redmine_service import RedmineService
+
+logger = logging.getLogger(__name__)
+
+# kind -> RedmineService method that fetches it. The JSON payload key matches the kind.
+REFERENCE_KINDS = {
+    "time_entry_activities": "get_time_entry_activities",
+    "trackers": "get_trackers",
+    "issue_statuses": "get_issue_statuses",
+    "issue_priorities": "get_issue_priorities",
+}
+
+
+class _Entry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value: List[dict]):
+        self.value = value
+        self.fetched_at = time.monotonic()
+
+
+class ReferenceDataCache:
+    """Per-Redmine-instance cache of enumerations that rarely change.
+
+    Fresh entries (younger than ``ttl``) are served directly. Entries up to
+    ``stale_ttl`` old are still served, but trigger a background refresh so the
+    next caller sees new data without ever waiting on Redmine.
+    """
+
+    def __init__(self, ttl: float = 3600.0, stale_ttl: float = 86400.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_errors = 0
+
+    async def get(self, redmine: RedmineService, kind: str) -> List[dict]:
+        if kind not in REFERENCE_KINDS:
+            raise ValueError(f"Unknown reference data kind: {kind}")
+        key = (redmine.base_url, kind)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                return entry.value
+            if age < self.stale_ttl:
+                self.stale_hits += 1
+                self._fetch_in_background(redmine, kind)
+                return entry.value
+        self.misses += 1
+        return await self._fetch(redmine, kind)
+
+    async def refresh(self, redmine: RedmineService, kinds: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Re-fetch ``kinds`` (default: all) now and return the number of items per kind.
+
+        Bypasses RedmineService's response cache and any load already in flight,
+        either of which could hand back the payload being refreshed.
+        """
+        kinds = list(kinds or REFERENCE_KINDS)
+        results = await asyncio.gather(*(self._load(redmine, kind, cache=False) for kind in kinds))
+        return {kind: len(items) for kind, items in zip(kinds, results)}
+
+    def _start(self, redmine: RedmineService, kind: str) -> asyncio.Task:
+        # Concurrent callers share one in-flight request per (instance, kind).
+        key = (redmine.base_url, kind)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(redmine, kind))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch(self, redmine: RedmineService, kind: str) -> List[dict]:
+        return await asyncio.shield(self._start(redmine, kind))
+
+    async def _load(self, redmine: RedmineService, kind: str, cache: bool = True) -> List[dict]:
+        result = await getattr(redmine, REFERENCE_KINDS[kind])(cache=cache)
+        items = result.get(kind, [])
+        self._entries[(redmine.base_url, kind)] = _Entry(items)
+        logger.debug(f"Loaded {len(items)} {kind} from {redmine.base_url}")
+        return items
+
+    def _fetch_in_background(self, redmine: RedmineService, kind: str):
+        if (redmine.base_url, kind) in self._inflight:
+            return
+
+        def on_done(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is not None:
+                self.refresh_errors += 1
+                logger.warning(f"Background refresh of {kind} from {redmine.base_url} failed: {task.exception()}")
+
+        self._start(redmine, kind).add_done_callback(on_done)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+reference_data = ReferenceDataCache(
+    ttl=float(os.getenv("REFERENCE_DATA_TTL", "3600")),
+    stale_ttl=float(os.getenv("REFERENCE_DATA_STALE_TTL", "86400")),
+)
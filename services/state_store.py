@@ -0,0 +1,329 @@
+import os
+import asyncio
+import json
+import logging
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from psycopg2.extras import execute_values
+from services.database_service import DatabaseService
+
+logger = logging.getLogger(__name__)
+
+# Conversation keys are tuples such as (chat_id, user_id); stores keep them as JSON text.
+ConversationRow = Tuple[str, tuple, object]
+
+
+class LockTimeoutError(Exception):
+    """Raised when a per-user state lock could not be acquired in time."""
+
+
+def encode_key(key: tuple) -> str:
+    return json.dumps(list(key))
+
+
+def decode_key(raw: str) -> tuple:
+    return tuple(json.loads(raw))
+
+
+class StateStore(ABC):
+    """Shared storage for per-user bot state (user_data and conversation states).
+
+    Every replica of the bot talks to the same store, so a user's half-finished
+    /setup or /logtime flow survives restarts and can continue on any replica.
+    ``lock`` is a lease lock: a replica that dies while holding it only blocks
+    that user until the lease expires.
+    """
+
+    def __init__(self, lock_lease: float = 30.0, lock_timeout: float = 10.0):
+        self.lock_lease = lock_lease
+        self.lock_timeout = lock_timeout
+        self.owner = uuid.uuid4().hex
+        self.lock_waits = 0
+
+    @abstractmethod
+    async def load_user_data(self, user_ids: Optional[List[int]] = None) -> Dict[int, dict]:
+        """Stored user_data by user id, for ``user_ids`` or for everyone."""
+        pass
+
+    @abstractmethod
+    async def load_conversations(self, name: Optional[str] = None,
+                                 user_id: Optional[int] = None) -> List[ConversationRow]:
+        """Stored conversation states, optionally for one conversation name and/or user."""
+        pass
+
+    @abstractmethod
+    async def write_batch(self, user_data: Dict[int, Optional[dict]],
+                          conversations: Dict[Tuple[str, tuple], object]):
+        """Persist a batch in one round trip; ``None`` values delete the row."""
+        pass
+
+    @abstractmethod
+    async def try_acquire(self, lock_key: str) -> bool:
+        """Take or renew the lease on ``lock_key``; False if another owner holds it."""
+        pass
+
+    @abstractmethod
+    async def release(self, lock_key: str):
+        """Give up ``lock_key`` if this store owns it."""
+        pass
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def lock(self, lock_key: str):
+        """Hold ``lock_key`` for the duration of the block, renewing the lease while it runs."""
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.01
+        while not await self.try_acquire(lock_key):
+            if time.monotonic() >= deadline:
+                raise LockTimeoutError(f"Timed out after {self.lock_timeout}s waiting for {lock_key}")
+            self.lock_waits += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        renewer = asyncio.create_task(self._renew(lock_key))
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await self.release(lock_key)
+
+    async def _renew(self, lock_key: str):
+        # Long handlers (LLM parses) can outlive a lease; re-acquiring as owner extends it.
+        while True:
+            await asyncio.sleep(self.lock_lease / 3)
+            await self.try_acquire(lock_key)
+
+
+class MemoryStateStore(StateStore):
+    """In-process stand-in for a shared store, for single-replica runs and benchmarks."""
+
+    def __init__(self, lock_lease: float = 30.0, lock_timeout: float = 10.0):
+        super().__init__(lock_lease, lock_timeout)
+        self._user_data: Dict[int, str] = {}
+        self._conversations: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self.batches = 0
+
+    def for_replica(self) -> "MemoryStateStore":
+        """Another view of the same data with its own lock owner id, as a second replica would have."""
+        replica = MemoryStateStore(self.lock_lease, self.lock_timeout)
+        replica._user_data, replica._conversations, replica._locks = self._user_data, self._conversations, self._locks
+        return replica
+
+    async def load_user_data(self, user_ids=None):
+        ids = self._user_data.keys() if user_ids is None else [i for i in user_ids if i in self._user_data]
+        return {user_id: json.loads(self._user_data[user_id]) for user_id in list(ids)}
+
+    async def load_conversations(self, name=None, user_id=None):
+        return [
+            (conv_name, decode_key(key), json.loads(state))
+            for (conv_name, key), (owner_id, state) in list(self._conversations.items())
+            if (name is None or conv_name == name) and (user_id is None or owner_id == user_id)
+        ]
+
+    async def write_batch(self, user_data, conversations):
+        self.batches += 1
+        for user_id, data in user_data.items():
+            if data is None:
+                self._user_data.pop(user_id, None)
+            else:
+                self._user_data[user_id] = json.dumps(data, default=str)
+        for (name, key), state in conversations.items():
+            if state is None:
+                self._conversations.pop((name, encode_key(key)), None)
+            else:
+                self._conversations[(name, encode_key(key))] = (key[-1], json.dumps(state))
+
+    async def try_acquire(self, lock_key):
+        holder = self._locks.get(lock_key)
+        now = time.monotonic()
+        if holder and holder[0] != self.owner and holder[1] > now:
+            return False
+        self._locks[lock_key] = (self.owner, now + self.lock_lease)
+        return True
+
+    async def release(self, lock_key):
+        holder = self._locks.get(lock_key)
+        if holder and holder[0] == self.owner:
+            del self._locks[lock_key]
+
+
+class PostgresStateStore(StateStore, DatabaseService):
+    """State kept in the bot_user_data, bot_conversations and bot_state_locks tables next to users."""
+
+    def __init__(self, lock_lease: float = 30.0, lock_timeout: float = 10.0):
+        StateStore.__init__(self, lock_lease, lock_timeout)
+        DatabaseService.__init__(self)
+
+    def _fetchall(self, deadline: float, query: str, params: tuple):
+        with self.get_connection(deadline) as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchall()
+
+    async def load_user_data(self, user_ids=None):
+        if user_ids is None:
+            rows = await self._run(self._fetchall, "SELECT telegram_id, data FROM bot_user_data", ())
+        else:
+            rows = await self._run(
+                self._fetchall, "SELECT telegram_id, data FROM bot_user_data WHERE telegram_id = ANY(%s)",
+                (list(user_ids),),
+            )
+        return {int(user_id): data for user_id, data in rows}
+
+    async def load_conversations(self, name=None, user_id=None):
+        rows = await self._run(
+            self._fetchall,
+            "SELECT name, conversation_key, state FROM bot_conversations "
+            "WHERE (%s IS NULL OR name = %s) AND (%s IS NULL OR telegram_id = %s)",
+            (name, name, user_id, user_id),
+        )
+        return [(conv_name, decode_key(key), state) for conv_name, key, state in rows]
+
+    def _write_batch(self, deadline, user_data, conversations):
+        upserts = [(user_id, json.dumps(data, default=str)) for user_id, data in user_data.items() if data is not None]
+        drops = [user_id for user_id, data in user_data.items() if data is None]
+        conv_upserts = [
+            (name, encode_key(key), key[-1], json.dumps(state))
+            for (name, key), state in conversations.items() if state is not None
+        ]
+        conv_drops = [(name, encode_key(key)) for (name, key), state in conversations.items() if state is None]
+        with self.get_connection(deadline) as conn:
+            with conn.cursor() as cur:
+                if upserts:
+                    execute_values(
+                        cur,
+                        "INSERT INTO bot_user_data (telegram_id, data) VALUES %s "
+                        "ON CONFLICT (telegram_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now()",
+                        upserts, template="(%s, %s::jsonb)",
+                    )
+                if drops:
+                    cur.execute("DELETE FROM bot_user_data WHERE telegram_id = ANY(%s)", (drops,))
+                if conv_upserts:
+                    execute_values(
+                        cur,
+                        "INSERT INTO bot_conversations (name, conversation_key, telegram_id, state) VALUES %s "
+                        "ON CONFLICT (name, conversation_key) DO UPDATE SET state = EXCLUDED.state, updated_at = now()",
+                        conv_upserts, template="(%s, %s, %s, %s::jsonb)",
+                    )
+                for name, key in conv_drops:
+                    cur.execute(
+                        "DELETE FROM bot_conversations WHERE name = %s AND conversation_key = %s", (name, key)
+                    )
+
+    async def write_batch(self, user_data, conversations):
+        await self._run(self._write_batch, user_data, conversations)
+
+    async def try_acquire(self, lock_key):
+        row = await self._run(
+            self._fetchall,
+            "INSERT INTO bot_state_locks (lock_key, owner, expires_at) "
+            "VALUES (%s, %s, now() + %s * interval '1 second') "
+            "ON CONFLICT (lock_key) DO UPDATE SET owner = EXCLUDED.owner, expires_at = EXCLUDED.expires_at "
+            "WHERE bot_state_locks.owner = EXCLUDED.owner OR bot_state_locks.expires_at < now() "
+            "RETURNING owner",
+            (lock_key, self.owner, self.lock_lease),
+        )
+        return bool(row)
+
+    async def release(self, lock_key):
+        await self._run(
+            self._execute, "DELETE FROM bot_state_locks WHERE lock_key = %s AND owner = %s", (lock_key, self.owner)
+        )
+
+
+class RedisStateStore(StateStore):
+    """State kept in a Redis-compatible server; needs the optional ``redis`` package.
+
+    user_data lives in one hash read with HMGET for the users asked for;
+    conversation states live in one hash per user (``conv:<user_id>``, fields
+    are the JSON ``[name, key]``), so the per-update reload touches only that
+    user's keys. The ``conversation_users`` set is only walked at startup.
+    """
+
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    RENEW_SCRIPT = (
+        "local v = redis.call('get', KEYS[1]) "
+        "if v == false or v == ARGV[1] then return redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2]) end "
+        "return false"
+    )
+
+    def __init__(self, url: str, prefix: str = "ric:", lock_lease: float = 30.0, lock_timeout: float = 10.0):
+        super().__init__(lock_lease, lock_timeout)
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("STATE_STORE=redis needs the redis package: pip install redis") from e
+        self._redis = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    async def load_user_data(self, user_ids=None):
+        if user_ids is None:
+            raw = await self._redis.hgetall(f"{self.prefix}user_data")
+            return {int(k): json.loads(v) for k, v in raw.items()}
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        values = await self._redis.hmget(f"{self.prefix}user_data", user_ids)
+        return {user_id: json.loads(v) for user_id, v in zip(user_ids, values) if v is not None}
+
+    async def load_conversations(self, name=None, user_id=None):
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            user_ids = [int(i) for i in await self._redis.smembers(f"{self.prefix}conversation_users")]
+        rows = []
+        for owner_id in user_ids:
+            for field, state in (await self._redis.hgetall(f"{self.prefix}conv:{owner_id}")).items():
+                conv_name, key = json.loads(field)
+                if name is None or conv_name == name:
+                    rows.append((conv_name, tuple(key), json.loads(state)))
+        return rows
+
+    async def write_batch(self, user_data, conversations):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for user_id, data in user_data.items():
+                if data is None:
+                    pipe.hdel(f"{self.prefix}user_data", user_id)
+                else:
+                    pipe.hset(f"{self.prefix}user_data", user_id, json.dumps(data, default=str))
+            for (name, key), state in conversations.items():
+                field = json.dumps([name, list(key)])
+                if state is None:
+                    pipe.hdel(f"{self.prefix}conv:{key[-1]}", field)
+                else:
+                    pipe.sadd(f"{self.prefix}conversation_users", key[-1])
+                    pipe.hset(f"{self.prefix}conv:{key[-1]}", field, json.dumps(state))
+            await pipe.execute()
+
+    async def try_acquire(self, lock_key):
+        return bool(await self._redis.eval(
+            self.RENEW_SCRIPT, 1, f"{self.prefix}lock:{lock_key}", self.owner, int(self.lock_lease * 1000)
+        ))
+
+    async def release(self, lock_key):
+        await self._redis.eval(self.RELEASE_SCRIPT, 1, f"{self.prefix}lock:{lock_key}", self.owner)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_state_store() -> Optional[StateStore]:
+    """Build the store selected by STATE_STORE, or None to keep state in process memory only."""
+    kind = os.getenv("STATE_STORE", "").lower()
+    lease = float(os.getenv("STATE_LOCK_LEASE", "30"))
+    timeout = float(os.getenv("STATE_LOCK_TIMEOUT", "10"))
+    if not kind:
+        return None
+    if kind == "memory":
+        return MemoryStateStore(lease, timeout)
+    if kind == "postgres":
+        return PostgresStateStore(lease, timeout)
+    if kind == "redis":
+        return RedisStateStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), lock_lease=lease, lock_timeout=timeout)
+    raise ValueError(f"Unknown STATE_STORE {kind!r}; expected memory, postgres or redis")
@@ -0,0 +1,121 @@
+import os
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Set
+import httpx
+from services.cache import TTLCache
+from services.redmine_service import RedmineService
+
+logger = logging.getLogger(__name__)
+
+CREATED, DUPLICATE, FAILED = "created", "duplicate", "failed"
+
+
+@dataclass
+class SubmissionResult:
+    payload: dict
+    status: str
+    error: Optional[Exception] = None
+
+
+class TimeEntrySubmitter:
+    """Posts a batch of time entries to Redmine concurrently.
+
+    Each entry is retried with exponential backoff on 429/5xx and on connection
+    failures. Every payload gets an idempotency key derived from the user, the
+    batch (the confirmation it belongs to) and its position in the batch; a key
+    that is in flight or was created recently is reported as a duplicate
+    instead of being posted again, so a double tap on "Confirm & Log" cannot
+    create the same entry twice. Identical entries, in one batch or logged
+    again later, are all posted.
+    """
+
+    def __init__(self, concurrency: int = 4, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, dedupe_ttl: float = 600.0):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight: Set[str] = set()
+        self._created = TTLCache(maxsize=10000, ttl=dedupe_ttl)
+        self.retries = 0
+
+    @staticmethod
+    def idempotency_key(telegram_id: str, batch_id: str, index: int) -> str:
+        raw = json.dumps([telegram_id, batch_id, index])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def submit(self, redmine: RedmineService, telegram_id: str, batch_id: str, payloads: List[dict],
+                     on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> List[SubmissionResult]:
+        """Post ``payloads``; ``on_progress(done, total)`` is awaited as each one settles.
+
+        ``batch_id`` identifies the confirmation being submitted (e.g. the chat and
+        message id of the "Confirm & Log" prompt) and must be the same on a retap.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done = 0
+
+        async def submit_one(index: int, payload: dict) -> SubmissionResult:
+            key = self.idempotency_key(telegram_id, batch_id, index)
+            if key in self._in_flight or self._created.get(key):
+                return SubmissionResult(payload, DUPLICATE)
+            self._in_flight.add(key)
+            try:
+                async with semaphore:
+                    await self._create_with_retry(redmine, payload)
+                self._created.set(key, True)
+                return SubmissionResult(payload, CREATED)
+            except Exception as e:
+                return SubmissionResult(payload, FAILED, e)
+            finally:
+                self._in_flight.discard(key)
+
+        async def tracked(index: int, payload: dict) -> SubmissionResult:
+            nonlocal done
+            result = await submit_one(index, payload)
+            done += 1
+            if on_progress is not None:
+                await on_progress(done, len(payloads))
+            return result
+
+        return list(await asyncio.gather(*(tracked(i, p) for i, p in enumerate(payloads))))
+
+    async def _create_with_retry(self, redmine: RedmineService, payload: dict):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await redmine.create_time_entry(payload)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if (status != 429 and status < 500) or attempt == self.max_retries:
+                    raise
+                delay = self._retry_after(e.response) or self._backoff(attempt)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # The request never reached Redmine, so retrying cannot duplicate it.
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            self.retries += 1
+            logger.info(f"Retrying time entry for issue {payload.get('issue_id')} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        try:
+            return min(self.backoff_max, float(response.headers.get("Retry-After", "")))
+        except ValueError:
+            return None
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._in_flight), "retries": self.retries, "recently_created": len(self._created)}
+
+
+time_entry_submitter = TimeEntrySubmitter(
+    concurrency=int(os.getenv("TIME_ENTRY_SUBMIT_CONCURRENCY", "4")),
+    max_retries=int(os.getenv("TIME_ENTRY_SUBMIT_RETRIES", "3")),
+)
@@ -0,0 +1,200 @@
+import os
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import aclosing
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from services.database_service import DatabaseService
+from services.redmine_service import RedmineService, redmine_registry
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {
+    "week": "This week",
+    "lastweek": "Last week",
+    "month": "This month",
+    "lastmonth": "Last month",
+}
+
+
+def period_range(period: str, today: Optional[date] = None) -> Tuple[date, date]:
+    today = today or date.today()
+    if period == "week":
+        return today - timedelta(days=today.weekday()), today
+    if period == "lastweek":
+        end = today - timedelta(days=today.weekday() + 1)
+        return end - timedelta(days=6), end
+    if period == "month":
+        return today.replace(day=1), today
+    if period == "lastmonth":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    raise ValueError(f"Unknown period: {period}")
+
+
+def _issue_id(value) -> int:
+    try:
+        return int(str(value).lstrip("#"))
+    except (TypeError, ValueError):
+        return 0
+
+
+class TimesheetService:
+    """Per-user timesheet aggregates (day x activity x issue) kept in PostgreSQL.
+
+    Hours are added as soon as ``confirm_log`` creates entries, so reports need
+    no Redmine round trip. Entries logged or edited elsewhere are picked up by
+    ``reconcile``, which rebuilds the last ``reconcile_days`` from Redmine; the
+    periodic job runs it for every user whose aggregates are older than
+    ``reconcile_interval``.
+    """
+
+    def __init__(self, reconcile_days: int = 62, reconcile_interval: float = 3600.0,
+                 reconcile_batch: int = 20, reconcile_concurrency: int = 4):
+        self.db = DatabaseService()
+        self.reconcile_days = reconcile_days
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_batch = reconcile_batch
+        self.reconcile_concurrency = reconcile_concurrency
+        self.recorded = 0
+        self.record_errors = 0
+        self.record_skipped = 0
+        self.reconciles = 0
+        self.reconcile_errors = 0
+        self._summary_times = deque(maxlen=500)
+
+    @staticmethod
+    def aggregate(items: Iterable[tuple]) -> List[tuple]:
+        """Collapse (spent_on, activity_id, activity_name, issue_id, hours) items into aggregate rows."""
+        totals: Dict[tuple, list] = {}
+        for spent_on, activity_id, activity_name, issue_id, hours in items:
+            key = (str(spent_on), int(activity_id), _issue_id(issue_id))
+            row = totals.setdefault(key, [activity_name, 0.0, 0])
+            row[0] = row[0] or activity_name
+            row[1] += float(hours)
+            row[2] += 1
+        return [
+            (spent_on, activity_id, name, issue_id, round(hours, 2), count)
+            for (spent_on, activity_id, issue_id), (name, hours, count) in totals.items()
+        ]
+
+    async def record(self, telegram_id: str, payloads: List[dict], activities: List[dict], submitted_at: datetime):
+        """Add created time entry payloads to the aggregates; failures only cost freshness until reconcile.
+
+        ``submitted_at`` is when posting the entries started. If a reconcile
+        snapshot began after it, the snapshot may already count them, so they
+        are not added again.
+        """
+        names = {a["id"]: a["name"] for a in activities}
+        rows = self.aggregate(
+            (p["spent_on"], p["activity_id"], names.get(p["activity_id"]), p.get("issue_id"), p["hours"])
+            for p in payloads
+        )
+        try:
+            if await self.db.add_timesheet_hours(telegram_id, rows, submitted_at):
+                self.recorded += len(payloads)
+            else:
+                self.record_skipped += 1
+        except Exception as e:
+            self.record_errors += 1
+            logger.warning(f"Could not update timesheet aggregates for {telegram_id}: {e}")
+
+    async def reconcile(self, redmine: RedmineService, telegram_id: str) -> int:
+        """Rebuild the user's recent aggregates from Redmine and return the number of entries seen."""
+        snapshot_at = datetime.now(timezone.utc)
+        end = date.today()
+        start = end - timedelta(days=self.reconcile_days)
+        items = []
+        async with aclosing(redmine.iter_time_entries(from_date=start.isoformat(), to_date=end.isoformat())) as entries:
+            async for entry in entries:
+                activity = entry.get("activity") or {}
+                items.append((
+                    entry["spent_on"], activity.get("id", 0), activity.get("name"),
+                    (entry.get("issue") or {}).get("id"), entry.get("hours", 0),
+                ))
+        await self.db.replace_timesheet(
+            telegram_id, start.isoformat(), end.isoformat(), self.aggregate(items), snapshot_at
+        )
+        self.reconciles += 1
+        return len(items)
+
+    async def reconcile_due(self) -> int:
+        """Reconcile up to ``reconcile_batch`` users whose aggregates are stale; returns how many succeeded."""
+        telegram_ids = await self.db.get_timesheet_users_due(self.reconcile_interval, self.reconcile_batch)
+        semaphore = asyncio.Semaphore(self.reconcile_concurrency)
+
+        async def reconcile_user(telegram_id: str) -> bool:
+            async with semaphore:
+                try:
+                    user = await self.db.get_user_by_telegram_id(telegram_id)
+                    if not user:
+                        return False
+                    await self.reconcile(redmine_registry.get(user["redmine_url"], user["api_key"]), telegram_id)
+                    return True
+                except Exception as e:
+                    self.reconcile_errors += 1
+                    logger.warning(f"Timesheet reconcile failed for {telegram_id}: {e}")
+                    return False
+
+        results = await asyncio.gather(*(reconcile_user(t) for t in telegram_ids))
+        return sum(results)
+
+    async def summary(self, telegram_id: str, start: date, end: date,
+                      redmine: Optional[RedmineService] = None) -> dict:
+        """Totals and breakdowns for ``start``..``end`` from the aggregates.
+
+        A user who was never reconciled is reconciled first when ``redmine`` is
+        given, so the first report also covers hours logged outside the bot.
+        """
+        if redmine is not None and await self.db.get_timesheet_reconciled_at(telegram_id) is None:
+            await self.reconcile(redmine, telegram_id)
+
+        started = time.perf_counter()
+        rows = await self.db.get_timesheet(telegram_id, start.isoformat(), end.isoformat())
+        days: Dict[str, float] = {}
+        activities: Dict[str, float] = {}
+        issues: Dict[int, float] = {}
+        total, entries = 0.0, 0
+        for row in rows:
+            hours = float(row["hours"])
+            total += hours
+            entries += row["entries"]
+            day = str(row["spent_on"])
+            days[day] = days.get(day, 0.0) + hours
+            name = row["activity_name"] or f"Activity {row['activity_id']}"
+            activities[name] = activities.get(name, 0.0) + hours
+            if row["issue_id"]:
+                issues[row["issue_id"]] = issues.get(row["issue_id"], 0.0) + hours
+        self._summary_times.append(time.perf_counter() - started)
+
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "total_hours": round(total, 2),
+            "entries": entries,
+            "days": {day: round(hours, 2) for day, hours in sorted(days.items())},
+            "activities": sorted(((n, round(h, 2)) for n, h in activities.items()), key=lambda x: -x[1]),
+            "issues": sorted(((i, round(h, 2)) for i, h in issues.items()), key=lambda x: -x[1]),
+        }
+
+    def stats(self) -> dict:
+        times = sorted(self._summary_times)
+        return {
+            "recorded_entries": self.recorded,
+            "record_errors": self.record_errors,
+            "record_skipped_after_reconcile": self.record_skipped,
+            "reconciles": self.reconciles,
+            "reconcile_errors": self.reconcile_errors,
+            "summaries": len(times),
+            "summary_ms_p50": round(times[len(times) // 2] * 1000, 1) if times else 0.0,
+        }
+
+
+timesheet_service = TimesheetService(
+    reconcile_days=int(os.getenv("TIMESHEET_RECONCILE_DAYS", "62")),
+    reconcile_interval=float(os.getenv("TIMESHEET_RECONCILE_INTERVAL", "3600")),
+    reconcile_batch=int(os.getenv("TIMESHEET_RECONCILE_BATCH", "20")),
+    reconcile_concurrency=int(os.getenv("TIMESHEET_RECONCILE_CONCURRENCY", "4")),
+)
@@ -0,0 +1,252 @@
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from services.activity_index import activity_resolver
+from utils.helpers import parse_duration
+
+logger = logging.getLogger(__name__)
+
+DURATION_RE = re.compile(
+    r"(?<![\w#.])(?:"
+    r"\d+(?:\.\d+)?\s*(?:h|hrs?|hours?)\b(?:\s*(?:and\s+)?\d+\s*(?:m|mins?|minutes?)\b)?"
+    r"|\d+\s*(?:m|mins?|minutes?)\b"
+    r")",
+    re.IGNORECASE,
+)
+ISSUE_RE = re.compile(
+    r"(?:#|\b(?:issue|ticket|task|bug)\s+#?)(\d+)\b(?!\.\d|\s*(?:h|hrs?|hours?|m|mins?|minutes?)\b)",
+    re.IGNORECASE,
+)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+# Bare "sat"/"sun" are left out on purpose: "sat in a call for 1h" is not a date.
+_WEEKDAY = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday|mon|tues?|wed|thu(?:rs?)?|fri)"
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+RELATIVE_DAY_RE = re.compile(r"\b(day before yesterday|yesterday|today)\b", re.IGNORECASE)
+DAYS_AGO_RE = re.compile(r"\b(\d+)\s+days?\s+ago\b", re.IGNORECASE)
+WEEKDAY_RE = re.compile(r"\b(?:(last|on|this)\s+)?" + _WEEKDAY + r"\b", re.IGNORECASE)
+DAY_MONTH_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+" + _MONTH + r"(?:\s+(\d{4}))?\b", re.IGNORECASE)
+MONTH_DAY_RE = re.compile(r"\b" + _MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b", re.IGNORECASE)
+# Phrases we do not try to resolve deterministically; these always go to the LLM.
+VAGUE_DATE_RE = re.compile(
+    r"\b(?:tomorrow|(?:last|this|next)\s+(?:week|month)|weekend|\d{1,2}/\d{1,2}(?:/\d{2,4})?"
+    r"|next\s+" + _WEEKDAY + r"|(?:on|last)\s+(?:sat|sun))\b",
+    re.IGNORECASE,
+)
+DATE_RES = (ISO_DATE_RE, RELATIVE_DAY_RE, DAYS_AGO_RE, WEEKDAY_RE, DAY_MONTH_RE, MONTH_DAY_RE)
+# Date-like words left over once the dates above are removed ("on 5th", "in march"):
+# a date we could not resolve, so the line must not default to today.
+UNRESOLVED_DATE_RE = re.compile(
+    r"\b(?:\d{1,2}(?:st|nd|rd|th)|the\s+\d{1,2}|(?:on|since|until)\s+\d{1,2}(?!\s*[.:\d])"
+    r"|january|february|march|april|june|july|august|september|october|november|december"
+    r"|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec|(?:in|on|of)\s+may)\b",
+    re.IGNORECASE,
+)
+
+ISSUE_REFERENCE_RE = re.compile(r"\b(?:issue|ticket|task)\s+#?\d+\b|#\d+\b", re.IGNORECASE)
+SEGMENT_SPLIT_RE = re.compile(r"[\n;]+")
+CLAUSE_SPLIT_RE = re.compile(r",|\band\b|\bthen\b|\bplus\b", re.IGNORECASE)
+FILLER_RE = re.compile(
+    r"^(?:i\s+)?(?:spent|worked|working|did|was|on|for|in|at|with|and|of|doing)\b\s*"
+    r"|\s*\b(?:on|for|in|at|with|and|of)$",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class ParseResult:
+    entries: List[dict] = field(default_factory=list)
+    confidence: float = 0.0
+    reason: str = ""
+
+
+class WorkLogParser:
+    """Rule-based parser for simple work logs such as "2h code review #1234 yesterday".
+
+    Every result carries a confidence score; callers fall back to the LLM when
+    it is below their threshold, so ambiguous input is never guessed at.
+    """
+
+    def __init__(self, min_confidence: float = 0.8):
+        self.min_confidence = min_confidence
+        self.attempts = 0
+        self.fast_path_hits = 0
+
+    def parse(self, text: str, activities: list, today: Optional[date] = None) -> ParseResult:
+        self.attempts += 1
+        today = today or date.today()
+        result = self._parse(text, activities, today)
+        if result.confidence >= self.min_confidence:
+            self.fast_path_hits += 1
+        else:
+            logger.debug(f"Fast-path parse declined ({result.confidence:.2f}): {result.reason}")
+        return result
+
+    def _parse(self, text: str, activities: list, today: date) -> ParseResult:
+        if not text.strip() or not activities:
+            return ParseResult(reason="empty input")
+        if VAGUE_DATE_RE.search(text):
+            return ParseResult(reason="date range or ambiguous date")
+        if UNRESOLVED_DATE_RE.search(self._strip_dates(text)):
+            return ParseResult(reason="unrecognised date")
+
+        entries = []
+        confidence = 1.0
+        for segment in (s.strip() for s in SEGMENT_SPLIT_RE.split(text)):
+            if not segment:
+                continue
+            segment_entries, segment_confidence, reason = self._parse_segment(segment, activities, today)
+            if not segment_entries:
+                if DURATION_RE.search(segment) or ISSUE_RE.search(segment):
+                    return ParseResult(reason=reason)
+                # A heading like "Monday:" with no work on it.
+                continue
+            entries.extend(segment_entries)
+            confidence = min(confidence, segment_confidence)
+
+        if not entries:
+            return ParseResult(reason="no durations found")
+        return ParseResult(entries=entries, confidence=confidence)
+
+    def _parse_segment(self, segment: str, activities: list, today: date) -> Tuple[List[dict], float, str]:
+        durations = DURATION_RE.findall(segment)
+        if not durations:
+            return [], 0.0, "no duration"
+
+        segment_date, date_ok = self._extract_date(segment, today)
+        if not date_ok:
+            return [], 0.0, "multiple dates in one line"
+        issues = ISSUE_RE.findall(segment)
+
+        if len(durations) == 1:
+            clauses = [segment]
+            confidence = 1.0
+        else:
+            clauses = [c for c in CLAUSE_SPLIT_RE.split(segment) if c.strip()]
+            clauses = self._attach_orphans(clauses)
+            if len(clauses) != len(durations) or any(len(DURATION_RE.findall(c)) != 1 for c in clauses):
+                return [], 0.0, "could not split line into one task per duration"
+            confidence = 0.9
+
+        entries = []
+        for clause in clauses:
+            clause_issues = ISSUE_RE.findall(clause)
+            if len(clause_issues) > 1:
+                return [], 0.0, "several issues for one duration"
+            if clause_issues:
+                issue_id = clause_issues[0]
+            elif len(set(issues)) == 1:
+                issue_id = issues[0]
+            elif not issues:
+                issue_id = "Unknown"
+                confidence = min(confidence, 0.85)
+            else:
+                return [], 0.0, "cannot tell which issue a duration belongs to"
+
+            hours = round(parse_duration(DURATION_RE.search(clause).group(0)), 2)
+            if not 0 < hours <= 24:
+                return [], 0.0, f"implausible duration {hours}h"
+
+            clause_date, date_ok = self._extract_date(clause, today)
+            if not date_ok:
+                return [], 0.0, "multiple dates in one task"
+
+            comments = self._comments(clause)
+            activity, score = self.match_activity(comments or clause, activities)
+            if activity is None:
+                return [], 0.0, "no matching activity"
+            confidence = min(confidence, score)
+
+            entries.append({
+                "date": (clause_date or segment_date or today).strftime("%Y-%m-%d"),
+                "hours": hours,
+                "activity": activity["name"],
+                "comments": comments or activity["name"],
+                "issue_id": issue_id,
+            })
+        return entries, confidence, ""
+
+    @staticmethod
+    def _attach_orphans(clauses: List[str]) -> List[str]:
+        """Merge clauses without a duration (e.g. a trailing "#1234") into their neighbour."""
+        merged: List[str] = []
+        for clause in clauses:
+            if merged and not DURATION_RE.search(clause):
+                merged[-1] = f"{merged[-1]} {clause}"
+            elif merged and not DURATION_RE.search(merged[-1]):
+                merged[-1] = f"{merged[-1]} {clause}"
+            else:
+                merged.append(clause)
+        return merged
+
+    def _extract_date(self, text: str, today: date) -> Tuple[Optional[date], bool]:
+        found = []
+        for m in ISO_DATE_RE.finditer(text):
+            try:
+                found.append(date(int(m.group(1)), int(m.group(2)), int(m.group(3))))
+            except ValueError:
+                return None, False
+        for m in RELATIVE_DAY_RE.finditer(text):
+            word = m.group(1).lower()
+            found.append(today - timedelta(days={"today": 0, "yesterday": 1}.get(word, 2)))
+        for m in DAYS_AGO_RE.finditer(text):
+            found.append(today - timedelta(days=int(m.group(1))))
+        for m in WEEKDAY_RE.finditer(text):
+            weekday = [w[:3] for w in WEEKDAYS].index(m.group(2).lower()[:3])
+            delta = (today.weekday() - weekday) % 7
+            if delta == 0 and (m.group(1) or "").lower() == "last":
+                delta = 7
+            found.append(today - timedelta(days=delta))
+        for regex, day_group, month_group in ((DAY_MONTH_RE, 1, 2), (MONTH_DAY_RE, 2, 1)):
+            for m in regex.finditer(text):
+                month = MONTHS.index(m.group(month_group).lower()[:3]) + 1
+                year = int(m.group(3)) if m.group(3) else today.year
+                try:
+                    parsed = date(year, month, int(m.group(day_group)))
+                except ValueError:
+                    return None, False
+                if not m.group(3) and parsed > today:
+                    parsed = parsed.replace(year=year - 1)
+                found.append(parsed)
+
+        if len(set(found)) > 1:
+            return None, False
+        return (found[0] if found else None), True
+
+    @staticmethod
+    def _strip_dates(text: str) -> str:
+        for regex in DATE_RES:
+            text = regex.sub(" ", text)
+        return text
+
+    def _comments(self, text: str) -> str:
+        for regex in (DURATION_RE, ISSUE_REFERENCE_RE):
+            text = regex.sub(" ", text)
+        text = self._strip_dates(text)
+        text = re.sub(r"\s+", " ", text).strip(" ,.:;-")
+        previous = None
+        while previous != text:
+            previous = text
+            text = FILLER_RE.sub("", text).strip(" ,.:;-")
+        return text[:1].upper() + text[1:] if text else ""
+
+    @staticmethod
+    def match_activity(text: str, activities: list) -> Tuple[Optional[dict], float]:
+        """Return the activity that best fits ``text`` and a score in [0, 1]."""
+        return activity_resolver.match(text, activities)
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "fast_path_hits": self.fast_path_hits,
+            "hit_rate": round(self.fast_path_hits / self.attempts, 3) if self.attempts else 0.0,
+        }
+
+
+worklog_parser = WorkLogParser(min_confidence=float(os.getenv("WORKLOG_FAST_PATH_MIN_CONFIDENCE", "0.8")))
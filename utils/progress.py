@@ -0,0 +1,76 @@
+import os
+import asyncio
+import logging
+import time
+from typing import Optional
+from telegram import Message
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressMessage:
+    """A status message sent once and then edited in place as work advances.
+
+    Intermediate updates are throttled to one edit per ``min_interval`` seconds;
+    if several arrive in between, only the newest text is shown. ``finish``
+    always edits immediately and falls back to a new message if the
+    placeholder can no longer be edited.
+    """
+
+    MIN_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", "1.0"))
+
+    def __init__(self, reply_to: Message, min_interval: Optional[float] = None):
+        self.reply_to = reply_to
+        self.min_interval = self.MIN_INTERVAL if min_interval is None else min_interval
+        self.message: Optional[Message] = None
+        self._shown: Optional[str] = None
+        self._pending: Optional[str] = None
+        self._last_edit = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        # The placeholder gets edited later, so it must never be merged into another message.
+        self._rate_limit_args = {"coalesce": False} if getattr(reply_to.get_bot(), "rate_limiter", None) else None
+
+    async def start(self, text: str) -> "ProgressMessage":
+        self.message = await self.reply_to.reply_text(text, rate_limit_args=self._rate_limit_args)
+        self._shown = text
+        self._last_edit = time.monotonic()
+        return self
+
+    async def update(self, text: str):
+        if self.message is None:
+            await self.start(text)
+            return
+        self._pending = text
+        wait = self._last_edit + self.min_interval - time.monotonic()
+        if wait <= 0:
+            await self._flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    async def finish(self, text: str, **kwargs) -> Message:
+        """Replace the placeholder with the final text (``kwargs`` go to edit_text, e.g. parse_mode)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._pending = None
+        if self.message is not None:
+            try:
+                return await self.message.edit_text(text, **kwargs)
+            except BadRequest as e:
+                logger.warning(f"Could not edit progress message, sending a new one: {e}")
+        return await self.reply_to.reply_text(text, **kwargs)
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        await self._flush()
+
+    async def _flush(self):
+        text, self._pending = self._pending, None
+        if text is None or text == self._shown:
+            return
+        self._last_edit = time.monotonic()
+        try:
+            await self.message.edit_text(text)
+            self._shown = text
+        except BadRequest as e:
+            logger.debug(f"Skipped progress edit: {e}")